@@ -0,0 +1,141 @@
+"""
+Throughput and memory benchmark for GET /v1/file/<id>/content.
+
+The S3 stand-in is a local HTTP server that answers GetObject for any key with
+generated bytes, written to the socket in small pieces, so the app reads a
+real network stream and nothing is held server-side. Objects of several sizes
+are downloaded two ways:
+
+    stream    - the endpoint: the S3 body relayed in CONTENT_CHUNK_SIZE chunks
+    buffered  - the naive alternative: read the whole body, then respond
+
+For each it reports MB/s and the peak Python heap growth during one download
+(tracemalloc). Streaming should stay flat at about one chunk while buffering
+grows with the object size. A throwaway test database holds the image rows.
+
+Run from the webapp/ directory with the environment the app normally uses:
+
+    python -m benchmarks.content_stream --sizes 1 16 64 --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# Object size for each key, registered before the download
+OBJECT_SIZES = {}
+PIECE = os.urandom(64 * 1024)
+
+
+class StandInS3Handler(BaseHTTPRequestHandler):
+    """GetObject/HeadObject for path-style ``/<bucket>/<key>`` URLs; no Range or conditionals."""
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_object(body=False)
+
+    def do_GET(self):
+        self.send_object(body=True)
+
+    def send_object(self, body):
+        key = self.path.split("?")[0].split("/", 2)[2]
+        size = OBJECT_SIZES[key]
+        self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("ETag", '"stand-in"')
+        self.send_header("Last-Modified", "Sat, 17 Oct 2026 00:00:00 GMT")
+        self.end_headers()
+        remaining = size if body else 0
+        while remaining:
+            piece = PIECE[:min(remaining, len(PIECE))]
+            self.wfile.write(piece)
+            remaining -= len(piece)
+
+    def log_message(self, *args):
+        pass
+
+
+def download(view, request, image_id):
+    """Consume the response the way a WSGI server would; returns the byte count."""
+    response = view(request, image_id)
+    size = sum(len(chunk) for chunk in response) if response.streaming else len(response.content)
+    response.close()
+    return size
+
+
+def measure(view, request, image_id, runs):
+    timings, peaks = [], []
+    for _ in range(runs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = download(view, request, image_id)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "bytes": size,
+        "mb_per_s": round(size / statistics.median(timings) / 1e6, 1),
+        "peak_heap_mib": round(max(peaks) / 2 ** 20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 64], help="object sizes in MiB")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
+    import django
+    django.setup()
+
+    import boto3
+    from botocore.config import Config
+    from django.db import connection
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.test.utils import setup_test_environment
+    from image_upload import views
+    from image_upload.models import Image
+
+    def buffered_content(request, image_id):
+        """What the endpoint would cost without streaming."""
+        image_record = Image.objects.get(id=image_id)
+        obj = views.s3_client.get_object(Bucket=views.BUCKET_NAME, Key=views.object_key(image_record))
+        return HttpResponse(obj['Body'].read(), content_type=obj['ContentType'])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInS3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    s3_client = boto3.client("s3", region_name="us-east-1", endpoint_url=f"http://127.0.0.1:{server.server_port}",
+                             aws_access_key_id="stand-in", aws_secret_access_key="stand-in",
+                             config=Config(s3={"addressing_style": "path"}))
+    bucket = "content-benchmark"
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with mock.patch.object(views, "s3_client", s3_client), mock.patch.object(views, "BUCKET_NAME", bucket):
+            for size_mib in args.sizes:
+                image_id = uuid.uuid4()
+                key = f"{image_id}/bench.bin"
+                OBJECT_SIZES[key] = size_mib * 2 ** 20
+                Image.objects.create(id=image_id, file_name="bench.bin",
+                                     url=f"https://{bucket}.s3.amazonaws.com/{key}")
+                request = RequestFactory().get(f"/v1/file/{image_id}/content")
+                for mode, view in (("stream", views.image_content), ("buffered", buffered_content)):
+                    result = measure(view, request, str(image_id), args.runs)
+                    print(json.dumps({"mode": mode, "size_mib": size_mib, **result}))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
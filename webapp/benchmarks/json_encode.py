@@ -0,0 +1,84 @@
+"""
+Microbenchmark of the JSON backends (webapp/fastjson.py).
+
+Encodes the documents the API produces most often -- one image's metadata
+(GET /v1/file/<id>), a 100-item listing page and a structured log record --
+with each available encoder and reports the time per call:
+
+    django   - JsonResponse's encoder: json.dumps with DjangoJSONEncoder
+    stdlib   - fastjson's stdlib backend (compact separators, cached encoder)
+    orjson   - fastjson's orjson backend, if orjson is installed
+
+Run from the webapp/ directory:
+
+    python -m benchmarks.json_encode --number 20000
+"""
+import argparse
+import json
+import os
+import timeit
+import uuid
+from datetime import date, datetime
+
+
+def documents():
+    image_id = uuid.uuid4()
+    metadata = {
+        "file_name": "example.jpg",
+        "id": str(image_id),
+        "url": f"https://bucket.s3.amazonaws.com/{image_id}/example.jpg",
+        "upload_date": str(date.today()),
+    }
+    page = {"items": [dict(metadata, id=str(uuid.uuid4())) for _ in range(100)], "next_cursor": "abc"}
+    log_record = {
+        "level": "INFO",
+        "message": f"Fetching image with ID {image_id}.",
+        "operation": "fetch_image",
+        "endpoint": f"/v1/file/{image_id}",
+        "method": "GET",
+        "image_id": image_id,
+        "timestamp": datetime.now().isoformat(),
+    }
+    return {"metadata": metadata, "list_page": page, "log_record": log_record}
+
+
+def encoders():
+    import importlib
+    from django.core.serializers.json import DjangoJSONEncoder
+    from django.test.utils import override_settings
+    from webapp import fastjson
+
+    result = {"django": lambda obj: json.dumps(obj, cls=DjangoJSONEncoder).encode()}
+    for backend in ("stdlib", "orjson"):
+        if backend == "orjson" and fastjson.orjson is None:
+            continue
+        with override_settings(JSON_BACKEND=backend):
+            module = importlib.reload(fastjson)
+        result[backend] = module.dumps
+    importlib.reload(fastjson)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="calls per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
+    import django
+    django.setup()
+
+    backends = encoders()
+    for name, document in documents().items():
+        baseline = None
+        for backend, dumps in backends.items():
+            best = min(timeit.repeat(lambda: dumps(document), number=args.number, repeat=args.repeat))
+            per_call_us = best / args.number * 1e6
+            baseline = baseline or per_call_us
+            print(json.dumps({"document": name, "backend": backend, "us_per_call": round(per_call_us, 2),
+                              "speedup": round(baseline / per_call_us, 2)}))
+
+
+if __name__ == "__main__":
+    main()
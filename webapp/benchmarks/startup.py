@@ -0,0 +1,100 @@
+"""
+Worker startup benchmark for the shared AWS client registry (webapp/aws.py)
+and the deferred CloudWatch log handler (webapp/log_pipeline.py).
+
+Each run boots Django in a fresh interpreter, the way a gunicorn/uvicorn
+worker does, and imports the URLconf (and with it every view module):
+
+    lazy   - the current code; AWS clients and the CloudWatch log handler are
+             built on first use only
+    eager  - additionally repeats what every worker did at boot before: build
+             the s3 and two cloudwatch clients, then a logs client and a
+             watchtower handler on it, whose constructor creates the log
+             group (a CloudWatch call)
+
+Eager runs need AWS credentials, as the old startup did. Without them the
+handler fails the same way the old logging config did and the run reports
+the error.
+
+Run from the webapp/ directory with the environment the app normally uses:
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --runs 10 --settings webapp.settings
+
+The difference between the medians is the boot time saved per worker.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Clients the view modules used to create at import time
+EAGER_CLIENTS = [("s3", None), ("cloudwatch", "us-east-1"), ("cloudwatch", "us-east-1")]
+# What the logging settings built at config time
+EAGER_LOG_HANDLER = {"region": "us-east-1", "log_group_name": "DjangoWebAppLogs"}
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import webapp.urls
+boot_ms = (time.perf_counter() - start) * 1000
+clients_ms = 0.0
+error = None
+if sys.argv[1] == "eager":
+    import boto3
+    import watchtower
+    clients_start = time.perf_counter()
+    for service, region in json.loads(sys.argv[2]):
+        boto3.client(service, region_name=region)
+    log_handler = json.loads(sys.argv[3])
+    try:
+        watchtower.CloudWatchLogHandler(boto3_client=boto3.client("logs", region_name=log_handler["region"]),
+                                        log_group_name=log_handler["log_group_name"])
+    except Exception as e:
+        error = repr(e)
+    clients_ms = (time.perf_counter() - clients_start) * 1000
+print(json.dumps({"boot_ms": boot_ms, "clients_ms": clients_ms, "total_ms": boot_ms + clients_ms, "error": error}))
+"""
+
+
+def run_once(mode, settings_module):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    output = subprocess.run([sys.executable, "-c", CHILD, mode, json.dumps(EAGER_CLIENTS), json.dumps(EAGER_LOG_HANDLER)],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(mode, samples):
+    totals = [sample["total_ms"] for sample in samples]
+    return {
+        "mode": mode,
+        "runs": len(samples),
+        "median_total_ms": round(statistics.median(totals), 1),
+        "min_total_ms": round(min(totals), 1),
+        "median_clients_ms": round(statistics.median(sample["clients_ms"] for sample in samples), 1),
+        "errors": sorted({sample["error"] for sample in samples if sample["error"]}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--settings", default=os.environ.get("DJANGO_SETTINGS_MODULE", "webapp.settings"))
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("lazy", "eager"):
+        # Warm the OS page cache so the first measured run is not an outlier
+        run_once(mode, args.settings)
+        results[mode] = summarize(mode, [run_once(mode, args.settings) for _ in range(args.runs)])
+        print(json.dumps(results[mode]))
+    print(json.dumps({"saved_per_worker_ms": round(results["eager"]["median_total_ms"]
+                                                   - results["lazy"]["median_total_ms"], 1)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+End-to-end benchmark suite for the image API.
+
+Drives upload (POST /v1/file), GET /v1/file/<id>, DELETE /v1/file/<id> and
+/healthz through the full Django stack (URL routing, middleware, upload
+handlers, ORM) at several concurrency levels and payload sizes. Nothing
+external is needed:
+
+    S3        moto, in-process
+    database  a throwaway test database of the configured backend (SQLite
+              with a SQLite settings module, or a local MySQL)
+
+Each client thread has its own test client and database connection. Logging
+is switched off so the numbers measure the request path, not the console.
+
+    python -m benchmarks.suite --save baselines/main.json
+    python -m benchmarks.suite --compare baselines/main.json --tolerance 0.2
+
+Every scenario reports requests, errors, requests per second and p50/p95/p99
+latency. ``--compare`` exits with status 1 when a scenario's p95 grew or its
+throughput dropped by more than the tolerance relative to the baseline. Only
+compare baselines recorded on the same machine and backend.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+from benchmarks.upload_load import percentile
+
+SCENARIOS = ("upload", "get", "delete", "healthz")
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_level(concurrency, requests_per_client, make_request):
+    """
+    Run ``make_request(client, index)`` from ``concurrency`` threads; each call
+    returns the response. Non-2xx responses and exceptions count as errors.
+    """
+    from django.db import connection
+    from django.test import Client
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def worker(worker_index):
+        nonlocal errors
+        client = Client()
+        try:
+            for request_index in range(requests_per_client):
+                start = time.perf_counter()
+                try:
+                    response = make_request(client, worker_index * requests_per_client + request_index)
+                    ok = 200 <= response.status_code < 300
+                except Exception:
+                    ok = False
+                latency = (time.perf_counter() - start) * 1000
+                with lock:
+                    if ok:
+                        latencies.append(latency)
+                    else:
+                        errors += 1
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def seed_images(s3_client, bucket, count, payload):
+    """Create ``count`` stored images directly (row + object) and return their IDs."""
+    from image_upload.models import Image
+
+    image_ids = [uuid.uuid4() for _ in range(count)]
+    for image_id in image_ids:
+        s3_client.put_object(Bucket=bucket, Key=f"{image_id}/seed.png", Body=payload)
+    Image.objects.bulk_create([
+        Image(id=image_id, file_name="seed.png", url=f"https://{bucket}.s3.amazonaws.com/{image_id}/seed.png")
+        for image_id in image_ids
+    ])
+    return [str(image_id) for image_id in image_ids]
+
+
+def run_scenario(name, concurrency, requests_per_client, size_kb, s3_client, bucket):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from image_upload.views import image_cache
+
+    payload = os.urandom(size_kb * 1024)
+    total = concurrency * requests_per_client
+    image_cache.clear()
+
+    if name == "upload":
+        def make_request(client, index):
+            return client.post("/v1/file", {
+                "profilePic": SimpleUploadedFile(f"bench-{index}.png", payload, content_type="image/png")})
+    elif name == "get":
+        # A small working set, so most requests are served by the metadata cache as in production
+        image_ids = seed_images(s3_client, bucket, min(total, 100), payload)
+
+        def make_request(client, index):
+            return client.get(f"/v1/file/{image_ids[index % len(image_ids)]}")
+    elif name == "delete":
+        image_ids = seed_images(s3_client, bucket, total, payload)
+
+        def make_request(client, index):
+            return client.delete(f"/v1/file/{image_ids[index]}")
+    else:
+        def make_request(client, index):
+            return client.get("/healthz")
+
+    return run_level(concurrency, requests_per_client, make_request)
+
+
+def scenario_key(name, concurrency, size_kb):
+    return f"{name}/c{concurrency}/{size_kb}kb"
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions (human-readable) between two result maps."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: rps {previous['rps']} -> {current['rps']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{key}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=50, help="requests per client per level")
+    parser.add_argument("--size-kb", type=int, nargs="+", default=[64, 1024],
+                        help="payload sizes; only upload, get and delete vary with it")
+    parser.add_argument("--save", help="write the results to this JSON baseline file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change, default 20%%")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    import django
+    django.setup()
+
+    import boto3
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from moto import mock_aws
+
+    logging.disable(logging.CRITICAL)
+    setup_test_environment()
+    if connection.vendor == "sqlite":
+        # The default in-memory test database uses SQLite's shared cache, which fails
+        # concurrent writers at once instead of waiting; a WAL file database waits
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+        connection.settings_dict["OPTIONS"].update(timeout=30, init_command="PRAGMA journal_mode=WAL")
+    old_name = connection.creation.create_test_db(verbosity=0)
+    bucket = "benchmark-bucket"
+    results = {}
+    try:
+        with mock_aws():
+            s3_client = boto3.client("s3", region_name="us-east-1")
+            s3_client.create_bucket(Bucket=bucket)
+            with mock.patch("image_upload.views.s3_client", s3_client), \
+                    mock.patch("image_upload.views.BUCKET_NAME", bucket):
+                for name in args.scenarios:
+                    for size_kb in (args.size_kb if name != "healthz" else [0]):
+                        for concurrency in args.concurrency:
+                            result = run_scenario(name, concurrency, args.requests, size_kb, s3_client, bucket)
+                            key = scenario_key(name, concurrency, size_kb)
+                            results[key] = result
+                            print(json.dumps({"scenario": key, **result}))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(),
+                "machine": platform.node(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "results": results,
+            }, baseline_file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
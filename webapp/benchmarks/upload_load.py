@@ -0,0 +1,125 @@
+"""
+Upload load test for comparing the sync (WSGI) and async (ASGI) image views.
+
+Start the same code base twice, once per server model, each with a single
+worker process, e.g.:
+
+    gunicorn webapp.wsgi:application -w 1 --threads 8 -b 127.0.0.1:8001
+    uvicorn webapp.asgi:application --workers 1 --port 8002
+
+then sweep the concurrency level against each and compare the highest level
+that still holds the target p99:
+
+    python -m benchmarks.upload_load --url http://127.0.0.1:8001 --concurrency 4 8 16 32 64
+    python -m benchmarks.upload_load --url http://127.0.0.1:8002 --concurrency 4 8 16 32 64
+
+Uploaded images are deleted again after each run.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_multipart(field_name, file_name, payload, content_type="image/png"):
+    """Encode a single file as a multipart/form-data body."""
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'.encode(),
+        f"Content-Type: {content_type}\r\n\r\n".encode(),
+        payload,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def upload_once(base_url, body, content_type, timeout):
+    request = urllib.request.Request(f"{base_url}/v1/file", data=body, method="POST",
+                                     headers={"Content-Type": content_type})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.loads(response.read())
+    return (time.perf_counter() - start) * 1000, payload["id"]
+
+
+def delete_images(base_url, image_ids, timeout):
+    for image_id in image_ids:
+        request = urllib.request.Request(f"{base_url}/v1/file/{image_id}", method="DELETE")
+        try:
+            urllib.request.urlopen(request, timeout=timeout).close()
+        except Exception:
+            pass
+
+
+def run_level(base_url, concurrency, requests_per_client, body, content_type, timeout):
+    """Drive `concurrency` clients in parallel and return latency stats."""
+    latencies, image_ids, errors = [], [], 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            try:
+                latency, image_id = upload_once(base_url, body, content_type, timeout)
+                with lock:
+                    latencies.append(latency)
+                    image_ids.append(image_id)
+            except Exception:
+                with lock:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.perf_counter() - start
+
+    delete_images(base_url, image_ids, timeout)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=20, help="uploads per client per level")
+    parser.add_argument("--size-kb", type=int, default=512, help="payload size of each upload")
+    parser.add_argument("--p99-target-ms", type=float, default=1000.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    body, content_type = build_multipart("profilePic", "load.png", os.urandom(args.size_kb * 1024))
+    best = None
+    for level in args.concurrency:
+        result = run_level(args.url, level, args.requests, body, content_type, args.timeout)
+        print(json.dumps(result))
+        if result["errors"] == 0 and result["p99_ms"] <= args.p99_target_ms:
+            best = level
+    print(json.dumps({"url": args.url, "p99_target_ms": args.p99_target_ms,
+                      "max_concurrency_within_target": best}))
+
+
+if __name__ == "__main__":
+    main()
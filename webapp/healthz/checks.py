@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+import time
+from django.db import close_old_connections, connection
+from webapp.breakers import STATE_GAUGES
+
+logger = logging.getLogger('webapp')
+
+
+def check_database():
+    """Lightweight connectivity check: no table access and no writes."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def check_s3():
+    # Imported lazily so the healthz app does not depend on image_upload at import time;
+    # storage holds only the lazy client and bucket name, not the views' caches and executors
+    from image_upload.storage import BUCKET_NAME, s3_client
+    s3_client.head_bucket(Bucket=BUCKET_NAME)
+
+
+class DependencyMonitor:
+    """
+    Cached dependency status for the readiness probe.
+
+    A daemon thread (started lazily, and again after a worker fork) runs every
+    check once per ``ttl`` seconds. Probes only read the cached result, so a
+    probe storm costs no MySQL or S3 round trips. Without the background thread
+    (or if it falls behind) the first probe after the TTL refreshes inline while
+    concurrent probes keep using the last result.
+
+    ``breakers`` maps check names to circuit breakers (webapp/breakers.py). An
+    open breaker makes its dependency unhealthy at once, without waiting for the
+    next refresh, and every refresh re-exports the breaker states as gauges.
+    """
+
+    def __init__(self, checks, ttl=10, background=True, statsd_client=None, breakers=None):
+        self.checks = checks
+        self.breakers = breakers or {}
+        self.ttl = ttl
+        self.background = background
+        self.statsd_client = statsd_client
+        self.results = {}
+        self.checked_at = None
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def status(self):
+        """Return ``(healthy, results)`` where results maps check name to its outcome."""
+        if self.background:
+            self._ensure_thread()
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.ttl:
+            # Only the first probe without any result waits for the checks
+            if self._refresh_lock.acquire(blocking=self.checked_at is None):
+                try:
+                    self._refresh()
+                finally:
+                    self._refresh_lock.release()
+        results = {name: dict(result) for name, result in self.results.items()}
+        for name, breaker in self.breakers.items():
+            result = results.setdefault(name, {"healthy": True})
+            result["circuit"] = breaker.state
+            if breaker.is_open():
+                result["healthy"] = False
+        return all(result["healthy"] for result in results.values()), results
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        results = {}
+        for name, check in self.checks.items():
+            start = time.time()
+            try:
+                check()
+                results[name] = {"healthy": True}
+            except Exception as e:
+                results[name] = {"healthy": False, "error": str(e)}
+            duration = (time.time() - start) * 1000
+            results[name]["duration_ms"] = round(duration, 2)
+            if self.statsd_client is not None:
+                self.statsd_client.timing(f'healthz.dependency.{name}.duration', duration)
+                self.statsd_client.gauge(f'healthz.dependency.{name}.healthy', int(results[name]["healthy"]))
+            breaker = self.breakers.get(name)
+            if breaker is not None and self.statsd_client is not None:
+                self.statsd_client.gauge(f'breaker.{name}.state', STATE_GAUGES[breaker.state])
+            previous = self.results.get(name)
+            if previous is None or previous["healthy"] != results[name]["healthy"]:
+                self._log_transition(name, results[name])
+        self.results = results
+        self.checked_at = time.monotonic()
+
+    def _log_transition(self, name, result):
+        log = logger.info if result["healthy"] else logger.error
+        log({
+            "level": "INFO" if result["healthy"] else "ERROR",
+            "message": f"Dependency {name} is {'healthy' if result['healthy'] else 'unhealthy'}",
+            "error": result.get("error"),
+            "endpoint": "/healthz/ready",
+            "operation": "dependency_check"
+        })
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            # A forked worker inherits the flag but not the thread, so start a new one
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='healthz-dependency-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            try:
+                self.refresh()
+            finally:
+                # This thread holds its own DB connection; drop it if it is broken or too old
+                close_old_connections()
+            time.sleep(self.ttl)
@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from healthz.models import HealthCheck
+
+
+class Command(BaseCommand):
+    help = "Delete HealthCheck rows older than the retention window, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.HEALTHCHECK_RETENTION_DAYS,
+                            help="Keep rows newer than this many days.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Rows deleted per statement, to keep locks short.")
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(days=options['days'])
+        deleted = 0
+        while True:
+            # Uses the datetime index; deleting by primary key keeps each statement small
+            batch = list(HealthCheck.objects.filter(datetime__lt=cutoff)
+                         .order_by('check_id').values_list('check_id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += HealthCheck.objects.filter(check_id__in=batch).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(f"Deleted {deleted} health check rows older than {cutoff.isoformat()}")
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthz", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="healthcheck",
+            name="datetime",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+    ]
@@ -6,5 +6,5 @@ class HealthCheck(models.Model):
     # Primary key with auto-incremented ID
     check_id = models.AutoField(primary_key=True)
 
-    # Datetime field with UTC timezone
-    datetime = models.DateTimeField(default=now)
\ No newline at end of file
+    # Datetime field with UTC timezone, indexed for the retention job
+    datetime = models.DateTimeField(default=now, db_index=True)
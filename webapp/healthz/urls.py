@@ -1,7 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from .views import healthz
+from .views import healthz, healthz_async, healthz_live, healthz_ready
+
+# HEALTHZ_MODE picks what /healthz does: "record" writes a HealthCheck row (legacy),
+# "live" and "ready" serve the cheap probes below without any DB writes
+if settings.HEALTHZ_MODE == 'live':
+    healthz_view = healthz_live
+elif settings.HEALTHZ_MODE == 'ready':
+    healthz_view = healthz_ready
+else:
+    # Serve the async view when running under ASGI with ASYNC_VIEWS enabled
+    healthz_view = healthz_async if settings.ASYNC_VIEWS else healthz
 
 urlpatterns = [
-    path('healthz', healthz, name='healthz'),
-    path('cicd/', healthz, name='cicd'),
+    path('healthz', healthz_view, name='healthz'),
+    path('healthz/live', healthz_live, name='healthz_live'),
+    path('healthz/ready', healthz_ready, name='healthz_ready'),
+    path('cicd/', healthz_view, name='cicd'),
 ]
@@ -1,106 +1,138 @@
-import json
-import time
 import logging
-import statsd
-import boto3
+from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from .checks import DependencyMonitor, check_database, check_s3
 from .models import HealthCheck
 from django.db import OperationalError
-from datetime import datetime
+from webapp import metrics
+from webapp.breakers import breakers
 
 # Initialize logger
 logger = logging.getLogger('webapp')
 
-# Initialize CloudWatch Metrics Client
-cloudwatch = boto3.client('cloudwatch', region_name="us-east-1")
-
-# Initialize StatsD client
-statsd_client = statsd.StatsClient('localhost', 8125)
-
-@csrf_exempt
-@require_http_methods(["GET"])
-def healthz(request):
-    start_time = time.time()  # Start API execution timer
-    statsd_client.incr('api.healthz.calls')  # Increment API call counter
-
-    # Reject if any payload exists
+# Shared StatsD client; buffers into the request's pipeline (see webapp.metrics)
+statsd_client = metrics.statsd_client
+
+# Cached MySQL/S3 status served by the readiness probe
+dependency_monitor = DependencyMonitor(
+    {'database': check_database, 's3': check_s3},
+    ttl=settings.HEALTHZ_READINESS_TTL,
+    background=settings.HEALTHZ_BACKGROUND_CHECKS,
+    statsd_client=statsd_client,
+    # Shares the request path's breaker state: an open breaker makes the probe unready at once
+    breakers=breakers
+)
+
+# Ensure probe responses are not cached
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'X-Content-Type-Options': 'nosniff'
+}
+
+
+def reject_payload(request, endpoint):
+    """Return a 400 response if the probe carries a body or query string, else None."""
     if request.body or request.GET:
-        #Record failed request API timing
-        api_execution_time = (time.time() - start_time) * 1000
-        statsd_client.timing('api.healthz.request.error.duration', api_execution_time)
-
-        logger.warning(json.dumps({
+        logger.warning({
             "level": "WARNING",
             "message": "Invalid request - payload detected",
-            "endpoint": "/healthz",
-            "method": "GET",
-            "timestamp": datetime.utcnow().isoformat()
-        }))
+            "endpoint": endpoint,
+            "method": "GET"
+        })
         return HttpResponse(status=400)
+    return None
 
-    # Ensure response is not cached
-    response_headers = {
-        'Cache-Control': 'no-cache, no-store, must-revalidate',
-        'Pragma': 'no-cache',
-        'X-Content-Type-Options': 'nosniff'
-    }
 
-    try:
-        # Database connectivity check
-        db_start_time = time.time()
-        with statsd_client.timer('database.health_check_time'):
-            HealthCheck.objects.create()
-        db_execution_time = (time.time() - db_start_time) * 1000   # Convert to ms
-
-        logger.info(json.dumps({
-            "level": "INFO",
-            "message": "Health check successful",
-            "endpoint": "/healthz",
-            "method": "GET",
-            "operation": "database_health_check",
-            "db_execution_time_ms": db_execution_time,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        # record database health check time
-        statsd_client.timing('api.healthz.db.duration', db_execution_time)
-
-        # Record API execution time with StatsD (in milliseconds)
-        api_time = (time.time() - start_time) * 1000  # Convert to ms
-        statsd_client.timing('api.healthz.duration', api_time)
-
-        return HttpResponse(status=200, headers=response_headers)
+@csrf_exempt
+@require_http_methods(["GET"])
+def healthz_live(request):
+    """Liveness: the process is up and serving. Touches neither MySQL nor S3."""
+    return reject_payload(request, "/healthz/live") or HttpResponse(status=200, headers=NO_CACHE_HEADERS)
 
-    except OperationalError:
-        # Record failed API timing
-        api_execution_time = (time.time() - start_time) * 1000
-        statsd_client.timing('api.healthz.error.duration', api_execution_time)
 
-        logger.error(json.dumps({
+@csrf_exempt
+@require_http_methods(["GET"])
+def healthz_ready(request):
+    """Readiness: MySQL (SELECT 1) and S3 are reachable and their circuit breakers are closed."""
+    invalid = reject_payload(request, "/healthz/ready")
+    if invalid:
+        return invalid
+
+    healthy, _ = dependency_monitor.status()
+    if not healthy:
+        statsd_client.incr('api.healthz_ready.unhealthy')
+    return HttpResponse(status=200 if healthy else 503, headers=NO_CACHE_HEADERS)
+
+
+def health_check_response(db_execution_time):
+    """200 for a successful database health check, logged and timed."""
+    logger.info({
+        "level": "INFO",
+        "message": "Health check successful",
+        "endpoint": "/healthz",
+        "method": "GET",
+        "operation": "database_health_check",
+        "db_execution_time_ms": db_execution_time
+    })
+    # record database health check time
+    statsd_client.timing('api.healthz.db.duration', db_execution_time)
+    return HttpResponse(status=200, headers=NO_CACHE_HEADERS)
+
+
+def health_check_error_response(error):
+    """503 for a failed database health check; unexpected errors are logged with their traceback."""
+    if isinstance(error, OperationalError):
+        statsd_client.incr('api.healthz.error')
+        logger.error({
             "level": "ERROR",
             "message": "Database connectivity failure",
             "endpoint": "/healthz",
             "method": "GET",
-            "operation": "database_health_check",
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-
-        return HttpResponse(status=503, headers=response_headers)
-
-    except Exception as e:
-        # Record failed API timing for unexpected errors
-        api_execution_time = (time.time() - start_time) * 1000
-        statsd_client.timing('api.healthz.exception.duration', api_execution_time)
-
-        logger.exception(json.dumps({
+            "operation": "database_health_check"
+        })
+    else:
+        statsd_client.incr('api.healthz.exception')
+        logger.exception({
             "level": "ERROR",
             "message": "Unexpected error in health check",
-            "error": str(e),
+            "error": str(error),
             "endpoint": "/healthz",
             "method": "GET",
-            "operation": "database_health_check",
-            "timestamp": datetime.utcnow().isoformat()
-        }))
+            "operation": "database_health_check"
+        })
+    return HttpResponse(status=503, headers=NO_CACHE_HEADERS)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def healthz(request):
+    invalid = reject_payload(request, "/healthz")
+    if invalid:
+        return invalid
+
+    try:
+        # Database connectivity check
+        with statsd_client.timer('database.health_check_time') as db_timer:
+            HealthCheck.objects.create()
+    except Exception as e:
+        return health_check_error_response(e)
+    return health_check_response(db_timer.ms)
+
 
-        return HttpResponse(status=503, headers=response_headers)
+@csrf_exempt
+@require_http_methods(["GET"])
+async def healthz_async(request):
+    """ASGI variant of healthz; only the DB write differs, through the async ORM API."""
+    invalid = reject_payload(request, "/healthz")
+    if invalid:
+        return invalid
+
+    try:
+        with statsd_client.timer('database.health_check_time') as db_timer:
+            await HealthCheck.objects.acreate()
+    except Exception as e:
+        return health_check_error_response(e)
+    return health_check_response(db_timer.ms)
@@ -0,0 +1,63 @@
+"""
+Content-addressed storage for deduplicated uploads (settings.IMAGE_DEDUP).
+
+Bytes are stored once under ``blobs/<sha256>`` and every Image with the same
+content points at the same Blob row, which counts its references. Uploading
+known bytes only bumps the count; deleting an image drops one reference and
+the S3 object goes with the last one.
+"""
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from .models import Blob, Image
+
+BLOB_KEY_PREFIX = 'blobs/'
+
+
+def blob_key(digest):
+    return f"{BLOB_KEY_PREFIX}{digest}"
+
+
+def acquire_blob(s3_client, bucket_name, file, digest, content_type):
+    """
+    Take a reference on the blob for ``digest``, uploading ``file`` only if the
+    bytes are not stored yet. Returns ``(blob, uploaded)``.
+    """
+    uploaded = False
+    for _ in range(3):
+        if Blob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1):
+            return Blob.objects.get(digest=digest), uploaded
+        # Uploaded again on a retry: a concurrent release may have deleted the object
+        file.seek(0)
+        s3_client.upload_fileobj(file, bucket_name, blob_key(digest),
+                                 ExtraArgs={'Metadata': {'sha256': digest, 'file_type': content_type}})
+        uploaded = True
+        try:
+            with transaction.atomic():
+                return Blob.objects.create(digest=digest, key=blob_key(digest), size=file.size, ref_count=1), True
+        except IntegrityError:
+            # Another request stored the same bytes meanwhile; take a reference on theirs
+            continue
+    raise DatabaseError(f"Could not take a reference on blob {digest}")
+
+
+def release_blob(s3_client, bucket_name, digest):
+    """
+    Drop one reference, deleting the S3 object and the row with the last one.
+    Returns True if the object was deleted. Must run inside a transaction.
+    """
+    blob = Blob.objects.select_for_update().get(digest=digest)
+    if blob.ref_count > 1:
+        Blob.objects.filter(digest=digest).update(ref_count=F('ref_count') - 1)
+        return False
+    # The row stays locked until commit, so an upload of the same bytes waits and
+    # then stores them again instead of referencing the object deleted here
+    s3_client.delete_object(Bucket=bucket_name, Key=blob.key)
+    blob.delete()
+    return True
+
+
+def delete_blob_image(s3_client, bucket_name, image_id, digest):
+    """Delete a deduplicated Image and release its blob; nothing changes if S3 fails."""
+    with transaction.atomic():
+        Image.objects.filter(id=image_id).delete()
+        return release_blob(s3_client, bucket_name, digest)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+
+# Stored in the shared cache to remember that an image does not exist
+MISSING_MARKER = "__missing__"
+_NOT_CACHED = object()
+
+
+def image_metadata(image_record, derivatives=None):
+    """JSON-ready metadata of an Image row, as returned by GET /v1/file/<id>."""
+    metadata = {
+        "file_name": image_record.file_name,
+        "id": str(image_record.id),
+        "url": image_record.url,
+        "upload_date": str(image_record.upload_date)
+    }
+    if derivatives is not None:
+        metadata["derivatives"] = {
+            derivative.name: {
+                "url": derivative.url,
+                "content_type": derivative.content_type,
+                "width": derivative.width,
+                "height": derivative.height
+            } for derivative in derivatives
+        }
+    return metadata
+
+
+def metadata_etag(metadata):
+    """Strong ETag of a metadata document: a digest of its canonical JSON."""
+    canonical = json.dumps(metadata, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class ImageMetadataCache:
+    """
+    Read-through cache for Image metadata.
+
+    The first tier is an in-process LRU bounded by ``max_entries``. If
+    ``backend_alias`` names a cache in ``settings.CACHES`` it is used as a second
+    tier shared by all workers. Lookups that found no row are cached too (with
+    ``negative_ttl``) so repeated 404s do not reach MySQL.
+
+    Image rows never change after creation, so the only invalidation needed is on
+    DELETE (and when derivatives are added). A DELETE only reaches this worker's
+    LRU, so other workers' LRUs keep entries for at most ``local_ttl`` seconds. A
+    deletion also leaves a tombstone in the shared tier, so every worker answers
+    404 for the deleted image without querying MySQL.
+
+    Each entry keeps the metadata's ETag, so conditional GETs are answered from
+    the cache without serialising anything.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, negative_ttl=30, local_ttl=5, backend_alias=None,
+                 statsd_client=None, key_prefix='image:meta:v2:'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local_ttl = local_ttl
+        self.shared = caches[backend_alias] if backend_alias else None
+        self.statsd_client = statsd_client
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_id):
+        """Return ``(found, metadata)``; ``metadata`` is None for a cached 404."""
+        found, metadata, _ = self.get_entry(image_id)
+        return found, metadata
+
+    async def aget(self, image_id):
+        found, metadata, _ = await self.aget_entry(image_id)
+        return found, metadata
+
+    def get_entry(self, image_id):
+        """Return ``(found, metadata, etag)``; ``metadata`` and ``etag`` are None for a cached 404."""
+        found, metadata, etag = self._get_local(image_id)
+        if not found and self.shared is not None:
+            found, metadata, etag = self._from_shared(image_id, self.shared.get(self._key(image_id), _NOT_CACHED))
+        self._count(found, metadata)
+        return found, metadata, etag
+
+    async def aget_entry(self, image_id):
+        found, metadata, etag = self._get_local(image_id)
+        if not found and self.shared is not None:
+            found, metadata, etag = self._from_shared(
+                image_id, await self.shared.aget(self._key(image_id), _NOT_CACHED))
+        self._count(found, metadata)
+        return found, metadata, etag
+
+    def set(self, image_id, metadata, etag=None):
+        etag = etag or metadata_etag(metadata)
+        self._set_local(image_id, metadata, etag, self.ttl)
+        if self.shared is not None:
+            self.shared.set(self._key(image_id), (metadata, etag), self.ttl)
+
+    async def aset(self, image_id, metadata, etag=None):
+        etag = etag or metadata_etag(metadata)
+        self._set_local(image_id, metadata, etag, self.ttl)
+        if self.shared is not None:
+            await self.shared.aset(self._key(image_id), (metadata, etag), self.ttl)
+
+    def set_missing(self, image_id):
+        self._set_local(image_id, None, None, self.negative_ttl)
+        if self.shared is not None:
+            self.shared.set(self._key(image_id), MISSING_MARKER, self.negative_ttl)
+
+    async def aset_missing(self, image_id):
+        self._set_local(image_id, None, None, self.negative_ttl)
+        if self.shared is not None:
+            await self.shared.aset(self._key(image_id), MISSING_MARKER, self.negative_ttl)
+
+    def mark_deleted(self, image_id):
+        """Tombstone for a deleted image. IDs are never reused, so it cannot go stale."""
+        self._set_local(image_id, None, None, self.ttl)
+        if self.shared is not None:
+            self.shared.set(self._key(image_id), MISSING_MARKER, self.ttl)
+
+    async def amark_deleted(self, image_id):
+        self._set_local(image_id, None, None, self.ttl)
+        if self.shared is not None:
+            await self.shared.aset(self._key(image_id), MISSING_MARKER, self.ttl)
+
+    def invalidate(self, image_id):
+        with self._lock:
+            self._entries.pop(image_id, None)
+        if self.shared is not None:
+            self.shared.delete(self._key(image_id))
+
+    async def ainvalidate(self, image_id):
+        with self._lock:
+            self._entries.pop(image_id, None)
+        if self.shared is not None:
+            await self.shared.adelete(self._key(image_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _key(self, image_id):
+        return f"{self.key_prefix}{image_id}"
+
+    def _get_local(self, image_id):
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is None:
+                return False, None, None
+            expires_at, metadata, etag = entry
+            if expires_at <= time.monotonic():
+                del self._entries[image_id]
+                return False, None, None
+            self._entries.move_to_end(image_id)
+            return True, metadata, etag
+
+    def _set_local(self, image_id, metadata, etag, ttl):
+        ttl = min(ttl, self.local_ttl)
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[image_id] = (time.monotonic() + ttl, metadata, etag)
+            self._entries.move_to_end(image_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _from_shared(self, image_id, value):
+        if value is _NOT_CACHED:
+            return False, None, None
+        if value == MISSING_MARKER:
+            self._set_local(image_id, None, None, self.negative_ttl)
+            return True, None, None
+        metadata, etag = value
+        self._set_local(image_id, metadata, etag, self.ttl)
+        return True, metadata, etag
+
+    def _count(self, found, metadata):
+        if self.statsd_client is None:
+            return
+        if not found:
+            self.statsd_client.incr('cache.image_metadata.miss')
+        elif metadata is None:
+            self.statsd_client.incr('cache.image_metadata.negative_hit')
+        else:
+            self.statsd_client.incr('cache.image_metadata.hit')
@@ -0,0 +1,133 @@
+"""
+Streaming image bytes for GET /v1/file/<id>/content.
+
+S3 evaluates the Range and conditional headers itself (one round trip, no
+HEAD first); the body is relayed in fixed-size chunks, so a download holds
+one chunk in memory whatever the image size.
+"""
+import re
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+# A single byte range; multi-range requests are answered with the whole object (RFC 9110 allows ignoring Range)
+RANGE_RE = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+# Request header -> get_object/head_object parameter
+CONDITIONAL_HEADERS = {
+    'HTTP_IF_MATCH': 'IfMatch',
+    'HTTP_IF_NONE_MATCH': 'IfNoneMatch',
+    'HTTP_IF_MODIFIED_SINCE': 'IfModifiedSince',
+    'HTTP_IF_UNMODIFIED_SINCE': 'IfUnmodifiedSince',
+}
+
+# S3 error codes (get_object, or the bare status of head_object) -> response status
+ERROR_STATUS = {
+    'NoSuchKey': 404, '404': 404,
+    'NotModified': 304, '304': 304,
+    'PreconditionFailed': 412, '412': 412,
+    'InvalidRange': 416, '416': 416,
+}
+
+
+def object_request(request, bucket_name, key):
+    """get_object/head_object parameters for a content request, forwarding Range and conditionals."""
+    params = {'Bucket': bucket_name, 'Key': key}
+    byte_range = request.META.get('HTTP_RANGE', '').replace(' ', '')
+    if RANGE_RE.match(byte_range):
+        params['Range'] = byte_range
+    for header, param in CONDITIONAL_HEADERS.items():
+        if request.META.get(header):
+            params[param] = request.META[header]
+    return params
+
+
+def if_range_matches(request, obj):
+    """False when If-Range names another version of the object, so the range must not be served."""
+    validator = request.META.get('HTTP_IF_RANGE')
+    if not validator:
+        return True
+    if validator.startswith('"') or validator.startswith('W/'):
+        # Ranges are only served against a strong validator
+        return validator == obj.get('ETag')
+    return 'LastModified' in obj and validator == http_date(obj['LastModified'].timestamp())
+
+
+def error_status(error):
+    """Response status for an S3 ClientError that maps to an HTTP answer, else None."""
+    return ERROR_STATUS.get(error.response.get('Error', {}).get('Code'))
+
+
+def error_response(error, status):
+    response = HttpResponse(status=status)
+    headers = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    if status == 304 and headers.get('etag'):
+        response['ETag'] = headers['etag']
+    if status == 416:
+        size = error.response.get('Error', {}).get('ActualObjectSize')
+        if size:
+            response['Content-Range'] = f"bytes */{size}"
+    return response
+
+
+class ObjectStream:
+    """Relays an S3 StreamingBody chunk by chunk and closes it when the response is done."""
+
+    def __init__(self, body, chunk_size, on_close=None):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.on_close = on_close
+        self.sent = 0
+
+    def __iter__(self):
+        while True:
+            chunk = self.body.read(self.chunk_size)
+            if not chunk:
+                return
+            self.sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.body.close()
+        if self.on_close is not None:
+            self.on_close(self.sent)
+
+
+class AsyncObjectStream(ObjectStream):
+    """ObjectStream for ASGI: Django would otherwise buffer a sync iterator whole before sending it."""
+
+    # StreamingHttpResponse prefers __iter__; without it the response is served asynchronously
+    __iter__ = None
+
+    async def __aiter__(self):
+        read = sync_to_async(self.body.read, thread_sensitive=False)
+        while True:
+            chunk = await read(self.chunk_size)
+            if not chunk:
+                return
+            self.sent += len(chunk)
+            yield chunk
+
+
+def content_response(obj, file_name, stream=None):
+    """
+    200/206 response for a get_object (``stream`` set) or head_object result,
+    carrying the validators clients need for later conditional and range requests.
+    """
+    status = 206 if obj.get('ContentRange') else 200
+    content_type = obj.get('ContentType') or 'application/octet-stream'
+    if stream is None:
+        response = HttpResponse(status=status, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(stream, status=status, content_type=content_type)
+    response['Content-Length'] = obj['ContentLength']
+    response['Accept-Ranges'] = 'bytes'
+    if obj.get('ContentRange'):
+        response['Content-Range'] = obj['ContentRange']
+    if obj.get('ETag'):
+        response['ETag'] = obj['ETag']
+    if obj.get('LastModified'):
+        response['Last-Modified'] = http_date(obj['LastModified'].timestamp())
+    response['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(file_name, safe='')}"
+    return response
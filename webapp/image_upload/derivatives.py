@@ -0,0 +1,134 @@
+"""
+Derivative (thumbnail) pipeline.
+
+After an image is stored, ``DerivativePipeline.submit`` schedules its
+renditions without holding up the response. A small thread pool does the I/O:
+it fetches the original from S3, hands the bytes to a process pool for
+decoding and resizing (CPU-bound, so it stays off the web workers' GIL),
+uploads the results under ``derivatives/<image_id>/`` and records them as
+Derivative rows. The image's cache entry is dropped afterwards so the next
+GET shows the new URLs.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.db import DatabaseError, connection
+from . import imaging
+from .models import Derivative
+
+logger = logging.getLogger('webapp')
+
+DERIVATIVE_KEY_PREFIX = 'derivatives/'
+
+
+def derivative_key(image_id, name, extension):
+    return f"{DERIVATIVE_KEY_PREFIX}{image_id}/{name}.{extension}"
+
+
+def derivative_keys(image_ids):
+    """S3 keys of the derivatives of these images; read them before the rows cascade away."""
+    return list(Derivative.objects.filter(image_id__in=list(image_ids)).values_list('key', flat=True))
+
+
+class DerivativePipeline:
+    def __init__(self, specs, s3_client, bucket_name, workers=2, quality=80,
+                 max_source_bytes=50 * 1024 * 1024, statsd_client=None, on_complete=None):
+        self.specs = specs
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.quality = quality
+        self.max_source_bytes = max_source_bytes
+        self.statsd_client = statsd_client
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = None
+        self._processes = None
+
+    def submit(self, image_id, key):
+        """Schedule the derivatives of one stored image. Returns a Future."""
+        return self._executors()[0].submit(self._run_in_thread, str(image_id), key)
+
+    def _run_in_thread(self, image_id, key):
+        try:
+            return self.run(image_id, key)
+        finally:
+            # Pool threads live on; give the connection back instead of holding it
+            connection.close()
+
+    def run(self, image_id, key):
+        """Build, upload and record all derivatives of one image. Returns the Derivative rows."""
+        start = time.time()
+        uploaded = []
+        try:
+            source = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            if source.get('ContentLength', 0) > self.max_source_bytes:
+                logger.warning({
+                    "level": "WARNING",
+                    "message": f"Skipping derivatives of {image_id}: original too large.",
+                    "image_id": image_id,
+                    "operation": "derivatives"
+                })
+                return []
+            data = source['Body'].read()
+            renditions = self._executors()[1].submit(imaging.render, data, self.specs, self.quality).result()
+
+            records = []
+            for rendition in renditions:
+                rendition_key = derivative_key(image_id, rendition["name"], rendition["extension"])
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=rendition_key, Body=rendition["body"],
+                                          ContentType=rendition["content_type"])
+                uploaded.append(rendition_key)
+                records.append(Derivative(
+                    image_id=image_id, name=rendition["name"], key=rendition_key,
+                    url=f"https://{self.bucket_name}.s3.amazonaws.com/{rendition_key}",
+                    content_type=rendition["content_type"], width=rendition["width"],
+                    height=rendition["height"], size=len(rendition["body"])))
+            try:
+                Derivative.objects.bulk_create(records)
+            except DatabaseError:
+                # Most likely the image was deleted meanwhile; do not leave its renditions behind
+                self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={
+                    'Objects': [{'Key': rendition_key} for rendition_key in uploaded], 'Quiet': True})
+                raise
+
+            if self.on_complete is not None:
+                self.on_complete(image_id)
+            if self.statsd_client is not None:
+                self.statsd_client.incr('derivatives.created', len(records))
+                self.statsd_client.timing('derivatives.duration', (time.time() - start) * 1000)
+            return records
+        except Exception as e:
+            if self.statsd_client is not None:
+                self.statsd_client.incr('derivatives.failed')
+            logger.error({
+                "level": "ERROR",
+                "message": f"Creating derivatives of {image_id} failed.",
+                "error": str(e),
+                "image_id": image_id,
+                "operation": "derivatives"
+            })
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._threads.shutdown(wait=True)
+                self._processes.shutdown(wait=True)
+            self._pid = None
+
+    def _executors(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Built lazily, and again in a forked worker: neither pool survives a fork
+                self._pid = os.getpid()
+                self._threads = ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix='derivatives')
+                # Spawned, not forked: forking a threaded web worker can copy held locks
+                self._processes = ProcessPoolExecutor(max_workers=self.workers,
+                                                      mp_context=multiprocessing.get_context('spawn'))
+            return self._threads, self._processes
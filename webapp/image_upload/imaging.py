@@ -0,0 +1,53 @@
+"""
+Image rendering for derivatives. Runs in the derivative process pool, so this
+module must stay importable without Django (workers are spawned, not forked).
+"""
+from io import BytesIO
+from PIL import Image as PILImage, ImageOps
+
+# format name in IMAGE_DERIVATIVES -> (Pillow format, content type, file extension)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+
+def parse_specs(value):
+    """Parse ``"thumb:256:webp,medium:1024:webp"`` into ``[("thumb", 256, "webp"), ...]``."""
+    specs = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, size, image_format = (field.strip() for field in item.split(':'))
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported derivative format {image_format!r} in {item!r}")
+        specs.append((name, int(size), image_format))
+    return specs
+
+
+def render(data, specs, quality=80):
+    """
+    Produce one rendition per ``(name, max_side, format)`` spec from the encoded
+    image ``data``. Aspect ratio is kept and images are never upscaled.
+    Returns a list of dicts with name, content_type, extension, width, height and body.
+    """
+    results = []
+    with PILImage.open(BytesIO(data)) as source:
+        # Apply the EXIF orientation so thumbnails are upright
+        source = ImageOps.exif_transpose(source)
+        for name, max_side, image_format in specs:
+            pil_format, content_type, extension = FORMATS[image_format]
+            rendition = source.copy()
+            rendition.thumbnail((max_side, max_side))
+            if pil_format == 'JPEG' and rendition.mode not in ('RGB', 'L'):
+                rendition = rendition.convert('RGB')
+            body = BytesIO()
+            rendition.save(body, format=pil_format, quality=quality)
+            results.append({
+                "name": name,
+                "content_type": content_type,
+                "extension": extension,
+                "width": rendition.width,
+                "height": rendition.height,
+                "body": body.getvalue(),
+            })
+    return results
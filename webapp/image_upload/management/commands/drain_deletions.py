@@ -0,0 +1,47 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from image_upload.outbox import drain_batch, pending_count
+from image_upload.storage import BUCKET_NAME, s3_client
+from webapp.metrics import statsd_client
+
+
+class Command(BaseCommand):
+    help = "Delete the S3 objects queued by deferred DELETEs (ASYNC_DELETES), retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help="Outbox entries per batch (at most 1000, one DeleteObjects call).")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait when nothing is due.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no entry is due instead of polling.")
+
+    def handle(self, *args, **options):
+        total_deleted = total_failed = 0
+        while True:
+            start = time.monotonic()
+            deleted, failed = drain_batch(s3_client, BUCKET_NAME, batch_size=options['batch_size'],
+                                          retry_base=settings.OUTBOX_RETRY_BASE,
+                                          retry_max=settings.OUTBOX_RETRY_MAX)
+            elapsed = time.monotonic() - start
+            depth = pending_count()
+            total_deleted += deleted
+            total_failed += failed
+
+            statsd_client.gauge('outbox.depth', depth)
+            if deleted or failed:
+                statsd_client.incr('outbox.deleted', deleted)
+                statsd_client.incr('outbox.failed', failed)
+                statsd_client.timing('outbox.batch_time', elapsed * 1000)
+                self.stdout.write(f"Deleted {deleted} objects ({failed} failed) in {elapsed * 1000:.0f} ms, "
+                                  f"{deleted / elapsed if elapsed else 0:.0f} objects/s, {depth} pending")
+            else:
+                if options['once']:
+                    break
+                # Drop the connection if it is broken or too old while idling
+                close_old_connections()
+                time.sleep(options['interval'])
+
+        self.stdout.write(f"Deleted {total_deleted} objects, {total_failed} failures, {depth} pending")
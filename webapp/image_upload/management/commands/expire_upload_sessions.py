@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from image_upload.resumable import expire_sessions
+from image_upload.storage import BUCKET_NAME, s3_client
+from webapp.metrics import statsd_client
+
+
+class Command(BaseCommand):
+    help = "Abort resumable upload sessions past their expiry, deleting their uploaded parts from S3."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Sessions loaded per query.")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        aborted, failed = expire_sessions(s3_client, BUCKET_NAME, batch_size=options['batch_size'])
+        elapsed = time.monotonic() - start
+
+        statsd_client.incr('resumable.sessions.expired', aborted)
+        statsd_client.incr('resumable.sessions.expire_failed', failed)
+        self.stdout.write(f"Aborted {aborted} expired upload sessions ({failed} failed) in {elapsed * 1000:.0f} ms")
@@ -0,0 +1,72 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from image_upload.models import Image
+from image_upload.reconcile import ReconcileStats, reconcile, still_missing, still_orphaned
+
+
+class Command(BaseCommand):
+    help = ("Compare S3 objects with Image/Blob rows in one streaming pass and report "
+            "objects without rows and rows without objects. --repair deletes both, in batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help="Delete orphaned objects and Image rows whose object is gone.")
+        parser.add_argument('--min-age', type=int,
+                            default=max(3600, settings.PRESIGNED_UPLOAD_EXPIRES + settings.PRESIGNED_CONFIRM_GRACE),
+                            help="Ignore objects younger than this many seconds (uploads still in flight).")
+        parser.add_argument('--page-size', type=int, default=1000,
+                            help="Objects per list_objects_v2 call and rows per query.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Findings repaired per batch (at most 1000 keys per DeleteObjects).")
+
+    def handle(self, *args, **options):
+        # Imported here so the command does not build clients before it runs
+        from image_upload.views import BUCKET_NAME, delete_s3_keys, image_cache, s3_client
+
+        batch_size = min(options['batch_size'], 1000)
+        stats = ReconcileStats()
+        repaired = {"objects_deleted": 0, "rows_deleted": 0}
+        orphans, missing = [], []
+
+        def repair_orphans():
+            # Re-checked: the row may have been created since the scan passed the key
+            keys = still_orphaned([finding.key for finding in orphans])
+            failed = delete_s3_keys(keys) if keys else set()
+            repaired["objects_deleted"] += len(keys) - len(failed)
+            orphans.clear()
+
+        def repair_missing():
+            gone = still_missing(s3_client, BUCKET_NAME, missing)
+            image_ids = [finding.image_id for finding in gone]
+            repaired["rows_deleted"] += Image.objects.filter(id__in=image_ids, blob__isnull=True).delete()[0]
+            for image_id in image_ids:
+                image_cache.mark_deleted(image_id)
+            missing.clear()
+
+        for finding in reconcile(s3_client, BUCKET_NAME, min_age=timedelta(seconds=options['min_age']),
+                                 page_size=options['page_size'], stats=stats):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{finding.kind} {finding.key}")
+            if not options['repair']:
+                continue
+            if finding.kind in ('orphan_object', 'orphan_blob'):
+                orphans.append(finding)
+                if len(orphans) >= batch_size:
+                    repair_orphans()
+            elif finding.kind == 'missing_object':
+                missing.append(finding)
+                if len(missing) >= batch_size:
+                    repair_missing()
+            # missing_blob is only reported: the images sharing it need a decision
+
+        if orphans:
+            repair_orphans()
+        if missing:
+            repair_missing()
+
+        summary = stats.as_dict()
+        if options['repair']:
+            summary.update(repaired)
+        self.stdout.write(json.dumps(summary))
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("image_upload", "0004_alter_image_id_alter_image_upload_date"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="image",
+            index=models.Index(
+                fields=["upload_date", "id"], name="image_upload_date_id_idx"
+            ),
+        ),
+    ]
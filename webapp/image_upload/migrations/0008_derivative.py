@@ -0,0 +1,50 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("image_upload", "0007_pendingdeletion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Derivative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50)),
+                ("key", models.CharField(max_length=255)),
+                ("url", models.URLField(max_length=300)),
+                ("content_type", models.CharField(max_length=50)),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("size", models.BigIntegerField()),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="derivatives",
+                        to="image_upload.image",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("image", "name"), name="derivative_image_name_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
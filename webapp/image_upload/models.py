@@ -1,10 +1,88 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 
 
 # Create your models here.
+class Blob(models.Model):
+    """One S3 object shared by every image with the same bytes (settings.IMAGE_DEDUP)."""
+    digest = models.CharField(max_length=64, primary_key=True)  # SHA-256, hex
+    key = models.CharField(max_length=200)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+
 class Image(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     upload_date = models.DateField(auto_now_add=True,null=False)
     url = models.URLField(max_length=200)
     file_name = models.CharField(max_length=200)
+    # Set for deduplicated uploads; other images own the object under their url
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name='images')
+
+    class Meta:
+        # Keyset pagination of GET /v1/file orders and seeks on (upload_date, id)
+        indexes = [
+            models.Index(fields=['upload_date', 'id'], name='image_upload_date_id_idx'),
+        ]
+
+
+class Derivative(models.Model):
+    """A resized, re-encoded rendition of an Image (settings.IMAGE_DERIVATIVES)."""
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='derivatives')
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    url = models.URLField(max_length=300)
+    content_type = models.CharField(max_length=50)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'name'], name='derivative_image_name_uniq'),
+        ]
+
+
+class PendingDeletion(models.Model):
+    """
+    Outbox of S3 objects whose images are already deleted (settings.ASYNC_DELETES).
+    Written in the same transaction as the row delete and drained by
+    ``manage.py drain_deletions``.
+    """
+    key = models.CharField(max_length=255)
+    # Set for shared blobs: the object is only deleted if the blob is still unreferenced
+    digest = models.CharField(max_length=64, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress: an open S3 multipart upload plus the parts
+    received so far. Its id becomes the Image id when the upload is completed.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=200)
+    content_type = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    s3_upload_id = models.CharField(max_length=1024)
+    created = models.DateTimeField(auto_now_add=True)
+    # Sessions past this are aborted by ``manage.py expire_upload_sessions``
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class UploadPart(models.Model):
+    """One stored chunk of an UploadSession; chunk n is S3 part n."""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='parts')
+    number = models.PositiveIntegerField()
+    etag = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'number'], name='uploadpart_session_number_uniq'),
+        ]
@@ -0,0 +1,110 @@
+"""
+Deferred S3 deletes (settings.ASYNC_DELETES).
+
+DELETE removes the Image rows and records their S3 objects in the
+PendingDeletion outbox within one transaction, so the API never waits on S3
+and a row cannot disappear without its object being scheduled for removal.
+``manage.py drain_deletions`` removes the objects in batches and retries
+failures with exponential backoff.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Blob, Derivative, Image, PendingDeletion
+
+# DeleteObjects accepts at most 1000 keys per call
+MAX_BATCH_SIZE = 1000
+
+
+def defer_image_deletes(images):
+    """
+    Delete Image rows and queue their objects, derivatives included. ``images`` is a list of
+    ``(image_id, key, digest)``; ``digest`` is the blob of a deduplicated image
+    (its key is then ignored), or None for an image that owns ``key``.
+    """
+    image_ids = [image_id for image_id, _, _ in images]
+    with transaction.atomic():
+        # Read before the rows cascade away with their images
+        entries = [PendingDeletion(key=key) for key in Derivative.objects.filter(image_id__in=image_ids)
+                   .values_list('key', flat=True)]
+        Image.objects.filter(id__in=image_ids).delete()
+        entries += [PendingDeletion(key=key) for _, key, digest in images if not digest]
+        for digest, references in Counter(digest for _, _, digest in images if digest).items():
+            blob = Blob.objects.select_for_update().get(digest=digest)
+            remaining = max(0, blob.ref_count - references)
+            Blob.objects.filter(digest=digest).update(ref_count=remaining)
+            if remaining == 0:
+                # The row stays at zero references until the worker removes the object
+                entries.append(PendingDeletion(key=blob.key, digest=digest))
+        PendingDeletion.objects.bulk_create(entries)
+
+
+def retry_delay(attempts, base, maximum):
+    """Exponential backoff with jitter, capped at ``maximum`` seconds."""
+    return min(maximum, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+def drain_batch(s3_client, bucket_name, batch_size=500, retry_base=5.0, retry_max=600.0):
+    """
+    Delete the objects of up to ``batch_size`` due outbox entries. Returns
+    ``(deleted, failed)``; failed entries are rescheduled with backoff.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers drain the same outbox
+        entries = list(PendingDeletion.objects.select_for_update(skip_locked=True)
+                       .filter(next_attempt_at__lte=now)
+                       .order_by('next_attempt_at', 'id')[:min(batch_size, MAX_BATCH_SIZE)])
+        if not entries:
+            return 0, 0
+
+        errors = {}
+        plain = [entry for entry in entries if not entry.digest]
+        if plain:
+            errors.update(delete_keys(s3_client, bucket_name, plain))
+        for entry in entries:
+            if entry.digest:
+                try:
+                    delete_unreferenced_blob(s3_client, bucket_name, entry.digest)
+                except Exception as e:
+                    errors[entry.id] = str(e)
+
+        PendingDeletion.objects.filter(id__in=[entry.id for entry in entries if entry.id not in errors]).delete()
+        failed = [entry for entry in entries if entry.id in errors]
+        for entry in failed:
+            entry.attempts += 1
+            entry.last_error = errors[entry.id][:1000]
+            entry.next_attempt_at = now + timedelta(seconds=retry_delay(entry.attempts, retry_base, retry_max))
+        PendingDeletion.objects.bulk_update(failed, ['attempts', 'last_error', 'next_attempt_at'])
+    return len(entries) - len(failed), len(failed)
+
+
+def delete_keys(s3_client, bucket_name, entries):
+    """DeleteObjects for plain entries. Returns ``{entry_id: error}`` for the failures."""
+    try:
+        response = s3_client.delete_objects(Bucket=bucket_name, Delete={
+            'Objects': [{'Key': entry.key} for entry in entries],
+            'Quiet': True
+        })
+    except Exception as e:
+        return {entry.id: str(e) for entry in entries}
+    failed = {error['Key']: error.get('Message') or error.get('Code', 'Error')
+              for error in response.get('Errors', [])}
+    return {entry.id: failed[entry.key] for entry in entries if entry.key in failed}
+
+
+def delete_unreferenced_blob(s3_client, bucket_name, digest):
+    """Remove a blob's object and row, unless an upload referenced it again meanwhile."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(digest=digest).first()
+        if blob is None or blob.ref_count > 0:
+            return False
+        s3_client.delete_object(Bucket=bucket_name, Key=blob.key)
+        blob.delete()
+        return True
+
+
+def pending_count():
+    return PendingDeletion.objects.count()
@@ -0,0 +1,191 @@
+"""
+Streaming reconciliation of the S3 bucket against the database.
+
+Both sides are read in the same order and merge-joined, so memory stays
+bounded by one S3 page plus one page of rows, however large the bucket is:
+
+- ``<image_id>/<file_name>`` objects against Image rows that own their key,
+  ordered by id (S3 lists keys in byte order, and the fixed-width lowercase
+  UUID prefix sorts the same way as the id column);
+- ``blobs/<sha256>`` objects against Blob rows, ordered by digest.
+
+Objects younger than ``min_age`` are ignored, since an upload in progress or
+a presigned upload not yet confirmed has an object but no row yet.
+"""
+import uuid
+from datetime import timedelta
+from django.utils import timezone
+from .blobs import BLOB_KEY_PREFIX
+from .derivatives import DERIVATIVE_KEY_PREFIX
+from .models import Blob, Image, PendingDeletion
+
+
+class Finding:
+    """One mismatch: 'orphan_object', 'missing_object', 'orphan_blob' or 'missing_blob'."""
+
+    def __init__(self, kind, key, image_id=None, size=None):
+        self.kind = kind
+        self.key = key
+        self.image_id = image_id
+        self.size = size
+
+
+class ReconcileStats:
+    def __init__(self):
+        self.objects = 0
+        self.rows = 0
+        self.matched = 0
+        self.recent = 0
+        self.foreign = 0
+        self.findings = {}
+
+    def count(self, kind):
+        self.findings[kind] = self.findings.get(kind, 0) + 1
+
+    def as_dict(self):
+        return {"objects": self.objects, "rows": self.rows, "matched": self.matched,
+                "recent": self.recent, "foreign": self.foreign, **self.findings}
+
+
+def list_objects(s3_client, bucket_name, prefix='', page_size=1000):
+    """Yield every object under ``prefix`` in key order, one page at a time."""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={'PageSize': page_size}):
+        yield from page.get('Contents', [])
+
+
+def image_rows(bucket_name, page_size=1000):
+    """Yield ``(image_id, key)`` of Images that own their object, ordered by id (keyset paging)."""
+    url_prefix = f"https://{bucket_name}.s3.amazonaws.com/"
+    last_id = None
+    while True:
+        rows = Image.objects.filter(blob__isnull=True).order_by('id')
+        if last_id is not None:
+            rows = rows.filter(id__gt=last_id)
+        page = list(rows.values_list('id', 'url')[:page_size])
+        for image_id, url in page:
+            yield str(image_id), url[len(url_prefix):] if url.startswith(url_prefix) else url
+        if len(page) < page_size:
+            return
+        last_id = page[-1][0]
+
+
+def blob_rows(page_size=1000):
+    """Yield ``(digest, key)`` of Blob rows ordered by digest."""
+    last_digest = None
+    while True:
+        rows = Blob.objects.order_by('digest')
+        if last_digest is not None:
+            rows = rows.filter(digest__gt=last_digest)
+        page = list(rows.values_list('digest', 'key')[:page_size])
+        yield from page
+        if len(page) < page_size:
+            return
+        last_digest = page[-1][0]
+
+
+def merge(objects, rows):
+    """
+    Merge-join two streams of ``(sort_key, item)`` sorted by sort_key. Yields
+    ``(object, row)`` pairs where either side is None when it has no partner.
+    """
+    obj, row = next(objects, None), next(rows, None)
+    while obj is not None or row is not None:
+        if row is None or (obj is not None and obj[0] < row[0]):
+            yield obj[1], None
+            obj = next(objects, None)
+        elif obj is None or row[0] < obj[0]:
+            yield None, row[1]
+            row = next(rows, None)
+        else:
+            yield obj[1], row[1]
+            obj, row = next(objects, None), next(rows, None)
+
+
+def reconcile(s3_client, bucket_name, min_age=timedelta(hours=1), page_size=1000, stats=None):
+    """Yield a Finding for every mismatch between the bucket and the database."""
+    stats = stats if stats is not None else ReconcileStats()
+    cutoff = timezone.now() - min_age
+
+    def image_objects():
+        for obj in list_objects(s3_client, bucket_name, page_size=page_size):
+            key = obj['Key']
+            if key.startswith((BLOB_KEY_PREFIX, DERIVATIVE_KEY_PREFIX)):
+                # Blobs get their own pass; derivatives go with their image rows
+                continue
+            stats.objects += 1
+            image_id, _, file_name = key.partition('/')
+            try:
+                valid = file_name and str(uuid.UUID(image_id)) == image_id
+            except ValueError:
+                valid = False
+            if not valid:
+                # Not written by this app; never reported for deletion
+                stats.foreign += 1
+                continue
+            yield (image_id, key), obj
+
+    def images():
+        for image_id, key in image_rows(bucket_name, page_size):
+            stats.rows += 1
+            yield (image_id, key), (image_id, key)
+
+    def blob_objects():
+        for obj in list_objects(s3_client, bucket_name, prefix=BLOB_KEY_PREFIX, page_size=page_size):
+            stats.objects += 1
+            yield obj['Key'][len(BLOB_KEY_PREFIX):], obj
+
+    def blobs():
+        for digest, key in blob_rows(page_size):
+            stats.rows += 1
+            yield digest, (digest, key)
+
+    for objects, rows, orphan, missing in ((image_objects(), images(), 'orphan_object', 'missing_object'),
+                                           (blob_objects(), blobs(), 'orphan_blob', 'missing_blob')):
+        for obj, row in merge(objects, rows):
+            if obj is not None and row is not None:
+                stats.matched += 1
+            elif obj is not None:
+                if obj['LastModified'] > cutoff:
+                    stats.recent += 1
+                    continue
+                stats.count(orphan)
+                yield Finding(orphan, obj['Key'], size=obj.get('Size'))
+            else:
+                stats.count(missing)
+                yield Finding(missing, row[1], image_id=row[0])
+
+
+def still_orphaned(keys):
+    """Keys from ``keys`` that still have no row and are not queued for deletion."""
+    image_ids = {key.partition('/')[0] for key in keys if not key.startswith(BLOB_KEY_PREFIX)}
+    digests = {key[len(BLOB_KEY_PREFIX):] for key in keys if key.startswith(BLOB_KEY_PREFIX)}
+    existing_ids = {str(image_id) for image_id in Image.objects.filter(id__in=image_ids)
+                    .values_list('id', flat=True)}
+    existing_digests = set(Blob.objects.filter(digest__in=digests).values_list('digest', flat=True))
+    queued = set(PendingDeletion.objects.filter(key__in=keys).values_list('key', flat=True))
+
+    def orphaned(key):
+        if key in queued:
+            return False
+        if key.startswith(BLOB_KEY_PREFIX):
+            return key[len(BLOB_KEY_PREFIX):] not in existing_digests
+        return key.partition('/')[0] not in existing_ids
+
+    return [key for key in keys if orphaned(key)]
+
+
+def still_missing(s3_client, bucket_name, findings):
+    """Findings whose object is confirmed absent by a HEAD request."""
+    from botocore.exceptions import ClientError
+
+    missing = []
+    for finding in findings:
+        try:
+            s3_client.head_object(Bucket=bucket_name, Key=finding.key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                missing.append(finding)
+                continue
+            raise
+    return missing
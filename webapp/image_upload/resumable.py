@@ -0,0 +1,161 @@
+"""
+Resumable chunked uploads.
+
+A session opens an S3 multipart upload and is persisted as an UploadSession,
+so any worker can accept the next chunk. Chunk n is sent to S3 as part n as
+soon as it arrives; re-sending a chunk replaces it, so a client that lost its
+connection asks for the session's offset and carries on from there.
+Completing the session stitches the parts together in S3 and creates the
+Image row under the session's id. ``manage.py expire_upload_sessions`` aborts
+sessions that were abandoned, so their parts stop costing storage.
+"""
+import base64
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timedelta
+from botocore.exceptions import ClientError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import Image, UploadPart, UploadSession
+
+logger = logging.getLogger('webapp')
+
+# S3 multipart limits: every part but the last needs 5 MiB, at most 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class UploadSessionError(Exception):
+    """A request the session cannot accept; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def create_session(s3_client, bucket_name, file_name, content_type, expires_in):
+    session_id = uuid.uuid4()
+    key = f"{session_id}/{file_name}"
+    upload = s3_client.create_multipart_upload(Bucket=bucket_name, Key=key, ContentType=content_type, Metadata={
+        'upload_date': datetime.utcnow().strftime("%Y-%m-%d"),
+        'filename': file_name,
+        'file_type': content_type,
+        'file_path': key,
+        'file_id': str(session_id)
+    })
+    return UploadSession.objects.create(id=session_id, file_name=file_name, content_type=content_type, key=key,
+                                        s3_upload_id=upload['UploadId'],
+                                        expires_at=timezone.now() + timedelta(seconds=expires_in))
+
+
+def active_session(session_id):
+    """The session if it exists and has not expired, else None."""
+    return UploadSession.objects.filter(id=session_id, expires_at__gt=timezone.now()).first()
+
+
+def store_part(s3_client, bucket_name, session, number, data, max_bytes, content_md5=None):
+    """Upload one chunk as S3 part ``number`` and record it, replacing an earlier copy."""
+    if not 1 <= number <= MAX_PARTS:
+        raise UploadSessionError(400, f"Part number must be between 1 and {MAX_PARTS}.")
+    others = session.parts.exclude(number=number).aggregate(total=Sum('size'))['total'] or 0
+    if others + len(data) > max_bytes:
+        raise UploadSessionError(413, f"Upload exceeds {max_bytes} bytes.")
+
+    if content_md5 and base64.b64encode(hashlib.md5(data).digest()).decode() != content_md5:
+        # Corrupted in transit: the client re-sends the chunk
+        raise UploadSessionError(400, "Content-MD5 mismatch.")
+
+    response = s3_client.upload_part(Bucket=bucket_name, Key=session.key, UploadId=session.s3_upload_id,
+                                     PartNumber=number, Body=data)
+    part, _ = UploadPart.objects.update_or_create(session=session, number=number,
+                                                  defaults={'etag': response['ETag'], 'size': len(data)})
+    return part
+
+
+def session_progress(session):
+    """
+    ``(parts, offset, next_part)``: the stored parts, the byte offset covered by
+    parts 1..n without gaps, and the first part number missing from that run.
+    """
+    parts = list(session.parts.order_by('number'))
+    offset, next_part = 0, 1
+    for part in parts:
+        if part.number != next_part:
+            break
+        offset += part.size
+        next_part += 1
+    return parts, offset, next_part
+
+
+def complete_session(s3_client, bucket_name, session_id):
+    """
+    Assemble the parts and create the Image. Returns ``(image, created)``; a
+    repeated call after success returns the existing image, so clients can retry.
+    """
+    with transaction.atomic():
+        # Locked so two concurrent completes cannot both assemble the object
+        session = UploadSession.objects.select_for_update().filter(id=session_id).first()
+        if session is None:
+            image = Image.objects.filter(id=session_id).first()
+            if image is None:
+                raise UploadSessionError(404, "Upload session not found.")
+            return image, False
+        if session.expires_at <= timezone.now():
+            raise UploadSessionError(404, "Upload session expired.")
+
+        parts = list(session.parts.order_by('number'))
+        if not parts:
+            raise UploadSessionError(409, "No parts uploaded.")
+        missing = sorted(set(range(1, parts[-1].number + 1)) - {part.number for part in parts})
+        if missing:
+            raise UploadSessionError(409, f"Missing parts: {missing[:20]}")
+        if any(part.size < MIN_PART_SIZE for part in parts[:-1]):
+            raise UploadSessionError(400, f"Every part but the last must be at least {MIN_PART_SIZE} bytes.")
+
+        s3_client.complete_multipart_upload(Bucket=bucket_name, Key=session.key, UploadId=session.s3_upload_id,
+                                            MultipartUpload={'Parts': [{'ETag': part.etag, 'PartNumber': part.number}
+                                                                       for part in parts]})
+        image = Image.objects.create(id=session.id, file_name=session.file_name,
+                                     url=f"https://{bucket_name}.s3.amazonaws.com/{session.key}")
+        session.delete()
+    return image, True
+
+
+def abort_session(s3_client, bucket_name, session):
+    """Abort the multipart upload (dropping its parts in S3) and forget the session."""
+    try:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=session.key, UploadId=session.s3_upload_id)
+    except ClientError as e:
+        # Already completed or aborted on the S3 side: nothing left to clean up
+        if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+            raise
+    session.delete()
+
+
+def expire_sessions(s3_client, bucket_name, batch_size=100):
+    """Abort every session past its expiry. Returns ``(aborted, failed)``."""
+    aborted = failed = 0
+    last_id = None
+    while True:
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now()).order_by('id')
+        if last_id is not None:
+            # Failed sessions stay behind; move past them instead of retrying them forever
+            expired = expired.filter(id__gt=last_id)
+        batch = list(expired[:batch_size])
+        if not batch:
+            return aborted, failed
+        for session in batch:
+            try:
+                abort_session(s3_client, bucket_name, session)
+                aborted += 1
+            except Exception as e:
+                failed += 1
+                logger.error({
+                    "level": "ERROR",
+                    "message": f"Aborting upload session {session.id} failed.",
+                    "error": str(e),
+                    "operation": "expire_upload_sessions"
+                })
+        last_id = batch[-1].id
@@ -0,0 +1,11 @@
+"""
+The image API's S3 client and bucket, shared by the views and the management
+commands. Importing this module builds nothing: the client is a
+``LazyClient`` (see webapp.aws).
+"""
+import os
+from decouple import config
+from webapp.aws import LazyClient
+
+s3_client = LazyClient('s3')
+BUCKET_NAME = os.getenv('S3_BUCKET_NAME', config('S3_BUCKET_NAME'))
@@ -0,0 +1,181 @@
+import hashlib
+import time
+import uuid
+from datetime import datetime
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3UploadedFile(UploadedFile):
+    """
+    An uploaded file whose bytes already live in S3. There is no local copy to
+    read from; the view only needs the key and the metadata.
+    """
+
+    def __init__(self, name, content_type, size, image_id, key, upload_date, s3_time_ms,
+                 charset=None, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.image_id = image_id
+        self.key = key
+        self.upload_date = upload_date
+        self.s3_time_ms = s3_time_ms
+
+
+class S3StreamingUploadHandler(FileUploadHandler):
+    """
+    Forward one file field of a multipart request to S3 while it is being received.
+
+    Incoming chunks are collected into a single part buffer that is sent as an S3
+    multipart part once it reaches ``part_size``, so per-request memory stays at
+    about one part no matter how large the image is and nothing is spooled to
+    disk. Files that fit in one part are sent with a single ``put_object``.
+    Call ``abort()`` if parsing the request fails (e.g. client disconnect).
+    """
+
+    def __init__(self, s3_client, bucket_name, target_field='profilePic',
+                 part_size=S3_MIN_PART_SIZE, request=None):
+        super().__init__(request)
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.target_field = target_field
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.active = False
+        self.upload_id = None
+        self.uploaded_file = None
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length,
+                         charset, content_type_extra)
+        # Only the first file of the target field goes to S3, the rest fall through
+        self.active = field_name == self.target_field and self.uploaded_file is None
+        if not self.active:
+            return
+
+        self.image_id = str(uuid.uuid4())
+        self.key = f"{self.image_id}/{file_name}"
+        self.upload_date = datetime.utcnow().strftime("%Y-%m-%d")
+        self.metadata = {
+            'upload_date': self.upload_date,
+            'filename': file_name,
+            'file_type': content_type,
+            'file_path': self.key,
+            'file_id': self.image_id
+        }
+        self.buffer = bytearray()
+        self.parts = []
+        self.s3_time_ms = 0.0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.buffer += raw_data
+        if len(self.buffer) >= self.part_size:
+            self._send_part()
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+
+        try:
+            s3_start = time.time()
+            if self.upload_id is None:
+                # Whole file fits in one part: a plain PUT is one round trip instead of three
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=self.key,
+                                          Body=bytes(self.buffer), Metadata=self.metadata)
+            else:
+                if self.buffer:
+                    self._send_part()
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+                    MultipartUpload={'Parts': self.parts})
+                self.upload_id = None
+            self.s3_time_ms += (time.time() - s3_start) * 1000
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.buffer = bytearray()
+
+        self.uploaded_file = S3UploadedFile(
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            image_id=self.image_id,
+            key=self.key,
+            upload_date=self.upload_date,
+            s3_time_ms=self.s3_time_ms,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+        return self.uploaded_file
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def abort(self):
+        """Drop an unfinished multipart upload so S3 does not keep the orphaned parts."""
+        self.active = False
+        self.buffer = bytearray()
+        if self.upload_id is not None:
+            upload_id, self.upload_id = self.upload_id, None
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key,
+                                                  UploadId=upload_id)
+
+    def _send_part(self):
+        s3_start = time.time()
+        try:
+            if self.upload_id is None:
+                self.upload_id = self.s3_client.create_multipart_upload(
+                    Bucket=self.bucket_name, Key=self.key, Metadata=self.metadata)['UploadId']
+            part_number = len(self.parts) + 1
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=bytes(self.buffer))
+        except Exception:
+            self.abort()
+            raise
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.buffer = bytearray()
+        self.s3_time_ms += (time.time() - s3_start) * 1000
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the SHA-256 of each ``target_field`` file while it is received and
+    pass the data on unchanged to the next handler, which stores the file as
+    usual. ``digests`` follows the order of ``request.FILES.getlist(target_field)``.
+    """
+
+    def __init__(self, target_field='profilePic', request=None):
+        super().__init__(request)
+        self.target_field = target_field
+        self.digests = []
+        self.hash = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.hash = hashlib.sha256() if field_name == self.target_field else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.hash is not None:
+            self.hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.hash is not None:
+            self.digests.append(self.hash.hexdigest())
+            self.hash = None
+        return None
+
+    def tag_files(self, files):
+        """Set ``sha256`` on the parsed files of the target field."""
+        for uploaded_file, digest in zip(files, self.digests):
+            uploaded_file.sha256 = digest
@@ -1,8 +1,25 @@
 # webapp/image_upload/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import upload_image, handle_image
+from .views import (upload_image, handle_image, upload_image_async, handle_image_async,
+                    presign_upload, confirm_upload, handle_batch, image_content, image_content_async,
+                    create_upload_session, upload_session, upload_session_part, complete_upload_session)
+
+# Serve the async views when running under ASGI with ASYNC_VIEWS enabled
+if settings.ASYNC_VIEWS:
+    upload_image, handle_image = upload_image_async, handle_image_async
+    image_content = image_content_async
 
 urlpatterns = [
     path('v1/file', upload_image, name='upload_image'),
+    path('v1/file/batch', handle_batch, name='handle_batch'),
+    path('v1/file/presign', presign_upload, name='presign_upload'),
+    path('v1/file/confirm', confirm_upload, name='confirm_upload'),
+    path('v1/file/uploads', create_upload_session, name='create_upload_session'),
+    path('v1/file/uploads/<str:session_id>', upload_session, name='upload_session'),
+    path('v1/file/uploads/<str:session_id>/parts/<int:part_number>', upload_session_part,
+         name='upload_session_part'),
+    path('v1/file/uploads/<str:session_id>/complete', complete_upload_session, name='complete_upload_session'),
     path('v1/file/<str:image_id>', handle_image, name='handle_image'),
-]
\ No newline at end of file
+    path('v1/file/<str:image_id>/content', image_content, name='image_content'),
+]
@@ -1,290 +1,1555 @@
 import logging
-import time
-import boto3
 import watchtower
 import os
 import uuid
 import json
-from datetime import datetime
-import statsd
-from decouple import config
+import base64
+import calendar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from asgiref.sync import sync_to_async
+from botocore.exceptions import BotoCoreError, ClientError
 from django.shortcuts import render
-from django.http import JsonResponse
 from django.conf import settings
-from django.db import DatabaseError, OperationalError
-from .models import Image
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, OperationalError, router, transaction
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from webapp import fastjson, metrics
+from webapp.breakers import CircuitOpenError, circuit_open_response
+from webapp.fastjson import FastJsonResponse
+from .blobs import acquire_blob, delete_blob_image, release_blob
+from .cache import ImageMetadataCache, image_metadata, metadata_etag
+from .content import (AsyncObjectStream, ObjectStream, content_response, error_response, error_status,
+                      if_range_matches, object_request)
+from .derivatives import DerivativePipeline, derivative_keys
+from .imaging import parse_specs
+from .outbox import defer_image_deletes
+from .models import Derivative, Image
+from .resumable import (MIN_PART_SIZE, UploadSessionError, abort_session, active_session, complete_session,
+                        create_session, session_progress, store_part)
+from .storage import BUCKET_NAME, s3_client
+from .upload_handlers import HashingUploadHandler, S3StreamingUploadHandler, S3UploadedFile
 
 # Initialize logging
 logger = logging.getLogger('webapp')
 
-# Initialize CloudWatch Metrics Client
-cloudwatch = boto3.client('cloudwatch', region_name=config('AWS_REGION_NAME', default="us-east-1"))
+# Shared StatsD client; buffers into the request's pipeline (see webapp.metrics)
+statsd_client = metrics.statsd_client
 
-# Initialize StatsD client
-statsd_client = statsd.StatsClient('localhost', 8125)
+# Read-through cache in front of the Image lookup for GET /v1/file/<id>
+image_cache = ImageMetadataCache(
+    max_entries=settings.IMAGE_CACHE_MAX_ENTRIES,
+    ttl=settings.IMAGE_CACHE_TTL,
+    negative_ttl=settings.IMAGE_CACHE_NEGATIVE_TTL,
+    local_ttl=settings.IMAGE_CACHE_LOCAL_TTL,
+    backend_alias=settings.IMAGE_CACHE_BACKEND or None,
+    statsd_client=statsd_client
+)
 
-# AWS S3
-s3_client = boto3.client('s3')
-BUCKET_NAME = os.getenv('S3_BUCKET_NAME', config('S3_BUCKET_NAME'))
+# Thumbnails and other renditions, built off the request path (IMAGE_DERIVATIVES)
+derivative_pipeline = DerivativePipeline(
+    parse_specs(settings.IMAGE_DERIVATIVES), s3_client, BUCKET_NAME,
+    workers=settings.DERIVATIVE_WORKERS,
+    quality=settings.DERIVATIVE_QUALITY,
+    max_source_bytes=settings.DERIVATIVE_MAX_SOURCE_BYTES,
+    statsd_client=statsd_client,
+    on_complete=image_cache.invalidate
+)
 
 
-def upload_image(request):
-    start_time = time.time()  # Start timer for API execution
+def schedule_derivatives(image_id, key):
+    """Queue the configured renditions of a newly stored image."""
+    if derivative_pipeline.specs:
+        derivative_pipeline.submit(image_id, key)
 
-    # Increment API call counter with StatsD
-    statsd_client.incr('api.upload_image.calls')
 
-    if request.method == 'POST':
-        if request.FILES.get('profilePic'):
-            try:
-                image = request.FILES['profilePic']
-                image_id = str(uuid.uuid4())
-                file_name = image.name
-                upload_date = datetime.utcnow().strftime("%Y-%m-%d")
-                file_path = f"{image_id}/{file_name}"
-                # Structured logging
-                logger.info(json.dumps({
-                    "level": "INFO",
-                    "message": f"Uploading image {file_name} to S3.",
-                    "file_name": file_name,
-                    "operation": "s3_upload",
-                    "endpoint": "/upload-image",
-                    "method": "POST",
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
-
-                # S3 upload with timing
-                s3_upload_start = time.time()
-                with statsd_client.timer('s3.upload_time'):
-                    s3_client.upload_fileobj(image, BUCKET_NAME, file_path,
-                                             ExtraArgs={
-                                                 'Metadata': {
-                                                     'upload_date': upload_date,
-                                                     'filename': file_name,
-                                                     'file_type': image.content_type,
-                                                     'file_path': file_path,
-                                                     'file_id': image_id
-                                                 }})
-                    # Convert to ms
-                s3_upload_time = (time.time() - s3_upload_start) * 1000
-
-                s3_url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_path}"
-
-                # Save to database with timing
-                db_start_time = time.time()
-                try:
-                    with statsd_client.timer('database.save_time'):
-                        image_record = Image.objects.create(id=image_id, file_name=file_name,
-                                                            upload_date=upload_date, url=s3_url)
-                except (DatabaseError, OperationalError) as db_error:
-                    logger.error(json.dumps({
-                        "level": "ERROR",
-                        "message": "Database error occurred.",
-                        "error": str(db_error),
-                        "operation": "database_save",
-                        "endpoint": "/upload-image",
-                        "method": "POST",
-                        "timestamp": datetime.utcnow().isoformat()
-                    }))
-                    s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_path)
-                    return JsonResponse({"error": "Database error. Please try again later."}, status=503)
-                db_execution_time = (time.time() - db_start_time) * 1000  # Convert to ms
-                # Structured logging for success
-                logger.info(json.dumps({
-                    "level": "INFO",
-                    "message": f"Image {file_name} uploaded successfully.",
-                    "file_name": file_name,
-                    "image_id": image_id,
-                    "operation": "upload_success",
-                    "endpoint": "/upload-image",
-                    "method": "POST",
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
-
-
-
-                # Record S3 upload time with StatsD
-                statsd_client.timing('s3.upload_image.duration', s3_upload_time)
-
-                # Record database save time with StatsD
-                statsd_client.timing('database.save_image.duration', db_execution_time)
-
-                # Record API execution time with StatsD
-                api_time = (time.time() - start_time) * 1000
-                statsd_client.timing('api.upload_image.duration', api_time)
-
-                return JsonResponse({
-                    "file_name": file_name,
-                    "id": image_id,
-                    "url": s3_url,
-                    "upload_date": upload_date,
-                    "image_type": image.content_type
-                }, status=201)
-            except Exception as e:
-                logger.exception(json.dumps({
-                    "level": "ERROR",
-                    "message": "Error uploading image.",
-                    "error": str(e),
-                    "operation": "upload_failure",
-                    "endpoint": "/upload-image",
-                    "method": "POST",
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
-                return JsonResponse({"error": str(e)}, status=503)
+def derivatives_of(image_record):
+    """Derivative rows to include in the metadata, or None when derivatives are off."""
+    if not derivative_pipeline.specs:
+        return None
+    return list(image_record.derivatives.all())
 
-        logger.warning(json.dumps({
-            "level": "WARNING",
-            "message": "Bad request: Missing image file.",
-            "operation": "validate_request",
+
+def metadata_response(request, metadata, etag):
+    """
+    GET /v1/file/<id> answer: 304 (or 412) when the request's validators say so,
+    decided before any serialisation, otherwise the metadata as JSON.
+    """
+    last_modified = metadata_last_modified(metadata)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FastJsonResponse(metadata, status=200)
+    elif response.status_code != 304:
+        return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if derivatives_pending(metadata):
+        # The document changes once the renditions land; revalidate until then
+        response['Cache-Control'] = 'no-cache'
+    else:
+        # Short-lived, not immutable: a DELETE has to show up; afterwards the ETag makes revalidation cheap
+        response['Cache-Control'] = f"public, max-age={settings.IMAGE_METADATA_MAX_AGE}"
+    return response
+
+
+def metadata_last_modified(metadata):
+    """Timestamp of upload_date; None once derivatives are listed, since they are added later."""
+    if "derivatives" in metadata:
+        return None
+    return calendar.timegm(date.fromisoformat(metadata["upload_date"]).timetuple())
+
+
+def derivatives_pending(metadata):
+    return "derivatives" in metadata and len(metadata["derivatives"]) < len(derivative_pipeline.specs)
+
+
+def not_found_response():
+    response = FastJsonResponse({"error": "Not Found"}, status=404)
+    # Never cached: a presigned upload's ID answers 404 until it is confirmed
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def attach_streaming_upload(request):
+    """Stream profilePic straight to S3 while the body is parsed, instead of spooling it first."""
+    if not settings.S3_STREAMING_UPLOADS:
+        return None
+    handler = S3StreamingUploadHandler(s3_client, BUCKET_NAME, part_size=settings.S3_UPLOAD_PART_SIZE,
+                                       request=request)
+    request.upload_handlers.insert(0, handler)
+    return handler
+
+
+def attach_upload_handlers(request):
+    """
+    Hash profilePic while it is received when uploads are deduplicated, otherwise
+    stream it to S3. Returns the handler to pass to read_upload.
+    """
+    if settings.IMAGE_DEDUP:
+        handler = HashingUploadHandler(request=request)
+        request.upload_handlers.insert(0, handler)
+        return handler
+    return attach_streaming_upload(request)
+
+
+def read_upload(request, upload_handler):
+    """Parse the multipart body, aborting the S3 multipart upload if the client goes away."""
+    try:
+        image = request.FILES.get('profilePic')
+    except Exception:
+        if isinstance(upload_handler, S3StreamingUploadHandler):
+            upload_handler.abort()
+        raise
+    if isinstance(upload_handler, HashingUploadHandler):
+        upload_handler.tag_files(request.FILES.getlist('profilePic'))
+    return image
+
+
+def store_deduplicated(image):
+    """Reference the blob holding these bytes, uploading them only if they are new."""
+    blob, uploaded = acquire_blob(s3_client, BUCKET_NAME, image, image.sha256, image.content_type)
+    if uploaded:
+        statsd_client.incr('dedup.miss')
+    else:
+        statsd_client.incr('dedup.hit')
+        statsd_client.incr('dedup.bytes_saved', image.size)
+    return blob
+
+
+def read_image(image_id, queryset=None):
+    """
+    The image with this id. A miss on a read replica is confirmed on the primary,
+    so replica lag cannot turn a fresh upload into a (cached) 404.
+    """
+    queryset = Image.objects.all() if queryset is None else queryset
+    alias = router.db_for_read(Image)
+    try:
+        return queryset.using(alias).get(id=image_id)
+    except Image.DoesNotExist:
+        if alias == DEFAULT_DB_ALIAS:
+            raise
+        statsd_client.incr('database.replica.miss')
+        return queryset.using(DEFAULT_DB_ALIAS).get(id=image_id)
+
+
+async def aread_image(image_id, queryset=None):
+    queryset = Image.objects.all() if queryset is None else queryset
+    alias = router.db_for_read(Image)
+    try:
+        return await queryset.using(alias).aget(id=image_id)
+    except Image.DoesNotExist:
+        if alias == DEFAULT_DB_ALIAS:
+            raise
+        statsd_client.incr('database.replica.miss')
+        return await queryset.using(DEFAULT_DB_ALIAS).aget(id=image_id)
+
+
+def object_key(image_record):
+    return image_record.url.split(f"{BUCKET_NAME}.s3.amazonaws.com/")[1]
+
+
+def release_deduplicated(digest):
+    with transaction.atomic():
+        release_blob(s3_client, BUCKET_NAME, digest)
+
+
+def upload_read_error_response(error):
+    """503 when S3 failed while streaming, 400 when the request body itself was broken."""
+    if isinstance(error, CircuitOpenError):
+        return circuit_open_response(error)
+    if isinstance(error, (BotoCoreError, ClientError)):
+        logger.error({
+            "level": "ERROR",
+            "message": "Error streaming image to S3.",
+            "error": str(error),
+            "operation": "s3_upload",
             "endpoint": "/upload-image",
-            "method": "POST",
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": "Bad Request"}, status=400)
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": str(error)}, status=503)
+    logger.warning({
+        "level": "WARNING",
+        "message": "Bad request: Upload interrupted or malformed.",
+        "error": str(error),
+        "operation": "validate_request",
+        "endpoint": "/upload-image",
+        "method": "POST"
+    })
+    return FastJsonResponse({"error": "Bad Request"}, status=400)
+
 
-    logger.warning(json.dumps({
+def method_not_allowed_response(endpoint, method):
+    logger.warning({
         "level": "ERROR",
         "message": "Method Not Allowed.",
         "operation": "validate_request",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+
+def missing_file_response():
+    logger.warning({
+        "level": "WARNING",
+        "message": "Bad request: Missing image file.",
+        "operation": "validate_request",
         "endpoint": "/upload-image",
-        "method": "POST",
-        "timestamp": datetime.utcnow().isoformat()
-    }))
-    return JsonResponse({"error": "Method Not Allowed"}, status=405)
+        "method": "POST"
+    })
+    return FastJsonResponse({"error": "Bad Request"}, status=400)
 
 
-def handle_image(request, image_id=None):
-    start_time = time.time()  # API timer
-    endpoint = f"/v1/file/{image_id}"
-    method = request.method
+def new_upload_id():
+    """ID and upload date of an image that is not in S3 yet."""
+    return str(uuid.uuid4()), datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def s3_upload_args(image, image_id, upload_date, file_path):
+    """Log the S3 upload of an image and return the ExtraArgs of its upload_fileobj call."""
+    logger.info({
+        "level": "INFO",
+        "message": f"Uploading image {image.name} to S3.",
+        "file_name": image.name,
+        "operation": "s3_upload",
+        "endpoint": "/upload-image",
+        "method": "POST"
+    })
+    return {
+        'Metadata': {
+            'upload_date': upload_date,
+            'filename': image.name,
+            'file_type': image.content_type,
+            'file_path': file_path,
+            'file_id': image_id
+        }}
+
+
+def s3_url_for(file_path):
+    return f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_path}"
+
+
+def upload_db_error_response(db_error):
+    """503 for an upload whose row could not be saved; the caller removes the S3 object."""
+    logger.error({
+        "level": "ERROR",
+        "message": "Database error occurred.",
+        "error": str(db_error),
+        "operation": "database_save",
+        "endpoint": "/upload-image",
+        "method": "POST"
+    })
+    return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+
+
+def uploaded_response(image, image_id, upload_date, s3_url, s3_upload_time, db_execution_time):
+    """Log and time a stored upload, and answer 201 with its fields."""
+    logger.info({
+        "level": "INFO",
+        "message": f"Image {image.name} uploaded successfully.",
+        "file_name": image.name,
+        "image_id": image_id,
+        "operation": "upload_success",
+        "endpoint": "/upload-image",
+        "method": "POST"
+    })
+
+    # Record S3 upload time with StatsD
+    statsd_client.timing('s3.upload_image.duration', s3_upload_time)
+
+    # Record database save time with StatsD
+    statsd_client.timing('database.save_image.duration', db_execution_time)
+
+    return FastJsonResponse({
+        "file_name": image.name,
+        "id": image_id,
+        "url": s3_url,
+        "upload_date": upload_date,
+        "image_type": image.content_type
+    }, status=201)
+
+
+def upload_failed_response(error):
+    logger.exception({
+        "level": "ERROR",
+        "message": "Error uploading image.",
+        "error": str(error),
+        "operation": "upload_failure",
+        "endpoint": "/upload-image",
+        "method": "POST"
+    })
+    return FastJsonResponse({"error": str(error)}, status=503)
+
+
+def upload_image(request):
     if request.method == 'GET':
-        statsd_client.incr('api.get_image.calls')
-    elif request.method == 'DELETE':
-        statsd_client.incr('api.delete_image.calls')
+        return list_images(request)
+    if request.method != 'POST':
+        return method_not_allowed_response("/upload-image", "POST")
+
+    upload_handler = attach_upload_handlers(request)
+    try:
+        image = read_upload(request, upload_handler)
+    except Exception as e:
+        return upload_read_error_response(e)
+    if not image:
+        return missing_file_response()
+
+    try:
+        blob = None
+        if isinstance(image, S3UploadedFile):
+            # Bytes were already streamed to S3 while the request was parsed
+            image_id, upload_date, file_path = image.image_id, image.upload_date, image.key
+            s3_upload_time = image.s3_time_ms
+            statsd_client.timing('s3.upload_time', s3_upload_time)
+        elif hasattr(image, 'sha256'):
+            # Content-addressed: known bytes are not sent to S3 again
+            image_id, upload_date = new_upload_id()
+            with statsd_client.timer('s3.upload_time') as s3_upload_timer:
+                blob = store_deduplicated(image)
+            s3_upload_time = s3_upload_timer.ms
+            file_path = blob.key
+        else:
+            image_id, upload_date = new_upload_id()
+            file_path = f"{image_id}/{image.name}"
+            extra_args = s3_upload_args(image, image_id, upload_date, file_path)
+            with statsd_client.timer('s3.upload_time') as s3_upload_timer:
+                s3_client.upload_fileobj(image, BUCKET_NAME, file_path, ExtraArgs=extra_args)
+            s3_upload_time = s3_upload_timer.ms
+
+        s3_url = s3_url_for(file_path)
+        try:
+            with statsd_client.timer('database.save_time') as db_save_timer:
+                image_record = Image.objects.create(id=image_id, file_name=image.name,
+                                                    upload_date=upload_date, url=s3_url, blob=blob)
+        except (DatabaseError, OperationalError) as db_error:
+            if blob is not None:
+                release_deduplicated(blob.digest)
+            else:
+                s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_path)
+            return upload_db_error_response(db_error)
+        image_cache.set(image_id, image_metadata(image_record))
+        schedule_derivatives(image_id, file_path)
+        return uploaded_response(image, image_id, upload_date, s3_url, s3_upload_time, db_save_timer.ms)
+    except Exception as e:
+        return upload_failed_response(e)
+
 
+def validate_image_id(image_id, endpoint, method):
+    """The image ID as a UUID and None, or None and the 400 response for a missing or malformed ID."""
     if not image_id:
-        logger.warning(json.dumps({
+        logger.warning({
             "level": "WARNING",
             "message": "Bad request: Missing image_id",
             "operation": "validate_request",
             "endpoint": endpoint,
-            "method": method,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": "Bad Request"}, status=400)
+            "method": method
+        })
+        return None, FastJsonResponse({"error": "Bad Request"}, status=400)
 
     try:
-        uuid_obj = uuid.UUID(image_id)
+        return uuid.UUID(image_id), None
     except ValueError:
-        logger.warning(json.dumps({
+        logger.warning({
             "level": "WARNING",
             "message": f"Invalid UUID format: {image_id}",
             "operation": "validate_uuid",
             "endpoint": endpoint,
-            "method": method,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": "Invalid UUID"}, status=400)
+            "method": method
+        })
+        return None, FastJsonResponse({"error": "Invalid UUID"}, status=400)
+
+
+def log_image_request(message, operation, endpoint, method):
+    logger.info({
+        "level": "INFO",
+        "message": message,
+        "operation": operation,
+        "endpoint": endpoint,
+        "method": method
+    })
+
+
+def image_error_response(error, image_id, endpoint, method):
+    """Map an error of GET/DELETE /v1/file/<id> to 404, or to 503 with Retry-After when a breaker is open."""
+    if isinstance(error, Image.DoesNotExist):
+        logger.error({
+            "level": "ERROR",
+            "message": f"Image with ID {image_id} not found.",
+            "operation": "fetch_image",
+            "endpoint": endpoint,
+            "method": method
+        })
+        return not_found_response()
+    if isinstance(error, DatabaseError):
+        logger.error({
+            "level": "ERROR",
+            "message": "Database error occurred.",
+            "error": str(error),
+            "operation": "database_query",
+            "endpoint": endpoint,
+            "method": method
+        })
+        return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+    if isinstance(error, CircuitOpenError):
+        return circuit_open_response(error)
+    logger.exception({
+        "level": "ERROR",
+        "message": "Unexpected error occurred.",
+        "error": str(error),
+        "operation": "unknown_error",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({"error": str(error)}, status=503)
+
+
+def handle_image(request, image_id=None):
+    endpoint = f"/v1/file/{image_id}"
+    method = request.method
+    uuid_obj, invalid = validate_image_id(image_id, endpoint, method)
+    if invalid is not None:
+        return invalid
 
     try:
         if request.method == 'GET':
-            logger.info(json.dumps({
-                "level": "INFO",
-                "message": f"Fetching image with ID {image_id}.",
-                "operation": "fetch_image",
-                "endpoint": endpoint,
-                "method": method,
-                "timestamp": datetime.utcnow().isoformat()
-            }))
-            db_start_time = time.time()
+            log_image_request(f"Fetching image with ID {image_id}.", "fetch_image", endpoint, method)
+            found, metadata, etag = image_cache.get_entry(str(uuid_obj))
+            if found and metadata is None:
+                # Cached 404, skip the DB round trip
+                raise Image.DoesNotExist
+            if not found:
+                with statsd_client.timer('database.query_time'):
+                    image_record = read_image(image_id)
+
+                metadata = image_metadata(image_record, derivatives_of(image_record))
+                etag = metadata_etag(metadata)
+                image_cache.set(str(uuid_obj), metadata, etag)
+
+            return metadata_response(request, metadata, etag)
 
+        elif request.method == 'DELETE':
+            log_image_request(f"Deleting image with ID {image_id}.", "delete_image", endpoint, method)
             with statsd_client.timer('database.query_time'):
                 image_record = Image.objects.get(id=image_id)
 
-            db_execution_time = (time.time() - db_start_time)
+            if settings.ASYNC_DELETES:
+                # Row and outbox entry in one transaction; the S3 delete happens in the worker
+                with statsd_client.timer('database.delete_time'):
+                    defer_image_deletes([(image_record.id, object_key(image_record), image_record.blob_id)])
+                image_cache.mark_deleted(str(uuid_obj))
+                return FastJsonResponse({}, status=204)
 
-            # TODO check time in console logs if roudoff is happening its crt and match with data in metrics
-            # Record API execution time with StatsD
-            api_time = (time.time() - start_time) * 1000
-            statsd_client.timing('api.get_image.duration', api_time)
+            # Read before the derivative rows cascade away with the image
+            rendition_keys = derivative_keys([image_record.id])
+            if image_record.blob_id:
+                # Shared blob: the S3 object only goes with its last reference
+                with statsd_client.timer('s3.delete_time') as s3_delete_timer:
+                    delete_blob_image(s3_client, BUCKET_NAME, image_record.id, image_record.blob_id)
+            else:
+                file_key = object_key(image_record)
 
-            return JsonResponse({
-                "file_name": image_record.file_name,
-                "id": image_record.id,
-                "url": image_record.url,
-                "upload_date": image_record.upload_date
-            }, status=200)
+                with statsd_client.timer('s3.delete_time') as s3_delete_timer:
+                    s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
 
-        elif request.method == 'DELETE':
-            logger.info(json.dumps({
-                "level": "INFO",
-                "message": f"Deleting image with ID {image_id}.",
-                "operation": "delete_image",
-                "endpoint": endpoint,
-                "method": method,
-                "timestamp": datetime.utcnow().isoformat()
-            }))
+                with statsd_client.timer('database.delete_time'):
+                    image_record.delete()
+            if rendition_keys:
+                delete_s3_keys(rendition_keys)
+            image_cache.mark_deleted(str(uuid_obj))
 
-            with statsd_client.timer('database.query_time'):
-                image_record = Image.objects.get(id=image_id)
+            #  Record S3 delete time with StatsD
+            statsd_client.timing('s3.delete_image.duration', s3_delete_timer.ms)
 
-            file_key = image_record.url.split(f"{BUCKET_NAME}.s3.amazonaws.com/")[1]
+            return FastJsonResponse({}, status=204)
 
-            with statsd_client.timer('s3.delete_time'):
-                s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
+        else:
+            return method_not_allowed_response(endpoint, method)
 
-            with statsd_client.timer('database.delete_time'):
-                image_record.delete()
+    except Image.DoesNotExist as e:
+        image_cache.set_missing(str(uuid_obj))
+        return image_error_response(e, image_id, endpoint, method)
+    except Exception as e:
+        return image_error_response(e, image_id, endpoint, method)
 
-            #  Record S3 delete time with StatsD
-            statsd_client.timing('s3.delete_image.duration', (time.time() - start_time) * 1000)
 
-            # Record API execution time with StatsD
-            api_time = (time.time() - start_time) * 1000
-            statsd_client.timing('api.delete_image.duration', api_time)
+# ---------------------------------------------------------------------------
+# Content. Streams the image bytes from S3, for private buckets where the
+# public url does not work; S3 answers Range and conditional requests.
+# ---------------------------------------------------------------------------
+
+def validate_content_request(request, image_id, endpoint):
+    """Error response for a content request that cannot be served, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": endpoint,
+            "method": request.method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+    try:
+        uuid.UUID(image_id)
+    except ValueError:
+        logger.warning({
+            "level": "WARNING",
+            "message": f"Invalid UUID format: {image_id}",
+            "operation": "validate_uuid",
+            "endpoint": endpoint,
+            "method": request.method
+        })
+        return FastJsonResponse({"error": "Invalid UUID"}, status=400)
+    return None
+
 
-            return JsonResponse({}, status=204)
+def fetch_object(request, params):
+    """get_object (head_object for HEAD); the range is dropped when If-Range no longer matches."""
+    fetch = s3_client.head_object if request.method == 'HEAD' else s3_client.get_object
+    obj = fetch(**params)
+    if 'Range' in params and not if_range_matches(request, obj):
+        if 'Body' in obj:
+            obj['Body'].close()
+        obj = fetch(**{name: value for name, value in params.items() if name != 'Range'})
+    return obj
 
-        else:
-            logger.warning(json.dumps({
-                "level": "ERROR",
-                "message": "Method Not Allowed.",
-                "operation": "validate_request",
-                "endpoint": endpoint,
-                "method": method,
-                "timestamp": datetime.utcnow().isoformat()
-            }))
-            return JsonResponse({"error": "Method Not Allowed"}, status=405)
 
-    except Image.DoesNotExist:
-        logger.error(json.dumps({
+# Columns a content request needs, and the errors of its lookup that map to a response
+CONTENT_FIELDS = ('id', 'file_name', 'url', 'blob_id')
+CONTENT_LOOKUP_ERRORS = (Image.DoesNotExist, DatabaseError, BotoCoreError, ClientError)
+
+
+def record_content_bytes(sent):
+    statsd_client.incr('content.bytes', sent)
+
+
+def content_error_response(error, endpoint, method):
+    """Map an S3 error to 304/404/412/416, or log it and answer 503."""
+    if isinstance(error, CircuitOpenError):
+        return circuit_open_response(error)
+    status = error_status(error) if isinstance(error, ClientError) else None
+    if status is not None:
+        return error_response(error, status)
+    logger.error({
+        "level": "ERROR",
+        "message": "Reading the image from S3 failed.",
+        "error": str(error),
+        "operation": "s3_get",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({"error": "Storage error. Please try again later."}, status=503)
+
+
+def content_lookup_error_response(error, image_id, endpoint, method):
+    """Map an error of looking up or fetching an image's content to its response."""
+    if isinstance(error, Image.DoesNotExist):
+        logger.error({
             "level": "ERROR",
             "message": f"Image with ID {image_id} not found.",
-            "operation": "fetch_image",
+            "operation": "fetch_content",
             "endpoint": endpoint,
-            "method": method,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": "Not Found"}, status=404)
-    except (DatabaseError, OperationalError):
-        logger.error(json.dumps({
+            "method": method
+        })
+        return FastJsonResponse({"error": "Not Found"}, status=404)
+    if isinstance(error, DatabaseError):
+        logger.error({
             "level": "ERROR",
             "message": "Database error occurred.",
-            "error": str(e),
+            "error": str(error),
             "operation": "database_query",
             "endpoint": endpoint,
-            "method": method,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": "Database error. Please try again later."}, status=503)
+            "method": method
+        })
+        return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+    return content_error_response(error, endpoint, method)
+
+
+def image_content(request, image_id):
+    endpoint = f"/v1/file/{image_id}/content"
+    method = request.method
+    error = validate_content_request(request, image_id, endpoint)
+    if error is not None:
+        return error
+
+    try:
+        with statsd_client.timer('database.query_time'):
+            image_record = read_image(image_id, Image.objects.only(*CONTENT_FIELDS))
+        params = object_request(request, BUCKET_NAME, object_key(image_record))
+        with statsd_client.timer('s3.get_time'):
+            obj = fetch_object(request, params)
+    except CONTENT_LOOKUP_ERRORS as e:
+        return content_lookup_error_response(e, image_id, endpoint, method)
+
+    if method == 'HEAD':
+        return content_response(obj, image_record.file_name)
+    stream = ObjectStream(obj['Body'], settings.CONTENT_CHUNK_SIZE, on_close=record_content_bytes)
+    return content_response(obj, image_record.file_name, stream)
+
+
+# ---------------------------------------------------------------------------
+# Listing. Keyset pagination over (upload_date, id), backed by the composite
+# index on the same columns, so deep pages cost the same as the first one.
+# ---------------------------------------------------------------------------
+
+def encode_cursor(image_record):
+    position = json.dumps([str(image_record.upload_date), str(image_record.id)])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (upload_date, id) position after which the next page starts."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    upload_date, image_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return date.fromisoformat(upload_date), uuid.UUID(image_id)
+
+
+def list_images(request):
+    try:
+        limit = int(request.GET.get('limit', settings.IMAGE_LIST_DEFAULT_LIMIT))
+        if not 1 <= limit <= settings.IMAGE_LIST_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {settings.IMAGE_LIST_MAX_LIMIT}")
+        images = Image.objects.order_by('upload_date', 'id')
+        if derivative_pipeline.specs:
+            images = images.prefetch_related('derivatives')
+        if request.GET.get('from'):
+            images = images.filter(upload_date__gte=date.fromisoformat(request.GET['from']))
+        if request.GET.get('to'):
+            images = images.filter(upload_date__lte=date.fromisoformat(request.GET['to']))
+        if request.GET.get('cursor'):
+            after_date, after_id = decode_cursor(request.GET['cursor'])
+            images = images.filter(Q(upload_date__gt=after_date) | Q(upload_date=after_date, id__gt=after_id))
+    except (ValueError, TypeError) as e:
+        logger.warning({
+            "level": "WARNING",
+            "message": "Bad request: Invalid listing parameters.",
+            "error": str(e),
+            "operation": "validate_request",
+            "endpoint": "/v1/file",
+            "method": "GET"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+
+    try:
+        with statsd_client.timer('database.list_time'):
+            # One extra row tells us whether another page exists
+            page = list(images[:limit + 1])
+    except (DatabaseError, OperationalError) as db_error:
+        logger.error({
+            "level": "ERROR",
+            "message": "Database error occurred.",
+            "error": str(db_error),
+            "operation": "database_query",
+            "endpoint": "/v1/file",
+            "method": "GET"
+        })
+        return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    return FastJsonResponse({
+        "items": [image_metadata(image_record, derivatives_of(image_record)) for image_record in page],
+        "next_cursor": encode_cursor(page[-1]) if has_more else None
+    }, status=200)
+
+
+# ---------------------------------------------------------------------------
+# Batch uploads: N files in one request, S3 transfers in parallel on a bounded
+# pool shared by the process, and a single bulk_create for the rows.
+# ---------------------------------------------------------------------------
+
+batch_upload_executor = ThreadPoolExecutor(max_workers=settings.BATCH_UPLOAD_WORKERS,
+                                           thread_name_prefix='batch-upload')
+
+
+def upload_to_s3(image):
+    """Upload one file under a new image_id and return what is needed to create its row."""
+    image_id = str(uuid.uuid4())
+    file_name = image.name
+    upload_date = datetime.utcnow().strftime("%Y-%m-%d")
+    file_path = f"{image_id}/{file_name}"
+    s3_client.upload_fileobj(image, BUCKET_NAME, file_path,
+                             ExtraArgs={
+                                 'Metadata': {
+                                     'upload_date': upload_date,
+                                     'filename': file_name,
+                                     'file_type': image.content_type,
+                                     'file_path': file_path,
+                                     'file_id': image_id
+                                 }})
+    return {
+        "file_name": file_name,
+        "id": image_id,
+        "url": f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_path}",
+        "upload_date": upload_date,
+        "image_type": image.content_type,
+        "key": file_path
+    }
+
+
+def delete_s3_keys(keys):
+    """Remove keys with DeleteObjects, at most 1000 keys per call. Returns the keys that failed."""
+    failed = set()
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        try:
+            # Quiet mode only reports the keys that could not be deleted
+            response = s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={
+                'Objects': [{'Key': key} for key in batch],
+                'Quiet': True
+            })
+        except Exception as e:
+            logger.error({
+                "level": "ERROR",
+                "message": f"DeleteObjects failed for {len(batch)} keys.",
+                "error": str(e),
+                "operation": "s3_delete"
+            })
+            failed.update(batch)
+            continue
+        failed.update(error['Key'] for error in response.get('Errors', []))
+    return failed
+
+
+def handle_batch(request):
+    if request.method == 'POST':
+        return upload_batch(request)
+    elif request.method == 'DELETE':
+        return delete_batch(request)
+
+    logger.warning({
+        "level": "ERROR",
+        "message": "Method Not Allowed.",
+        "operation": "validate_request",
+        "endpoint": "/v1/file/batch",
+        "method": request.method
+    })
+    return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+
+def upload_batch(request):
+    images = request.FILES.getlist('profilePic')
+    if not images or len(images) > settings.BATCH_UPLOAD_MAX_FILES:
+        logger.warning({
+            "level": "WARNING",
+            "message": f"Bad request: Expected 1-{settings.BATCH_UPLOAD_MAX_FILES} files, got {len(images)}.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/batch",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+
+    # S3 uploads run concurrently; results keep the order of the request
+    results, uploaded = [], []
+    with statsd_client.timer('s3.upload_batch.duration'):
+        futures = [batch_upload_executor.submit(upload_to_s3, image) for image in images]
+        for image, future in zip(images, futures):
+            try:
+                uploaded_file = future.result()
+                uploaded.append(uploaded_file)
+                results.append(uploaded_file)
+            except Exception as e:
+                logger.error({
+                    "level": "ERROR",
+                    "message": f"Error uploading image {image.name}.",
+                    "error": str(e),
+                    "operation": "upload_failure",
+                    "endpoint": "/v1/file/batch",
+                    "method": "POST"
+                })
+                results.append({"file_name": image.name, "error": str(e)})
+
+    if uploaded:
+        try:
+            with statsd_client.timer('database.save_time') as db_save_timer:
+                records = Image.objects.bulk_create([
+                    Image(id=item["id"], file_name=item["file_name"], url=item["url"]) for item in uploaded
+                ])
+        except (DatabaseError, OperationalError) as db_error:
+            logger.error({
+                "level": "ERROR",
+                "message": "Database error occurred.",
+                "error": str(db_error),
+                "operation": "database_save",
+                "endpoint": "/v1/file/batch",
+                "method": "POST"
+            })
+            # Same rollback as upload_image: nothing stays in S3 without a row
+            delete_s3_keys([item["key"] for item in uploaded])
+            return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+        statsd_client.timing('database.save_batch.duration', db_save_timer.ms)
+
+        for record in records:
+            image_cache.set(str(record.id), image_metadata(record))
+        for item in uploaded:
+            schedule_derivatives(item["id"], item["key"])
+
+    for item in uploaded:
+        del item["key"]
+        item["status"] = 201
+    for item in results:
+        item.setdefault("status", 503)
+
+    logger.info({
+        "level": "INFO",
+        "message": f"Batch upload stored {len(uploaded)} of {len(images)} images.",
+        "operation": "upload_batch",
+        "endpoint": "/v1/file/batch",
+        "method": "POST"
+    })
+
+    if len(uploaded) == len(images):
+        status = 201
+    elif uploaded:
+        status = 207
+    else:
+        status = 503
+    return FastJsonResponse({"results": results}, status=status)
+
+
+def delete_batch(request):
+    body = parse_json_body(request)
+    ids = (body or {}).get('ids')
+    if not isinstance(ids, list) or not ids or len(ids) > settings.BATCH_DELETE_MAX_IDS:
+        logger.warning({
+            "level": "WARNING",
+            "message": f"Bad request: Expected 1-{settings.BATCH_DELETE_MAX_IDS} ids.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/batch",
+            "method": "DELETE"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+
+    # Per-ID outcome, keyed by the ID exactly as the client sent it
+    outcomes = {}
+    requested = {}
+    for raw_id in map(str, ids):
+        try:
+            requested[str(uuid.UUID(raw_id))] = raw_id
+        except ValueError:
+            outcomes[raw_id] = 400
+
+    try:
+        with statsd_client.timer('database.query_time'):
+            rows = list(Image.objects.filter(id__in=list(requested)).only('id', 'url', 'blob_id'))
+        found = {str(image_record.id) for image_record in rows}
+        keys, blobs, failed_ids, deleted_ids = {}, {}, set(), []
+
+        if settings.ASYNC_DELETES:
+            # Rows and outbox entries in one transaction; S3 deletes happen in the worker
+            with statsd_client.timer('database.delete_time'):
+                defer_image_deletes([(image_record.id, object_key(image_record), image_record.blob_id)
+                                     for image_record in rows])
+            deleted_ids = list(found)
+            rows = []
+
+        # Read before the derivative rows cascade away with their images
+        renditions = list(Derivative.objects.filter(image_id__in=[image_record.id for image_record in rows])
+                          .values_list('image_id', 'key')) if rows else []
+        for image_record in rows:
+            if image_record.blob_id:
+                blobs[str(image_record.id)] = image_record.blob_id
+            else:
+                keys[str(image_record.id)] = object_key(image_record)
+
+        if keys:
+            with statsd_client.timer('s3.delete_batch_time'):
+                failed_keys = delete_s3_keys(list(keys.values()))
+            failed_ids = {image_id for image_id, key in keys.items() if key in failed_keys}
+
+            # Only drop rows whose object is gone, same order as the single DELETE
+            deleted_ids = [image_id for image_id in keys if image_id not in failed_ids]
+            if deleted_ids:
+                with statsd_client.timer('database.delete_time'):
+                    Image.objects.filter(id__in=deleted_ids).delete()
+
+        # Deduplicated images release their shared blob one by one
+        for image_id, digest in blobs.items():
+            try:
+                delete_blob_image(s3_client, BUCKET_NAME, image_id, digest)
+                deleted_ids.append(image_id)
+            except (BotoCoreError, ClientError) as e:
+                logger.error({
+                    "level": "ERROR",
+                    "message": f"Deleting blob {digest} failed.",
+                    "error": str(e),
+                    "operation": "s3_delete"
+                })
+                failed_ids.add(image_id)
+
+        rendition_keys = [key for image_id, key in renditions if str(image_id) not in failed_ids]
+        if rendition_keys:
+            delete_s3_keys(rendition_keys)
+    except (DatabaseError, OperationalError) as db_error:
+        logger.error({
+            "level": "ERROR",
+            "message": "Database error occurred.",
+            "error": str(db_error),
+            "operation": "database_query",
+            "endpoint": "/v1/file/batch",
+            "method": "DELETE"
+        })
+        return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+
+    for image_id in deleted_ids:
+        image_cache.mark_deleted(image_id)
+    for image_id, raw_id in requested.items():
+        if image_id not in found:
+            outcomes[raw_id] = 404
+        elif image_id in failed_ids:
+            outcomes[raw_id] = 503
+        else:
+            outcomes[raw_id] = 204
+
+    logger.info({
+        "level": "INFO",
+        "message": f"Batch delete removed {len(deleted_ids)} of {len(ids)} images.",
+        "operation": "delete_batch",
+        "endpoint": "/v1/file/batch",
+        "method": "DELETE"
+    })
+
+    return FastJsonResponse({
+        "results": [{"id": raw_id, "status": status} for raw_id, status in outcomes.items()]
+    }, status=200)
+
+
+# ---------------------------------------------------------------------------
+# Presigned direct-to-S3 uploads. The client asks for a presigned POST, sends the
+# bytes straight to S3 and then confirms; the app servers only see small JSON calls.
+# ---------------------------------------------------------------------------
+
+PRESIGN_SALT = 'image_upload.presign'
+
+
+def parse_json_body(request):
+    """Decode a JSON object body, returning None when it is missing or malformed."""
+    try:
+        body = fastjson.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def presign_upload(request):
+    if request.method != 'POST':
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/presign",
+            "method": request.method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    body = parse_json_body(request)
+    file_name = os.path.basename(str((body or {}).get('file_name') or ''))
+    if not file_name or len(file_name) > 200:
+        logger.warning({
+            "level": "WARNING",
+            "message": "Bad request: Missing or invalid file_name.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/presign",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+
+    content_type = str(body.get('content_type') or 'application/octet-stream')
+    image_id = str(uuid.uuid4())
+    file_path = f"{image_id}/{file_name}"
+    metadata = {
+        'x-amz-meta-upload_date': datetime.utcnow().strftime("%Y-%m-%d"),
+        'x-amz-meta-filename': file_name,
+        'x-amz-meta-file_type': content_type,
+        'x-amz-meta-file_path': file_path,
+        'x-amz-meta-file_id': image_id
+    }
+
+    try:
+        with statsd_client.timer('s3.presign_time'):
+            presigned = s3_client.generate_presigned_post(
+                BUCKET_NAME, file_path,
+                Fields=metadata,
+                Conditions=[{key: value} for key, value in metadata.items()] + [
+                    ['content-length-range', 1, settings.PRESIGNED_UPLOAD_MAX_BYTES]
+                ],
+                ExpiresIn=settings.PRESIGNED_UPLOAD_EXPIRES)
     except Exception as e:
-        logger.exception(json.dumps({
+        logger.exception({
             "level": "ERROR",
-            "message": "Unexpected error occurred.",
+            "message": "Error creating presigned upload.",
             "error": str(e),
-            "operation": "unknown_error",
+            "operation": "presign_failure",
+            "endpoint": "/v1/file/presign",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": str(e)}, status=503)
+
+    # The token carries the key, so confirm needs no server-side session state
+    upload_token = signing.dumps({"id": image_id, "file_name": file_name}, salt=PRESIGN_SALT)
+
+    logger.info({
+        "level": "INFO",
+        "message": f"Issued presigned upload for {file_name}.",
+        "file_name": file_name,
+        "image_id": image_id,
+        "operation": "presign_upload",
+        "endpoint": "/v1/file/presign",
+        "method": "POST"
+    })
+
+    return FastJsonResponse({
+        "id": image_id,
+        "file_name": file_name,
+        "upload_url": presigned['url'],
+        "upload_fields": presigned['fields'],
+        "upload_token": upload_token,
+        "expires_in": settings.PRESIGNED_UPLOAD_EXPIRES
+    }, status=201)
+
+
+def confirm_upload(request):
+    if request.method != 'POST':
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/confirm",
+            "method": request.method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    body = parse_json_body(request)
+    try:
+        token = signing.loads(str((body or {}).get('upload_token') or ''), salt=PRESIGN_SALT,
+                              max_age=settings.PRESIGNED_UPLOAD_EXPIRES + settings.PRESIGNED_CONFIRM_GRACE)
+    except signing.BadSignature:
+        logger.warning({
+            "level": "WARNING",
+            "message": "Bad request: Invalid or expired upload_token.",
+            "operation": "validate_request",
+            "endpoint": "/v1/file/confirm",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+
+    image_id, file_name = token['id'], token['file_name']
+    file_path = f"{image_id}/{file_name}"
+    s3_url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_path}"
+
+    try:
+        existing = Image.objects.filter(id=image_id).first()
+        if existing is not None:
+            # Confirm is idempotent so clients can safely retry it
+            return FastJsonResponse(image_metadata(existing), status=200)
+
+        try:
+            with statsd_client.timer('s3.head_time'):
+                head = s3_client.head_object(Bucket=BUCKET_NAME, Key=file_path)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            logger.warning({
+                "level": "WARNING",
+                "message": f"Confirm before upload finished for {image_id}.",
+                "image_id": image_id,
+                "operation": "confirm_upload",
+                "endpoint": "/v1/file/confirm",
+                "method": "POST"
+            })
+            return FastJsonResponse({"error": "Upload not found"}, status=409)
+
+        with statsd_client.timer('database.save_time'):
+            image_record = Image.objects.create(id=image_id, file_name=file_name, url=s3_url)
+        image_cache.set(image_id, image_metadata(image_record))
+        schedule_derivatives(image_id, file_path)
+    except (DatabaseError, OperationalError) as db_error:
+        logger.error({
+            "level": "ERROR",
+            "message": "Database error occurred.",
+            "error": str(db_error),
+            "operation": "database_save",
+            "endpoint": "/v1/file/confirm",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": "Database error. Please try again later."}, status=503)
+    except Exception as e:
+        logger.exception({
+            "level": "ERROR",
+            "message": "Error confirming upload.",
+            "error": str(e),
+            "operation": "confirm_failure",
+            "endpoint": "/v1/file/confirm",
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": str(e)}, status=503)
+
+    logger.info({
+        "level": "INFO",
+        "message": f"Image {file_name} confirmed.",
+        "file_name": file_name,
+        "image_id": image_id,
+        "operation": "upload_success",
+        "endpoint": "/v1/file/confirm",
+        "method": "POST"
+    })
+
+    return FastJsonResponse({
+        **image_metadata(image_record),
+        "image_type": head.get('Metadata', {}).get('file_type') or head.get('ContentType')
+    }, status=201)
+
+
+# ---------------------------------------------------------------------------
+# Resumable chunked uploads. The client opens a session, PUTs numbered chunks
+# (each becomes one S3 multipart part), asks for the offset after a dropped
+# connection and finally completes the session into an Image. Session state is
+# in the database, so any worker can take any request of a session.
+# ---------------------------------------------------------------------------
+
+def upload_session_response(session):
+    parts, offset, next_part = session_progress(session)
+    return {
+        "id": str(session.id),
+        "file_name": session.file_name,
+        "content_type": session.content_type,
+        "part_size": settings.S3_UPLOAD_PART_SIZE,
+        "min_part_size": MIN_PART_SIZE,
+        "max_part_size": settings.RESUMABLE_MAX_PART_SIZE,
+        "expires_at": session.expires_at,
+        "parts": [{"number": part.number, "size": part.size} for part in parts],
+        "offset": offset,
+        "next_part": next_part
+    }
+
+
+def find_upload_session(session_id, endpoint, method):
+    """``(session, None)`` for an active session, else ``(None, error response)``."""
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        logger.warning({
+            "level": "WARNING",
+            "message": f"Invalid UUID format: {session_id}",
+            "operation": "validate_uuid",
+            "endpoint": endpoint,
+            "method": method
+        })
+        return None, FastJsonResponse({"error": "Invalid UUID"}, status=400)
+    session = active_session(session_id)
+    if session is None:
+        return None, FastJsonResponse({"error": "Upload session not found"}, status=404)
+    return session, None
+
+
+def upload_session_error_response(error, endpoint, method):
+    logger.warning({
+        "level": "WARNING",
+        "message": f"Upload session request rejected: {error}",
+        "operation": "validate_request",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({"error": str(error)}, status=error.status)
+
+
+def upload_session_failure_response(error, operation, endpoint, method):
+    """Log an S3 or database failure and answer 503; the client retries the same request."""
+    logger.error({
+        "level": "ERROR",
+        "message": "Upload session request failed.",
+        "error": str(error),
+        "operation": operation,
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({"error": "Storage error. Please try again later."}, status=503)
+
+
+def create_upload_session(request):
+    endpoint = "/v1/file/uploads"
+
+    if request.method != 'POST':
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": endpoint,
+            "method": request.method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    body = parse_json_body(request)
+    file_name = os.path.basename(str((body or {}).get('file_name') or ''))
+    if not file_name or len(file_name) > 200:
+        logger.warning({
+            "level": "WARNING",
+            "message": "Bad request: Missing or invalid file_name.",
+            "operation": "validate_request",
+            "endpoint": endpoint,
+            "method": "POST"
+        })
+        return FastJsonResponse({"error": "Bad Request"}, status=400)
+    content_type = str(body.get('content_type') or 'application/octet-stream')[:100]
+
+    try:
+        with statsd_client.timer('s3.create_multipart_time'):
+            session = create_session(s3_client, BUCKET_NAME, file_name, content_type,
+                                     settings.RESUMABLE_UPLOAD_EXPIRES)
+    except Exception as e:
+        return upload_session_failure_response(e, "create_upload_session", endpoint, "POST")
+
+    statsd_client.incr('resumable.sessions.created')
+    logger.info({
+        "level": "INFO",
+        "message": f"Opened upload session for {file_name}.",
+        "file_name": file_name,
+        "image_id": str(session.id),
+        "operation": "create_upload_session",
+        "endpoint": endpoint,
+        "method": "POST"
+    })
+    return FastJsonResponse(upload_session_response(session), status=201)
+
+
+def upload_session(request, session_id):
+    endpoint = f"/v1/file/uploads/{session_id}"
+    method = request.method
+
+    if method not in ('GET', 'DELETE'):
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": endpoint,
+            "method": method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    session, error = find_upload_session(session_id, endpoint, method)
+    if error is not None:
+        return error
+
+    if method == 'GET':
+        # Where to resume: the client re-sends from ``next_part`` onwards
+        return FastJsonResponse(upload_session_response(session), status=200)
+
+    try:
+        with statsd_client.timer('s3.abort_multipart_time'):
+            abort_session(s3_client, BUCKET_NAME, session)
+    except Exception as e:
+        return upload_session_failure_response(e, "abort_upload_session", endpoint, method)
+
+    statsd_client.incr('resumable.sessions.aborted')
+    logger.info({
+        "level": "INFO",
+        "message": f"Aborted upload session {session_id}.",
+        "image_id": session_id,
+        "operation": "abort_upload_session",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse({}, status=204)
+
+
+def upload_session_part(request, session_id, part_number):
+    endpoint = f"/v1/file/uploads/{session_id}/parts/{part_number}"
+    method = request.method
+
+    if method != 'PUT':
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
             "endpoint": endpoint,
-            "method": method,
-            "timestamp": datetime.utcnow().isoformat()
-        }))
-        return JsonResponse({"error": str(e)}, status=503)
\ No newline at end of file
+            "method": method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length <= 0:
+        return upload_session_error_response(UploadSessionError(411, "Content-Length required."), endpoint, method)
+    if length > settings.RESUMABLE_MAX_PART_SIZE:
+        return upload_session_error_response(
+            UploadSessionError(413, f"Parts are limited to {settings.RESUMABLE_MAX_PART_SIZE} bytes."),
+            endpoint, method)
+
+    session, error = find_upload_session(session_id, endpoint, method)
+    if error is not None:
+        return error
+
+    # Read the stream directly: request.body would apply DATA_UPLOAD_MAX_MEMORY_SIZE
+    data = request.read(length)
+    if len(data) != length:
+        # The connection dropped mid-chunk; never store a truncated part
+        return upload_session_error_response(UploadSessionError(400, "Incomplete part body."), endpoint, method)
+
+    try:
+        with statsd_client.timer('s3.upload_part_time'):
+            part = store_part(s3_client, BUCKET_NAME, session, part_number, data,
+                              settings.RESUMABLE_UPLOAD_MAX_BYTES,
+                              content_md5=request.META.get('HTTP_CONTENT_MD5'))
+    except UploadSessionError as e:
+        return upload_session_error_response(e, endpoint, method)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+            return FastJsonResponse({"error": "Upload session not found"}, status=404)
+        return upload_session_failure_response(e, "upload_part", endpoint, method)
+    except Exception as e:
+        return upload_session_failure_response(e, "upload_part", endpoint, method)
+
+    statsd_client.incr('resumable.parts')
+    statsd_client.incr('resumable.bytes', part.size)
+    return FastJsonResponse({"number": part.number, "size": part.size, "etag": part.etag}, status=200)
+
+
+def complete_upload_session(request, session_id):
+    endpoint = f"/v1/file/uploads/{session_id}/complete"
+    method = request.method
+
+    if method != 'POST':
+        logger.warning({
+            "level": "ERROR",
+            "message": "Method Not Allowed.",
+            "operation": "validate_request",
+            "endpoint": endpoint,
+            "method": method
+        })
+        return FastJsonResponse({"error": "Method Not Allowed"}, status=405)
+
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        return FastJsonResponse({"error": "Invalid UUID"}, status=400)
+
+    try:
+        with statsd_client.timer('s3.complete_multipart_time'):
+            image_record, created = complete_session(s3_client, BUCKET_NAME, session_id)
+    except UploadSessionError as e:
+        return upload_session_error_response(e, endpoint, method)
+    except Exception as e:
+        return upload_session_failure_response(e, "complete_upload_session", endpoint, method)
+
+    if not created:
+        # Complete is idempotent so clients can safely retry it
+        return FastJsonResponse(image_metadata(image_record), status=200)
+
+    image_cache.set(session_id, image_metadata(image_record))
+    schedule_derivatives(session_id, object_key(image_record))
+    statsd_client.incr('resumable.sessions.completed')
+    logger.info({
+        "level": "INFO",
+        "message": f"Image {image_record.file_name} uploaded in chunks.",
+        "file_name": image_record.file_name,
+        "image_id": session_id,
+        "operation": "upload_success",
+        "endpoint": endpoint,
+        "method": method
+    })
+    return FastJsonResponse(image_metadata(image_record), status=201)
+
+
+# ---------------------------------------------------------------------------
+# Async (ASGI) variants. These are routed instead of the sync views when
+# settings.ASYNC_VIEWS is enabled. The ORM calls use Django's async API and the
+# blocking boto3 calls are pushed off the event loop, so a slow S3 round-trip
+# no longer pins a worker for the whole request. Validation, responses and error
+# mapping are the sync views' helpers; only the I/O is awaited here.
+# ---------------------------------------------------------------------------
+
+async def upload_image_async(request):
+    if request.method == 'GET':
+        return await sync_to_async(list_images)(request)
+    if request.method != 'POST':
+        return method_not_allowed_response("/upload-image", "POST")
+
+    # Parsing feeds the streaming S3 handler, which makes blocking boto3 calls
+    upload_handler = attach_upload_handlers(request)
+    try:
+        image = await sync_to_async(read_upload, thread_sensitive=False)(request, upload_handler)
+    except Exception as e:
+        return upload_read_error_response(e)
+    if not image:
+        return missing_file_response()
+
+    try:
+        blob = None
+        if isinstance(image, S3UploadedFile):
+            # Bytes were already streamed to S3 while the request was parsed
+            image_id, upload_date, file_path = image.image_id, image.upload_date, image.key
+            s3_upload_time = image.s3_time_ms
+            statsd_client.timing('s3.upload_time', s3_upload_time)
+        elif hasattr(image, 'sha256'):
+            # Content-addressed: known bytes are not sent to S3 again
+            image_id, upload_date = new_upload_id()
+            with statsd_client.timer('s3.upload_time') as s3_upload_timer:
+                blob = await sync_to_async(store_deduplicated)(image)
+            s3_upload_time = s3_upload_timer.ms
+            file_path = blob.key
+        else:
+            image_id, upload_date = new_upload_id()
+            file_path = f"{image_id}/{image.name}"
+            extra_args = s3_upload_args(image, image_id, upload_date, file_path)
+            # S3 upload runs on a worker thread, the event loop keeps serving requests
+            with statsd_client.timer('s3.upload_time') as s3_upload_timer:
+                await sync_to_async(s3_client.upload_fileobj, thread_sensitive=False)(
+                    image, BUCKET_NAME, file_path, ExtraArgs=extra_args)
+            s3_upload_time = s3_upload_timer.ms
+
+        s3_url = s3_url_for(file_path)
+        try:
+            with statsd_client.timer('database.save_time') as db_save_timer:
+                image_record = await Image.objects.acreate(id=image_id, file_name=image.name,
+                                                           upload_date=upload_date, url=s3_url, blob=blob)
+        except (DatabaseError, OperationalError) as db_error:
+            if blob is not None:
+                await sync_to_async(release_deduplicated)(blob.digest)
+            else:
+                await sync_to_async(s3_client.delete_object, thread_sensitive=False)(
+                    Bucket=BUCKET_NAME, Key=file_path)
+            return upload_db_error_response(db_error)
+        await image_cache.aset(image_id, image_metadata(image_record))
+        schedule_derivatives(image_id, file_path)
+        return uploaded_response(image, image_id, upload_date, s3_url, s3_upload_time, db_save_timer.ms)
+    except Exception as e:
+        return upload_failed_response(e)
+
+
+async def handle_image_async(request, image_id=None):
+    endpoint = f"/v1/file/{image_id}"
+    method = request.method
+    uuid_obj, invalid = validate_image_id(image_id, endpoint, method)
+    if invalid is not None:
+        return invalid
+
+    try:
+        if request.method == 'GET':
+            log_image_request(f"Fetching image with ID {image_id}.", "fetch_image", endpoint, method)
+            found, metadata, etag = await image_cache.aget_entry(str(uuid_obj))
+            if found and metadata is None:
+                # Cached 404, skip the DB round trip
+                raise Image.DoesNotExist
+            if not found:
+                with statsd_client.timer('database.query_time'):
+                    image_record = await aread_image(image_id)
+
+                metadata = image_metadata(image_record, await sync_to_async(derivatives_of)(image_record))
+                etag = metadata_etag(metadata)
+                await image_cache.aset(str(uuid_obj), metadata, etag)
+
+            return metadata_response(request, metadata, etag)
+
+        elif request.method == 'DELETE':
+            log_image_request(f"Deleting image with ID {image_id}.", "delete_image", endpoint, method)
+            with statsd_client.timer('database.query_time'):
+                image_record = await Image.objects.aget(id=image_id)
+
+            if settings.ASYNC_DELETES:
+                # Row and outbox entry in one transaction; the S3 delete happens in the worker
+                with statsd_client.timer('database.delete_time'):
+                    await sync_to_async(defer_image_deletes)(
+                        [(image_record.id, object_key(image_record), image_record.blob_id)])
+                await image_cache.amark_deleted(str(uuid_obj))
+                return FastJsonResponse({}, status=204)
+
+            # Read before the derivative rows cascade away with the image
+            rendition_keys = await sync_to_async(derivative_keys)([image_record.id])
+            if image_record.blob_id:
+                # Shared blob: the S3 object only goes with its last reference
+                with statsd_client.timer('s3.delete_time') as s3_delete_timer:
+                    await sync_to_async(delete_blob_image)(s3_client, BUCKET_NAME, image_record.id,
+                                                           image_record.blob_id)
+            else:
+                file_key = object_key(image_record)
+
+                with statsd_client.timer('s3.delete_time') as s3_delete_timer:
+                    await sync_to_async(s3_client.delete_object, thread_sensitive=False)(
+                        Bucket=BUCKET_NAME, Key=file_key)
+
+                with statsd_client.timer('database.delete_time'):
+                    await image_record.adelete()
+            if rendition_keys:
+                await sync_to_async(delete_s3_keys, thread_sensitive=False)(rendition_keys)
+            await image_cache.amark_deleted(str(uuid_obj))
+
+            statsd_client.timing('s3.delete_image.duration', s3_delete_timer.ms)
+
+            return FastJsonResponse({}, status=204)
+
+        else:
+            return method_not_allowed_response(endpoint, method)
+
+    except Image.DoesNotExist as e:
+        await image_cache.aset_missing(str(uuid_obj))
+        return image_error_response(e, image_id, endpoint, method)
+    except Exception as e:
+        return image_error_response(e, image_id, endpoint, method)
+
+
+async def image_content_async(request, image_id):
+    endpoint = f"/v1/file/{image_id}/content"
+    method = request.method
+    error = validate_content_request(request, image_id, endpoint)
+    if error is not None:
+        return error
+
+    try:
+        with statsd_client.timer('database.query_time'):
+            image_record = await aread_image(image_id, Image.objects.only(*CONTENT_FIELDS))
+        params = object_request(request, BUCKET_NAME, object_key(image_record))
+        with statsd_client.timer('s3.get_time'):
+            obj = await sync_to_async(fetch_object, thread_sensitive=False)(request, params)
+    except CONTENT_LOOKUP_ERRORS as e:
+        return content_lookup_error_response(e, image_id, endpoint, method)
+
+    if method == 'HEAD':
+        return content_response(obj, image_record.file_name)
+    stream = AsyncObjectStream(obj['Body'], settings.CONTENT_CHUNK_SIZE, on_close=record_content_bytes)
+    return content_response(obj, image_record.file_name, stream)
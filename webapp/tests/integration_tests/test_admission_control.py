@@ -0,0 +1,152 @@
+import asyncio
+import threading
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from webapp.admission import AdmissionControlMiddleware, ConcurrencyLimiter, Rejected, TokenBucketLimiter
+
+POOLS = {'uploads': {'routes': ['upload_image', 'upload_batch'], 'concurrency': 1, 'queue': 0, 'timeout': 0.1}}
+RATE_LIMITS = {'uploads': {'routes': ['upload_image'], 'rate': 1.0, 'burst': 2}}
+
+
+class ConcurrencyLimiterTest(SimpleTestCase):
+    def test_queue_and_rejection(self):
+        limiter = ConcurrencyLimiter('test', 1, queue=1, timeout=5, statsd_client=mock.Mock())
+        limiter.acquire()
+
+        admitted = threading.Event()
+
+        def waiter():
+            limiter.acquire()
+            admitted.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while limiter.waiting == 0:
+            threading.Event().wait(0.001)
+
+        # The queue is full: rejected at once
+        with self.assertRaises(Rejected) as raised:
+            limiter.acquire()
+        self.assertEqual((raised.exception.status, raised.exception.reason), (503, "queue_full"))
+
+        limiter.release()
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual((limiter.active, limiter.waiting), (1, 0))
+        limiter.statsd_client.timing.assert_called()
+        self.assertEqual(limiter.statsd_client.timing.call_args[0][0], 'admission.test.wait_time')
+
+    def test_queue_timeout(self):
+        limiter = ConcurrencyLimiter('test', 1, queue=1, timeout=0.05)
+        limiter.acquire()
+        with self.assertRaises(Rejected) as raised:
+            limiter.acquire()
+        self.assertEqual(raised.exception.reason, "queue_timeout")
+        self.assertEqual(raised.exception.retry_after, 1)
+        self.assertEqual(limiter.waiting, 0)
+
+
+class TokenBucketLimiterTest(SimpleTestCase):
+    @mock.patch('webapp.admission.time.monotonic')
+    def test_refills_at_rate(self, monotonic):
+        monotonic.return_value = 100.0
+        limiter = TokenBucketLimiter('test', rate=0.5, burst=2, max_clients=2)
+        limiter.take('a')
+        limiter.take('a')
+        with self.assertRaises(Rejected) as raised:
+            limiter.take('a')
+        self.assertEqual((raised.exception.status, raised.exception.retry_after), (429, 2))
+        # Other clients have their own bucket
+        limiter.take('b')
+
+        monotonic.return_value = 102.0
+        limiter.take('a')
+        with self.assertRaises(Rejected):
+            limiter.take('a')
+
+        limiter.take('c')
+        self.assertEqual(list(limiter._buckets), ['a', 'c'])
+
+
+@override_settings(ADMISSION_POOLS=POOLS, RATE_LIMITS=RATE_LIMITS, RATE_LIMIT_CLIENT_HEADER='HTTP_X_FORWARDED_FOR')
+class AdmissionControlMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse(status=201))
+
+    def test_saturated_pool_sheds_only_its_routes(self):
+        self.middleware.limiters['upload_image'].acquire()
+
+        response = self.middleware(self.factory.post("/v1/file"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        # Routes in the same pool share the slots
+        self.assertEqual(self.middleware(self.factory.post("/v1/file/batch")).status_code, 503)
+        # Listing (GET /v1/file) and probes are not limited
+        self.assertEqual(self.middleware(self.factory.get("/v1/file")).status_code, 201)
+        self.assertEqual(self.middleware(self.factory.get("/healthz")).status_code, 201)
+
+        self.middleware.limiters['upload_image'].release()
+        self.assertEqual(self.middleware(self.factory.post("/v1/file")).status_code, 201)
+        self.assertEqual(self.middleware.limiters['upload_image'].active, 0)
+
+    def test_slot_is_released_when_the_view_raises(self):
+        middleware = AdmissionControlMiddleware(mock.Mock(side_effect=RuntimeError))
+        with self.assertRaises(RuntimeError):
+            middleware(self.factory.post("/v1/file"))
+        self.assertEqual(middleware.limiters['upload_image'].active, 0)
+
+    def test_rate_limit_per_client(self):
+        client_a = {"HTTP_X_FORWARDED_FOR": "1.2.3.4, 10.0.0.1"}
+        client_b = {"HTTP_X_FORWARDED_FOR": "10.0.0.2"}
+        for _ in range(2):
+            self.assertEqual(self.middleware(self.factory.post("/v1/file", **client_a)).status_code, 201)
+        response = self.middleware(self.factory.post("/v1/file", **client_a))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.middleware(self.factory.post("/v1/file", **client_b)).status_code, 201)
+
+    def test_async_requests(self):
+        async def get_response(request):
+            return HttpResponse(status=201)
+
+        middleware = AdmissionControlMiddleware(get_response)
+        self.assertEqual(async_to_sync(middleware)(self.factory.post("/v1/file")).status_code, 201)
+        middleware.limiters['upload_image'].acquire()
+        self.assertEqual(async_to_sync(middleware)(self.factory.post("/v1/file")).status_code, 503)
+
+    def test_cancelled_waiter_gives_its_slot_back(self):
+        async def get_response(request):
+            return HttpResponse(status=201)
+
+        middleware = AdmissionControlMiddleware(get_response)
+        limiter = middleware.limiters['upload_image']
+        limiter.queue, limiter.timeout = 1, 5
+
+        async def cancel_while_queued():
+            limiter.acquire()
+            request = asyncio.ensure_future(middleware(self.factory.post("/v1/file")))
+            while limiter.waiting == 0:
+                await asyncio.sleep(0.001)
+            # Client disconnect: the request is cancelled while its thread still waits
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            # The waiting thread now takes the slot and hands it straight back
+            limiter.release()
+            for _ in range(1000):
+                if limiter.active == 0 and limiter.waiting == 0:
+                    break
+                await asyncio.sleep(0.005)
+
+        asyncio.run(cancel_while_queued())
+        self.assertEqual((limiter.active, limiter.waiting), (0, 0))
+        self.assertEqual(async_to_sync(middleware)(self.factory.post("/v1/file")).status_code, 201)
+
+    @override_settings(ADMISSION_POOLS={}, RATE_LIMITS={})
+    def test_removed_without_limits(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        with self.assertRaises(MiddlewareNotUsed):
+            AdmissionControlMiddleware(lambda request: HttpResponse())
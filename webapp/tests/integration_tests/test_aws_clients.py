@@ -0,0 +1,51 @@
+import threading
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from webapp.aws import ClientRegistry, LazyClient
+
+
+@override_settings(AWS_MAX_POOL_CONNECTIONS=25, AWS_CONNECT_TIMEOUT=2, AWS_READ_TIMEOUT=7,
+                   AWS_TCP_KEEPALIVE=True, AWS_MAX_ATTEMPTS=4)
+class ClientRegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = ClientRegistry()
+
+    def test_client_is_built_once_and_configured_from_settings(self):
+        client = self.registry.get('s3', 'us-east-1')
+
+        self.assertIs(self.registry.get('s3', 'us-east-1'), client)
+        self.assertEqual(client.meta.config.max_pool_connections, 25)
+        self.assertEqual(client.meta.config.connect_timeout, 2)
+        self.assertEqual(client.meta.config.read_timeout, 7)
+        self.assertTrue(client.meta.config.tcp_keepalive)
+        self.assertIsNot(self.registry.get('s3', 'us-west-2'), client)
+
+    def test_client_is_rebuilt_in_a_forked_process(self):
+        client = self.registry.get('s3', 'us-east-1')
+
+        with mock.patch('webapp.aws.os.getpid', return_value=self.registry._pid + 1):
+            self.assertIsNot(self.registry.get('s3', 'us-east-1'), client)
+
+    def test_a_client_can_be_built_while_another_one_is_built(self):
+        """Building logs records, and the CloudWatch log handler needs a client of its own."""
+        def instrument(service_name, client):
+            if service_name == 's3':
+                self.registry.get('logs', 'us-east-1')
+            return client
+
+        self.registry.instrument = instrument
+        thread = threading.Thread(target=self.registry.get, args=('s3', 'us-east-1'), daemon=True)
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive(), "registry.get() deadlocked")
+        self.assertEqual(set(self.registry._clients), {('s3', 'us-east-1'), ('logs', 'us-east-1')})
+
+    def test_lazy_client_builds_nothing_until_used(self):
+        registry = mock.Mock()
+        lazy = LazyClient('s3', registry=registry)
+        registry.get.assert_not_called()
+
+        lazy.head_bucket(Bucket='bucket')
+
+        registry.get.assert_called_once_with('s3', None)
+        registry.get.return_value.head_bucket.assert_called_once_with(Bucket='bucket')
@@ -0,0 +1,94 @@
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import TestCase, Client
+from image_upload.models import Image
+
+
+def image_file(name):
+    return SimpleUploadedFile(name, b"png-bytes", content_type="image/png")
+
+
+class BatchUploadTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_upload(self):
+        """Test that every file is uploaded and all rows are written in one query."""
+        with self.assertNumQueries(1):
+            response = self.client.post("/v1/file/batch", {
+                "profilePic": [image_file("a.png"), image_file("b.png"), image_file("c.png")],
+            })
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([item["file_name"] for item in results], ["a.png", "b.png", "c.png"])
+        self.assertEqual(self.s3_client.upload_fileobj.call_count, 3)
+        self.assertEqual(Image.objects.count(), 3)
+
+    def test_partial_failure(self):
+        def upload(fileobj, bucket, key, ExtraArgs):
+            if key.endswith("bad.png"):
+                raise RuntimeError("S3 unavailable")
+        self.s3_client.upload_fileobj.side_effect = upload
+        response = self.client.post("/v1/file/batch", {"profilePic": [image_file("ok.png"), image_file("bad.png")]})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item["status"] for item in response.json()["results"]], [201, 503])
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_database_failure_rolls_back_s3(self):
+        with mock.patch('image_upload.views.Image.objects.bulk_create', side_effect=OperationalError):
+            response = self.client.post("/v1/file/batch", {"profilePic": [image_file("a.png"), image_file("b.png")]})
+        self.assertEqual(response.status_code, 503)
+        deleted = self.s3_client.delete_objects.call_args.kwargs["Delete"]["Objects"]
+        self.assertEqual(len(deleted), 2)
+
+    def test_batch_requires_files(self):
+        self.assertEqual(self.client.post("/v1/file/batch", {}).status_code, 400)
+        self.assertEqual(self.client.get("/v1/file/batch").status_code, 405)
+
+
+class BatchDeleteTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        bucket_patcher = mock.patch('image_upload.views.BUCKET_NAME', 'bucket')
+        bucket_patcher.start()
+        self.addCleanup(bucket_patcher.stop)
+        self.s3_client.delete_objects.return_value = {}
+        self.images = [Image.objects.create(file_name=f"{i}.png", url="") for i in range(3)]
+        for image in self.images:
+            image.url = f"https://bucket.s3.amazonaws.com/{image.id}/{image.file_name}"
+            image.save()
+
+    def delete(self, ids):
+        return self.client.delete("/v1/file/batch", {"ids": ids}, content_type="application/json")
+
+    def test_bulk_delete(self):
+        """Test that one DeleteObjects call and one lookup/delete pair remove every image."""
+        missing = "7f2a3c1e-0000-4000-8000-000000000000"
+        ids = [str(image.id) for image in self.images]
+        response = self.delete(ids + [missing, "not-a-uuid"])
+        self.assertEqual(response.status_code, 200)
+        statuses = {item["id"]: item["status"] for item in response.json()["results"]}
+        self.assertEqual([statuses[image_id] for image_id in ids], [204, 204, 204])
+        self.assertEqual(statuses[missing], 404)
+        self.assertEqual(statuses["not-a-uuid"], 400)
+        self.s3_client.delete_objects.assert_called_once()
+        self.assertFalse(Image.objects.exists())
+
+    def test_failed_keys_keep_their_rows(self):
+        kept = self.images[0]
+        self.s3_client.delete_objects.return_value = {
+            "Errors": [{"Key": f"{kept.id}/{kept.file_name}", "Code": "InternalError"}]}
+        response = self.delete([str(image.id) for image in self.images])
+        statuses = {item["id"]: item["status"] for item in response.json()["results"]}
+        self.assertEqual(statuses[str(kept.id)], 503)
+        self.assertEqual(list(Image.objects.values_list("id", flat=True)), [kept.id])
+
+    def test_bulk_delete_requires_ids(self):
+        self.assertEqual(self.delete([]).status_code, 400)
@@ -0,0 +1,211 @@
+from unittest import mock
+import boto3
+from botocore.exceptions import BotoCoreError
+from botocore.stub import Stubber
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as SqliteDatabaseWrapper
+from django.test import SimpleTestCase, TestCase, Client
+from healthz.checks import DependencyMonitor
+from image_upload.models import Blob, Image
+from webapp.breakers import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, attach_breaker, breakers
+from webapp.db.breaker import CircuitBreakerDatabaseWrapperMixin
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30, statsd_client=mock.Mock())
+
+    def trip(self):
+        for _ in range(3):
+            self.breaker.record_failure(TimeoutError("read timeout"))
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.trip()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.is_open())
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.breaker.statsd_client.gauge.assert_called_with('breaker.test.state', 2)
+        self.breaker.statsd_client.incr.assert_any_call('breaker.test.opened')
+        self.breaker.statsd_client.incr.assert_any_call('breaker.test.rejected')
+
+    def test_half_open_trial(self):
+        self.trip()
+        self.breaker.opened_at -= 30
+
+        # One trial goes through, concurrent calls keep failing fast
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.breaker.opened_at -= 30
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.before_call()
+
+    def test_disabled_breaker_never_opens(self):
+        self.breaker.enabled = False
+        self.trip()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.before_call()
+
+
+class S3BreakerTest(SimpleTestCase):
+    def test_server_errors_open_the_breaker(self):
+        breaker = CircuitBreaker('s3-test', failure_threshold=2, reset_timeout=30)
+        client = attach_breaker(boto3.client('s3', region_name='us-east-1'), breaker)
+        with Stubber(client) as stubber:
+            stubber.add_client_error('head_object', service_error_code='404', http_status_code=404)
+            stubber.add_client_error('head_object', service_error_code='SlowDown', http_status_code=503)
+            stubber.add_client_error('head_object', service_error_code='InternalError', http_status_code=500)
+            for _ in range(3):
+                with self.assertRaises(client.exceptions.ClientError):
+                    client.head_object(Bucket='bucket', Key='key')
+            self.assertEqual(breaker.state, OPEN)
+            stubber.assert_no_pending_responses()
+
+        # Refused before any request is made, as an error the S3 error handling already catches
+        with self.assertRaises(BotoCoreError) as raised:
+            client.head_object(Bucket='bucket', Key='key')
+        self.assertIsInstance(raised.exception, CircuitOpenError)
+        self.assertEqual(raised.exception.retry_after, breaker.retry_after())
+
+
+class DatabaseBreakerTest(SimpleTestCase):
+    def test_connection_errors_open_the_breaker(self):
+        breaker = CircuitBreaker('database-test', failure_threshold=2, reset_timeout=30)
+
+        class DatabaseWrapper(CircuitBreakerDatabaseWrapperMixin, SqliteDatabaseWrapper):
+            pass
+
+        DatabaseWrapper.breaker = breaker
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': ':memory:'}, alias='breaker_test')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (id INTEGER UNIQUE)")
+            cursor.execute("INSERT INTO t VALUES (1)")
+            # Constraint violations mean the server is fine
+            for _ in range(3):
+                with self.assertRaises(Exception):
+                    cursor.execute("INSERT INTO t VALUES (1)")
+            self.assertEqual(breaker.state, CLOSED)
+
+            # SQLite reports errors like this one as OperationalError, as MySQL does for a lost server
+            for _ in range(2):
+                with self.assertRaises(OperationalError):
+                    cursor.execute("SELECT * FROM missing_table")
+            self.assertEqual(breaker.state, OPEN)
+
+            with self.assertRaisesMessage(OperationalError, "circuit open"):
+                cursor.execute("SELECT 1")
+
+
+class CircuitBreakerMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for breaker in breakers.values():
+            self.addCleanup(breaker.reset)
+        monitor = DependencyMonitor({'database': lambda: None, 's3': lambda: None},
+                                    background=False, breakers=breakers)
+        patcher = mock.patch('healthz.views.dependency_monitor', monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_s3(self):
+        for _ in range(breakers['s3'].failure_threshold):
+            breakers['s3'].record_failure()
+
+    def test_uploads_are_shed_while_open(self):
+        self.open_s3()
+        image = SimpleUploadedFile("cat.png", b"png", content_type="image/png")
+        with mock.patch('image_upload.views.s3_client') as s3_client:
+            response = self.client.post("/v1/file", {"profilePic": image})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["unavailable"], ["s3"])
+        self.assertEqual(response["Retry-After"], str(breakers['s3'].retry_after()))
+        s3_client.assert_not_called()
+
+    def test_readiness_follows_the_breakers(self):
+        self.assertEqual(self.client.get("/healthz/ready").status_code, 200)
+        self.open_s3()
+        response = self.client.get("/healthz/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(self.client.get("/healthz/live").status_code, 200)
+
+        breakers['s3'].record_success()
+        self.assertEqual(self.client.get("/healthz/ready").status_code, 200)
+
+    def test_get_fails_fast_while_database_is_open(self):
+        for _ in range(breakers['database'].failure_threshold):
+            breakers['database'].record_failure()
+        # What the MySQL backend raises for a refused query (webapp/db/breaker.py)
+        refused = OperationalError("database is unavailable (circuit open), retry in 30s")
+        with mock.patch('image_upload.views.read_image', side_effect=refused):
+            response = self.client.get("/v1/file/00000000-0000-0000-0000-000000000001")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(breakers['database'].retry_after()))
+
+    def test_reads_still_reach_the_view(self):
+        self.open_s3()
+        response = self.client.get("/v1/file/00000000-0000-0000-0000-000000000000")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("Retry-After", response)
+
+
+class S3BreakerOpenViewTest(TestCase):
+    """While the S3 breaker is open every S3 route answers 503 with Retry-After."""
+
+    def setUp(self):
+        self.client = Client()
+        self.addCleanup(breakers['s3'].reset)
+        for _ in range(breakers['s3'].failure_threshold):
+            breakers['s3'].record_failure()
+        s3_client = attach_breaker(boto3.client('s3', region_name='us-east-1'), breakers['s3'])
+        patcher = mock.patch('image_upload.views.s3_client', s3_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.image = Image.objects.create(file_name="cat.png",
+                                          url="https://test-bucket.s3.amazonaws.com/cat/cat.png")
+
+    def assertUnavailable(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["unavailable"], ["s3"])
+        self.assertEqual(response["Retry-After"], str(breakers['s3'].retry_after()))
+
+    def test_content(self):
+        self.assertUnavailable(self.client.get(f"/v1/file/{self.image.id}/content"))
+
+    def test_delete(self):
+        self.assertUnavailable(self.client.delete(f"/v1/file/{self.image.id}"))
+        self.assertTrue(Image.objects.filter(id=self.image.id).exists())
+
+    def test_batch_delete_of_shared_blob(self):
+        blob = Blob.objects.create(digest="a" * 64, key=f"blobs/{'a' * 64}", size=3, ref_count=1)
+        Image.objects.filter(id=self.image.id).update(blob=blob)
+        response = self.client.delete("/v1/file/batch", {"ids": [str(self.image.id)]},
+                                      content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [{"id": str(self.image.id), "status": 503}])
+        self.assertTrue(Image.objects.filter(id=self.image.id).exists())
+
+    def test_upload_when_the_breaker_opens_mid_request(self):
+        # Admitted before the breaker opened; the streamed upload is refused on the way
+        with mock.patch('webapp.breakers.open_breakers', return_value=[]):
+            response = self.client.post("/v1/file", {
+                "profilePic": SimpleUploadedFile("cat.png", b"png", content_type="image/png")
+            })
+        self.assertUnavailable(response)
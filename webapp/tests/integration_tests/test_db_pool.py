@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.test import SimpleTestCase
+from webapp.db import pool as db_pool
+from webapp.db.pool import ConnectionPool, PooledDatabaseWrapperMixin
+
+
+class PooledSQLiteWrapper(PooledDatabaseWrapperMixin, sqlite_base.DatabaseWrapper):
+    pass
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool('test', max_size=2, timeout=0.05)
+
+    def test_released_connection_is_reused(self):
+        connect = mock.Mock(side_effect=lambda: mock.Mock())
+        raw, created_at = self.pool.acquire(connect, lambda raw: True)
+        self.pool.release(raw, created_at)
+
+        self.assertIs(self.pool.acquire(connect, lambda raw: True)[0], raw)
+        connect.assert_called_once()
+
+    def test_unusable_connection_is_replaced(self):
+        raw, created_at = self.pool.acquire(mock.Mock, lambda raw: True)
+        self.pool.release(raw, created_at)
+
+        fresh, _ = self.pool.acquire(mock.Mock, lambda raw: False)
+
+        self.assertIsNot(fresh, raw)
+        raw.close.assert_called_once()
+        self.assertEqual(self.pool.stats()["open"], 1)
+
+    def test_pool_size_is_bounded(self):
+        self.pool.acquire(mock.Mock, lambda raw: True)
+        self.pool.acquire(mock.Mock, lambda raw: True)
+
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire(mock.Mock, lambda raw: True)
+
+    def test_waiter_gets_released_connection(self):
+        self.pool.timeout = 5
+        self.pool.acquire(mock.Mock, lambda raw: True)
+        raw, created_at = self.pool.acquire(mock.Mock, lambda raw: True)
+        threading.Timer(0.05, self.pool.release, (raw, created_at)).start()
+
+        self.assertIs(self.pool.acquire(mock.Mock, lambda raw: True)[0], raw)
+
+    def test_failed_connect_frees_its_slot(self):
+        with self.assertRaises(OSError):
+            self.pool.acquire(mock.Mock(side_effect=OSError("refused")), lambda raw: True)
+        self.assertEqual(self.pool.stats()["open"], 0)
+
+
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(db_pool._pools.clear)
+
+    def make_wrapper(self, max_size=1):
+        settings_dict = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path, 'USER': '', 'PASSWORD': '',
+            'HOST': '', 'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'TEST': {},
+            'POOL': {'MAX_SIZE': max_size, 'TIMEOUT': 0.05},
+        }
+        return PooledSQLiteWrapper(settings_dict, alias='pool_test')
+
+    def test_close_returns_connection_to_pool(self):
+        first, second = self.make_wrapper(), self.make_wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        with second.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+        second.close()
+
+    def test_exhausted_pool_raises_operational_error(self):
+        first, second = self.make_wrapper(), self.make_wrapper()
+        first.ensure_connection()
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+        first.close()
+
+    def test_connection_with_errors_is_not_reused(self):
+        first, second = self.make_wrapper(), self.make_wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.errors_occurred = True
+        first.close()
+
+        second.ensure_connection()
+        self.assertIsNot(second.connection, raw)
+        second.close()
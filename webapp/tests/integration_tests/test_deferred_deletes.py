@@ -0,0 +1,104 @@
+import uuid
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from image_upload.models import Blob, Image, PendingDeletion
+from image_upload.outbox import defer_image_deletes, drain_batch
+from image_upload.views import image_cache
+
+
+def create_image(file_name="cat.png", blob=None):
+    image_id = uuid.uuid4()
+    key = blob.key if blob else f"{image_id}/{file_name}"
+    return Image.objects.create(id=image_id, file_name=file_name, blob=blob,
+                                url=f"https://bucket.s3.amazonaws.com/{key}")
+
+
+@override_settings(ASYNC_DELETES=True)
+class DeferredDeleteViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('image_upload.views.BUCKET_NAME', 'bucket')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delete_queues_object_without_calling_s3(self):
+        """Test that DELETE removes the row and records the key in the outbox."""
+        image = create_image()
+        response = self.client.delete(f"/v1/file/{image.id}")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(list(PendingDeletion.objects.values_list("key", flat=True)), [f"{image.id}/cat.png"])
+        self.s3_client.delete_object.assert_not_called()
+        self.assertEqual(self.client.get(f"/v1/file/{image.id}").status_code, 404)
+
+    def test_batch_delete_queues_objects(self):
+        images = [create_image() for _ in range(3)]
+        response = self.client.delete("/v1/file/batch", {"ids": [str(image.id) for image in images]},
+                                      content_type="application/json")
+
+        self.assertEqual([item["status"] for item in response.json()["results"]], [204, 204, 204])
+        self.assertEqual(PendingDeletion.objects.count(), 3)
+        self.s3_client.delete_objects.assert_not_called()
+
+    def test_shared_blob_is_queued_with_last_reference(self):
+        blob = Blob.objects.create(digest="a" * 64, key="blobs/" + "a" * 64, size=3, ref_count=2)
+        first, second = create_image(blob=blob), create_image(blob=blob)
+
+        self.client.delete(f"/v1/file/{first.id}")
+        self.assertFalse(PendingDeletion.objects.exists())
+        self.client.delete(f"/v1/file/{second.id}")
+
+        entry = PendingDeletion.objects.get()
+        self.assertEqual((entry.key, entry.digest), (blob.key, blob.digest))
+        self.assertEqual(Blob.objects.get().ref_count, 0)
+
+
+class DrainDeletionsTest(TestCase):
+    def setUp(self):
+        self.s3_client = mock.Mock()
+        self.s3_client.delete_objects.return_value = {}
+
+    def test_drain_deletes_queued_objects(self):
+        defer_image_deletes([(create_image().id, f"key-{n}", None) for n in range(3)])
+
+        self.assertEqual(drain_batch(self.s3_client, 'bucket'), (3, 0))
+        deleted = self.s3_client.delete_objects.call_args.kwargs["Delete"]["Objects"]
+        self.assertEqual(sorted(item["Key"] for item in deleted), ["key-0", "key-1", "key-2"])
+        self.assertFalse(PendingDeletion.objects.exists())
+
+    def test_failures_are_retried_with_backoff(self):
+        PendingDeletion.objects.create(key="kept")
+        PendingDeletion.objects.create(key="gone")
+        self.s3_client.delete_objects.return_value = {"Errors": [{"Key": "kept", "Code": "SlowDown"}]}
+
+        self.assertEqual(drain_batch(self.s3_client, 'bucket', retry_base=60), (1, 1))
+        entry = PendingDeletion.objects.get()
+        self.assertEqual((entry.key, entry.attempts, entry.last_error), ("kept", 1, "SlowDown"))
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(drain_batch(self.s3_client, 'bucket'), (0, 0))
+
+    def test_blob_referenced_again_is_kept(self):
+        blob = Blob.objects.create(digest="b" * 64, key="blobs/" + "b" * 64, size=3, ref_count=1)
+        PendingDeletion.objects.create(key=blob.key, digest=blob.digest)
+
+        self.assertEqual(drain_batch(self.s3_client, 'bucket'), (1, 0))
+        self.s3_client.delete_object.assert_not_called()
+        self.assertTrue(Blob.objects.exists())
+
+    def test_command_drains_outbox(self):
+        PendingDeletion.objects.create(key="key-0")
+        out = StringIO()
+        with mock.patch('image_upload.management.commands.drain_deletions.s3_client', self.s3_client):
+            call_command('drain_deletions', '--once', stdout=out)
+
+        self.assertFalse(PendingDeletion.objects.exists())
+        self.assertIn("Deleted 1 objects, 0 failures, 0 pending", out.getvalue())
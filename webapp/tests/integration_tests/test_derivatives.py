@@ -0,0 +1,115 @@
+import uuid
+from io import BytesIO
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, SimpleTestCase
+from PIL import Image as PILImage
+from image_upload.derivatives import DerivativePipeline, derivative_key
+from image_upload.imaging import parse_specs, render
+from image_upload.models import Derivative, Image
+from image_upload.views import derivative_pipeline, image_cache
+
+
+def png_bytes(width=640, height=480):
+    body = BytesIO()
+    PILImage.new("RGB", (width, height), "orange").save(body, format="PNG")
+    return body.getvalue()
+
+
+class ImagingTest(SimpleTestCase):
+    def test_parse_specs(self):
+        self.assertEqual(parse_specs(" thumb:256:webp, medium:1024:jpeg ,"),
+                         [("thumb", 256, "webp"), ("medium", 1024, "jpeg")])
+        self.assertEqual(parse_specs(""), [])
+        with self.assertRaises(ValueError):
+            parse_specs("thumb:256:gif")
+
+    def test_render_keeps_aspect_ratio_and_never_upscales(self):
+        thumb, large = render(png_bytes(), [("thumb", 64, "webp"), ("large", 4096, "jpeg")])
+        self.assertEqual((thumb["width"], thumb["height"]), (64, 48))
+        self.assertEqual(thumb["content_type"], "image/webp")
+        self.assertEqual((large["width"], large["height"]), (640, 480))
+        self.assertEqual(large["extension"], "jpg")
+        self.assertEqual(PILImage.open(BytesIO(thumb["body"])).format, "WEBP")
+
+
+class DerivativePipelineTest(TestCase):
+    def setUp(self):
+        self.s3_client = mock.Mock()
+        self.on_complete = mock.Mock()
+        self.pipeline = DerivativePipeline([("thumb", 32, "webp")], self.s3_client, "bucket", workers=1,
+                                           on_complete=self.on_complete)
+        self.addCleanup(self.pipeline.shutdown)
+        self.image = Image.objects.create(id=uuid.uuid4(), file_name="cat.png", url="https://bucket/cat.png")
+
+    def test_run_uploads_and_records_renditions(self):
+        """Test that a run resizes in the process pool, uploads the result and records it."""
+        data = png_bytes()
+        self.s3_client.get_object.return_value = {"ContentLength": len(data), "Body": BytesIO(data)}
+
+        records = self.pipeline.run(str(self.image.id), f"{self.image.id}/cat.png")
+
+        key = derivative_key(self.image.id, "thumb", "webp")
+        self.s3_client.put_object.assert_called_once_with(Bucket="bucket", Key=key, Body=mock.ANY,
+                                                          ContentType="image/webp")
+        self.assertEqual(len(records), 1)
+        derivative = Derivative.objects.get(image=self.image)
+        self.assertEqual((derivative.key, derivative.width, derivative.height), (key, 32, 24))
+        self.on_complete.assert_called_once_with(str(self.image.id))
+
+    def test_oversized_source_is_skipped(self):
+        self.pipeline.max_source_bytes = 10
+        self.s3_client.get_object.return_value = {"ContentLength": 11, "Body": BytesIO(b"x" * 11)}
+        self.assertEqual(self.pipeline.run(str(self.image.id), "key"), [])
+        self.s3_client.put_object.assert_not_called()
+        self.assertFalse(Derivative.objects.exists())
+
+
+class DerivativeViewsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        for target, value in (('image_upload.views.BUCKET_NAME', 'bucket'),
+                              ('image_upload.views.derivative_pipeline.specs', [("thumb", 256, "webp")])):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(derivative_pipeline, 'submit')
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_image(self):
+        image = Image.objects.create(id=uuid.uuid4(), file_name="cat.png",
+                                     url="https://bucket.s3.amazonaws.com/cat.png")
+        key = derivative_key(image.id, "thumb", "webp")
+        Derivative.objects.create(image=image, name="thumb", key=key, url=f"https://bucket.s3.amazonaws.com/{key}",
+                                  content_type="image/webp", width=256, height=192, size=100)
+        return image
+
+    def test_upload_schedules_derivatives(self):
+        response = self.client.post("/v1/file", {
+            "profilePic": SimpleUploadedFile("cat.png", b"png-bytes", content_type="image/png"),
+        })
+        self.assertEqual(response.status_code, 201)
+        image_id = response.json()["id"]
+        self.submit.assert_called_once_with(image_id, f"{image_id}/cat.png")
+
+    def test_get_lists_derivatives(self):
+        image = self.create_image()
+        response = self.client.get(f"/v1/file/{image.id}")
+        self.assertEqual(response.json()["derivatives"], {"thumb": {
+            "url": f"https://bucket.s3.amazonaws.com/{derivative_key(image.id, 'thumb', 'webp')}",
+            "content_type": "image/webp", "width": 256, "height": 192}})
+
+    def test_delete_removes_derivative_objects(self):
+        image = self.create_image()
+        self.s3_client.delete_objects.return_value = {}
+
+        self.assertEqual(self.client.delete(f"/v1/file/{image.id}").status_code, 204)
+
+        self.s3_client.delete_objects.assert_called_once_with(Bucket='bucket', Delete={
+            'Objects': [{'Key': derivative_key(image.id, "thumb", "webp")}], 'Quiet': True})
+        self.assertFalse(Derivative.objects.exists())
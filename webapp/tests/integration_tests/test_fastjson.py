@@ -0,0 +1,84 @@
+import importlib
+import json
+import logging
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from django.test import SimpleTestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured
+from webapp import fastjson
+from webapp.log_pipeline import JsonFormatter
+
+DOCUMENT = {
+    "id": uuid.UUID("0d7b2a1e-4e0b-4a4e-9d63-2f6b1c3f9a10"),
+    "upload_date": date(2026, 10, 18),
+    "created": datetime(2026, 10, 18, 12, 30, 5),
+    "size": Decimal("1.5"),
+    "name": "cät.png",
+}
+
+
+class FastJsonBackendsTest(SimpleTestCase):
+    def use_backend(self, name):
+        with override_settings(JSON_BACKEND=name):
+            importlib.reload(fastjson)
+        self.addCleanup(importlib.reload, fastjson)
+
+    def assert_encodes_natively(self):
+        decoded = json.loads(fastjson.dumps(DOCUMENT))
+        self.assertEqual(decoded["id"], "0d7b2a1e-4e0b-4a4e-9d63-2f6b1c3f9a10")
+        self.assertEqual(decoded["upload_date"], "2026-10-18")
+        self.assertEqual(decoded["created"], "2026-10-18T12:30:05")
+        self.assertEqual(decoded["size"], "1.5")
+        self.assertEqual(decoded["name"], "cät.png")
+        self.assertEqual(fastjson.loads(fastjson.dumps_str({"a": [1, 2]})), {"a": [1, 2]})
+        self.assertEqual(fastjson.dumps({"b": 1, "a": 2}, sort_keys=True), b'{"a":2,"b":1}')
+
+    def test_stdlib_backend(self):
+        self.use_backend("stdlib")
+        self.assertEqual(fastjson.backend, "stdlib")
+        self.assert_encodes_natively()
+
+    def test_orjson_backend(self):
+        if fastjson.orjson is None:
+            self.skipTest("orjson is not installed")
+        self.use_backend("orjson")
+        self.assertEqual(fastjson.backend, "orjson")
+        self.assert_encodes_natively()
+
+    def test_backends_encode_dates_and_times_identically(self):
+        if fastjson.orjson is None:
+            self.skipTest("orjson is not installed")
+        document = {
+            "naive": datetime(2026, 10, 18, 12, 30, 5, 123456),
+            "utc": datetime(2026, 10, 18, 12, 30, 5, 123456, tzinfo=timezone.utc),
+            "offset": datetime(2026, 10, 18, 12, 30, 5, tzinfo=timezone(timedelta(hours=2))),
+            "date": date(2026, 10, 18),
+            "time": time(12, 30, 5, 250000),
+            "duration": timedelta(seconds=90),
+        }
+        encoded = {}
+        for name in ("stdlib", "orjson"):
+            self.use_backend(name)
+            encoded[name] = (fastjson.dumps(document), fastjson.dumps_str(document))
+        self.assertEqual(encoded["orjson"], encoded["stdlib"])
+        self.assertEqual(json.loads(encoded["orjson"][0])["utc"], "2026-10-18T12:30:05.123Z")
+
+    def test_auto_falls_back_without_orjson(self):
+        self.assertEqual(fastjson._resolve_backend("auto"), "orjson" if fastjson.orjson else "stdlib")
+        with self.assertRaises(ImproperlyConfigured):
+            fastjson._resolve_backend("simplejson")
+
+    def test_response(self):
+        response = fastjson.FastJsonResponse({"id": DOCUMENT["id"]}, status=201)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content), {"id": str(DOCUMENT["id"])})
+        with self.assertRaises(TypeError):
+            fastjson.FastJsonResponse([1, 2])
+
+    def test_log_formatter(self):
+        record = logging.LogRecord("webapp", logging.INFO, __file__, 1, {"image_id": DOCUMENT["id"]}, None, None)
+        line = json.loads(JsonFormatter().format(record))
+        self.assertEqual(line["image_id"], str(DOCUMENT["id"]))
+        self.assertIn("timestamp", line)
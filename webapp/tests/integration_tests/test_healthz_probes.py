@@ -0,0 +1,58 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.utils.timezone import now
+from healthz.checks import DependencyMonitor, check_database, check_s3
+from healthz.models import HealthCheck
+
+
+class HealthzProbeTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.s3_check = mock.Mock()
+        self.monitor = DependencyMonitor({'database': check_database, 's3': self.s3_check},
+                                         ttl=60, background=False)
+        patcher = mock.patch('healthz.views.dependency_monitor', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_live_does_not_touch_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get("/healthz/live")
+        self.assertEqual(response.status_code, 200)
+
+    def test_ready_is_cached(self):
+        """Test that repeated readiness probes reuse the cached status."""
+        with self.assertNumQueries(1):
+            for _ in range(5):
+                self.assertEqual(self.client.get("/healthz/ready").status_code, 200)
+        self.s3_check.assert_called_once()
+        self.assertFalse(HealthCheck.objects.exists())
+
+    def test_ready_reports_unhealthy_dependency(self):
+        self.s3_check.side_effect = RuntimeError("bucket unreachable")
+        self.assertEqual(self.client.get("/healthz/ready").status_code, 503)
+
+    def test_probes_reject_payload(self):
+        self.assertEqual(self.client.get("/healthz/live", {"a": "b"}).status_code, 400)
+        self.assertEqual(self.client.get("/healthz/ready", {"a": "b"}).status_code, 400)
+        self.assertEqual(self.client.post("/healthz/ready").status_code, 405)
+
+
+class S3CheckTest(TestCase):
+    def test_uses_the_storage_client(self):
+        with mock.patch('image_upload.storage.s3_client') as s3_client, \
+                mock.patch('image_upload.storage.BUCKET_NAME', 'bucket'):
+            check_s3()
+        s3_client.head_bucket.assert_called_once_with(Bucket='bucket')
+
+
+class PruneHealthchecksTest(TestCase):
+    def test_prune_keeps_recent_rows(self):
+        old = HealthCheck.objects.create(datetime=now() - timedelta(days=30))
+        recent = HealthCheck.objects.create()
+        call_command('prune_healthchecks', days=7, batch_size=1, stdout=StringIO())
+        self.assertEqual(list(HealthCheck.objects.values_list('check_id', flat=True)), [recent.check_id])
+        self.assertFalse(HealthCheck.objects.filter(check_id=old.check_id).exists())
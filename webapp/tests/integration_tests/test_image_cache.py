@@ -0,0 +1,137 @@
+import calendar
+import uuid
+from datetime import date
+from unittest import mock
+from django.test import TestCase, Client
+from django.utils.http import http_date
+from image_upload.cache import ImageMetadataCache, metadata_etag
+from image_upload.models import Image
+from image_upload.views import image_cache
+
+
+class ImageMetadataCacheTest(TestCase):
+    def test_lru_eviction(self):
+        cache = ImageMetadataCache(max_entries=2)
+        cache.set("a", {"id": "a"})
+        cache.set("b", {"id": "b"})
+        cache.get("a")  # "a" is now most recently used
+        cache.set("c", {"id": "c"})
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, {"id": "a"}))
+
+    def test_ttl_expiry(self):
+        cache = ImageMetadataCache(ttl=10)
+        with mock.patch('image_upload.cache.time.monotonic', return_value=100):
+            cache.set("a", {"id": "a"})
+        with mock.patch('image_upload.cache.time.monotonic', return_value=111):
+            self.assertEqual(cache.get("a"), (False, None))
+
+    def test_negative_entries_and_metrics(self):
+        statsd_client = mock.Mock()
+        cache = ImageMetadataCache(statsd_client=statsd_client)
+        cache.set_missing("a")
+        self.assertEqual(cache.get("a"), (True, None))
+        statsd_client.incr.assert_called_with('cache.image_metadata.negative_hit')
+
+    def test_shared_backend(self):
+        worker_a = ImageMetadataCache(backend_alias='default')
+        worker_b = ImageMetadataCache(backend_alias='default')
+        worker_a.set("a", {"id": "a"})
+        self.assertEqual(worker_b.get("a"), (True, {"id": "a"}))
+        worker_a.invalidate("a")
+        worker_b.clear()
+        self.assertEqual(worker_b.get("a"), (False, None))
+
+
+    def test_local_tier_is_short_lived(self):
+        cache = ImageMetadataCache(ttl=300, local_ttl=5)
+        with mock.patch('image_upload.cache.time.monotonic', return_value=100):
+            cache.set("a", {"id": "a"})
+        with mock.patch('image_upload.cache.time.monotonic', return_value=106):
+            self.assertEqual(cache.get("a"), (False, None))
+
+    def test_delete_reaches_other_workers(self):
+        worker_a = ImageMetadataCache(backend_alias='default')
+        worker_b = ImageMetadataCache(backend_alias='default')
+        with mock.patch('image_upload.cache.time.monotonic', return_value=100):
+            worker_a.set("a", {"id": "a"})
+            self.assertEqual(worker_b.get("a"), (True, {"id": "a"}))
+            worker_a.mark_deleted("a")
+            self.assertEqual(worker_a.get("a"), (True, None))
+        # Once its local copy expires, worker B finds the tombstone instead of asking MySQL
+        with mock.patch('image_upload.cache.time.monotonic', return_value=106):
+            self.assertEqual(worker_b.get("a"), (True, None))
+
+
+class CachedHandleImageTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        self.addCleanup(image_cache.clear)
+        self.image_id = uuid.uuid4()
+        Image.objects.create(id=self.image_id, file_name="cat.png",
+                             url=f"https://bucket.s3.amazonaws.com/{self.image_id}/cat.png")
+
+    def test_repeated_get_skips_database(self):
+        first = self.client.get(f"/v1/file/{self.image_id}")
+        with self.assertNumQueries(0):
+            second = self.client.get(f"/v1/file/{self.image_id}")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+
+    def test_repeated_404_skips_database(self):
+        missing_id = uuid.uuid4()
+        self.assertEqual(self.client.get(f"/v1/file/{missing_id}").status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f"/v1/file/{missing_id}").status_code, 404)
+
+    def test_delete_invalidates(self):
+        self.client.get(f"/v1/file/{self.image_id}")
+        with mock.patch('image_upload.views.s3_client'), mock.patch('image_upload.views.BUCKET_NAME', 'bucket'):
+            self.assertEqual(self.client.delete(f"/v1/file/{self.image_id}").status_code, 204)
+        self.assertEqual(self.client.get(f"/v1/file/{self.image_id}").status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        self.addCleanup(image_cache.clear)
+        self.image_id = uuid.uuid4()
+        Image.objects.create(id=self.image_id, file_name="cat.png",
+                             url=f"https://bucket.s3.amazonaws.com/{self.image_id}/cat.png")
+        self.url = f"/v1/file/{self.image_id}"
+
+    def test_validators_and_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["ETag"], metadata_etag(response.json()))
+        self.assertEqual(response["Last-Modified"],
+                         http_date(calendar.timegm(date.fromisoformat(response.json()["upload_date"]).timetuple())))
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+
+    def test_if_none_match_answers_304_from_cache(self):
+        """Test that a revalidation hitting the cache needs neither the DB nor the JSON encoder."""
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0), mock.patch('image_upload.views.FastJsonResponse') as json_response:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        json_response.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_pending_derivatives_are_revalidated(self):
+        with mock.patch('image_upload.views.derivative_pipeline.specs', [("thumb", 256, "webp")]):
+            response = self.client.get(self.url)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertFalse(response.has_header("Last-Modified"))
+
+    def test_not_found_is_not_cached(self):
+        response = self.client.get(f"/v1/file/{uuid.uuid4()}")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response["Cache-Control"], "no-store")
@@ -0,0 +1,104 @@
+import uuid
+from unittest import mock
+import boto3
+from asgiref.sync import async_to_sync
+from django.test import TestCase, Client, RequestFactory
+from moto import mock_aws
+from image_upload.content import ObjectStream
+from image_upload.models import Image
+from image_upload.views import image_content_async
+
+
+@mock_aws
+class ImageContentTest(TestCase):
+    bucket = "content-bucket"
+    payload = bytes(range(256)) * 1024
+
+    def setUp(self):
+        self.client = Client()
+        self.s3_client = boto3.client("s3", region_name="us-east-1")
+        self.s3_client.create_bucket(Bucket=self.bucket)
+        for target, value in (('image_upload.views.s3_client', self.s3_client),
+                              ('image_upload.views.BUCKET_NAME', self.bucket)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.image = Image.objects.create(id=uuid.uuid4(), file_name="cat.png",
+                                          url=f"https://{self.bucket}.s3.amazonaws.com/cat/cat.png")
+        self.s3_client.put_object(Bucket=self.bucket, Key="cat/cat.png", Body=self.payload, ContentType="image/png")
+        self.url = f"/v1/file/{self.image.id}/content"
+
+    def test_streams_whole_object(self):
+        with self.settings(CONTENT_CHUNK_SIZE=4096):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.payload)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Content-Length"], str(len(self.payload)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response["ETag"].startswith('"'))
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.payload[100:200])
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.payload)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(response.streaming_content), self.payload[-10:])
+
+    def test_multiple_ranges_get_whole_object(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-1,5-6")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content)), len(self.payload))
+
+    def test_if_range_mismatch_serves_whole_object(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.payload)
+
+    def test_conditional_requests(self):
+        etag = self.client.head(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MATCH='"other"').status_code, 412)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_head_returns_headers_only(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(len(self.payload)))
+        self.assertEqual(response.content, b"")
+
+    def test_missing_image_or_object(self):
+        self.assertEqual(self.client.get(f"/v1/file/{uuid.uuid4()}/content").status_code, 404)
+        self.s3_client.delete_object(Bucket=self.bucket, Key="cat/cat.png")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_async_view_streams_range(self):
+        async def read(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        request = RequestFactory().get(self.url, HTTP_RANGE="bytes=10-")
+        response = async_to_sync(image_content_async)(request, str(self.image.id))
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(async_to_sync(read)(response), self.payload[10:])
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get("/v1/file/not-a-uuid/content").status_code, 400)
+        self.assertEqual(self.client.delete(self.url).status_code, 405)
+
+
+class ObjectStreamTest(TestCase):
+    def test_reads_fixed_chunks_and_closes_body(self):
+        body = mock.Mock()
+        body.read.side_effect = [b"a" * 4, b"b" * 4, b"c", b""]
+        on_close = mock.Mock()
+        stream = ObjectStream(body, 4, on_close=on_close)
+
+        self.assertEqual(list(stream), [b"aaaa", b"bbbb", b"c"])
+        body.read.assert_called_with(4)
+        stream.close()
+        body.close.assert_called_once_with()
+        on_close.assert_called_once_with(9)
@@ -0,0 +1,78 @@
+import hashlib
+from unittest import mock
+from botocore.exceptions import ClientError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from image_upload.blobs import blob_key
+from image_upload.models import Blob, Image
+from image_upload.views import image_cache
+
+
+@override_settings(IMAGE_DEDUP=True)
+class ImageDedupTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('image_upload.views.BUCKET_NAME', 'bucket')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, payload, name="cat.png"):
+        return self.client.post("/v1/file", {
+            "profilePic": SimpleUploadedFile(name, payload, content_type="image/png"),
+        })
+
+    def test_identical_bytes_are_stored_once(self):
+        """Test that a second upload of the same bytes skips S3 and shares the blob."""
+        digest = hashlib.sha256(b"png-bytes").hexdigest()
+        first = self.upload(b"png-bytes")
+        second = self.upload(b"png-bytes", name="copy.png")
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.s3_client.upload_fileobj.assert_called_once()
+        self.assertEqual(self.s3_client.upload_fileobj.call_args.args[2], blob_key(digest))
+        self.s3_client.put_object.assert_not_called()
+        self.assertEqual(Blob.objects.get(digest=digest).ref_count, 2)
+        self.assertEqual(first.json()["url"], second.json()["url"])
+        self.assertEqual(second.json()["file_name"], "copy.png")
+
+    def test_different_bytes_get_their_own_blob(self):
+        self.upload(b"png-bytes")
+        self.upload(b"other-bytes")
+        self.assertEqual(self.s3_client.upload_fileobj.call_count, 2)
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_delete_removes_object_with_last_reference(self):
+        """Test that DELETE keeps a shared object until its last image is gone."""
+        first = self.upload(b"png-bytes").json()["id"]
+        second = self.upload(b"png-bytes").json()["id"]
+
+        self.assertEqual(self.client.delete(f"/v1/file/{first}").status_code, 204)
+        self.s3_client.delete_object.assert_not_called()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+        self.assertEqual(self.client.delete(f"/v1/file/{second}").status_code, 204)
+        self.s3_client.delete_object.assert_called_once_with(
+            Bucket='bucket', Key=blob_key(hashlib.sha256(b"png-bytes").hexdigest()))
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(Image.objects.exists())
+
+    def test_failed_object_delete_keeps_image_and_reference(self):
+        image_id = self.upload(b"png-bytes").json()["id"]
+        self.s3_client.delete_object.side_effect = ClientError({"Error": {"Code": "500"}}, "DeleteObject")
+
+        self.assertEqual(self.client.delete(f"/v1/file/{image_id}").status_code, 503)
+        self.assertTrue(Image.objects.filter(id=image_id).exists())
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+    def test_batch_delete_releases_shared_blobs(self):
+        ids = [self.upload(b"png-bytes").json()["id"] for _ in range(2)]
+        response = self.client.delete("/v1/file/batch", {"ids": ids}, content_type="application/json")
+
+        self.assertEqual([item["status"] for item in response.json()["results"]], [204, 204])
+        self.s3_client.delete_objects.assert_not_called()
+        self.s3_client.delete_object.assert_called_once()
+        self.assertFalse(Blob.objects.exists())
@@ -0,0 +1,38 @@
+import datetime
+from django.test import TestCase, Client
+from image_upload.models import Image
+
+
+class ImageListingTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for day in (1, 1, 2, 3, 3):
+            image = Image.objects.create(file_name=f"{day}.png", url="https://bucket.s3.amazonaws.com/x")
+            # upload_date is auto_now_add, so spread the rows over several days afterwards
+            Image.objects.filter(id=image.id).update(upload_date=datetime.date(2025, 3, day))
+        self.ordered = [str(image_id) for image_id in
+                        Image.objects.order_by("upload_date", "id").values_list("id", flat=True)]
+
+    def test_pages_follow_keyset_order(self):
+        """Test that walking the cursors returns every image once in (upload_date, id) order."""
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            body = self.client.get("/v1/file", params).json()
+            seen.extend(item["id"] for item in body["items"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, self.ordered)
+
+    def test_date_range_filter(self):
+        body = self.client.get("/v1/file", {"from": "2025-03-02", "to": "2025-03-02"}).json()
+        self.assertEqual([item["upload_date"] for item in body["items"]], ["2025-03-02"])
+        self.assertIsNone(body["next_cursor"])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/v1/file", {"limit": 0}).status_code, 400)
+        self.assertEqual(self.client.get("/v1/file", {"from": "yesterday"}).status_code, 400)
+        self.assertEqual(self.client.get("/v1/file", {"cursor": "garbage"}).status_code, 400)
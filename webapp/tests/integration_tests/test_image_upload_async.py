@@ -0,0 +1,97 @@
+import json
+import uuid
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import TestCase, AsyncRequestFactory, RequestFactory
+from image_upload.models import Image
+from image_upload.views import handle_image, handle_image_async, upload_image, upload_image_async
+from healthz.views import healthz_async
+from webapp import metrics
+
+
+class AsyncImageViewsTest(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_upload_creates_record(self):
+        """Test that the async upload stores the file in S3 and creates a row."""
+        request = self.factory.post("/v1/file", {
+            "profilePic": SimpleUploadedFile("cat.png", b"png-bytes", content_type="image/png"),
+        })
+        response = await upload_image_async(request)
+        self.assertEqual(response.status_code, 201)
+        self.s3_client.put_object.assert_called_once()
+        self.assertTrue(await Image.objects.filter(file_name="cat.png").aexists())
+
+    async def test_upload_missing_file(self):
+        response = await upload_image_async(self.factory.post("/v1/file", {}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_upload_wrong_method(self):
+        response = await upload_image_async(self.factory.put("/v1/file"))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_get_and_delete(self):
+        image_id = uuid.uuid4()
+        await Image.objects.acreate(id=image_id, file_name="cat.png",
+                                    url=f"https://bucket.s3.amazonaws.com/{image_id}/cat.png")
+        with mock.patch('image_upload.views.BUCKET_NAME', 'bucket'):
+            response = await handle_image_async(self.factory.get(f"/v1/file/{image_id}"), str(image_id))
+            self.assertEqual(response.status_code, 200)
+
+            response = await handle_image_async(self.factory.delete(f"/v1/file/{image_id}"), str(image_id))
+            self.assertEqual(response.status_code, 204)
+        self.s3_client.delete_object.assert_called_once_with(Bucket='bucket', Key=f"{image_id}/cat.png")
+        self.assertFalse(await Image.objects.filter(id=image_id).aexists())
+
+    async def test_get_missing_and_invalid(self):
+        response = await handle_image_async(self.factory.get("/v1/file/x"), str(uuid.uuid4()))
+        self.assertEqual(response.status_code, 404)
+        response = await handle_image_async(self.factory.get("/v1/file/x"), "not-a-uuid")
+        self.assertEqual(response.status_code, 400)
+
+    async def test_healthz_async(self):
+        response = await healthz_async(self.factory.get("/healthz"))
+        self.assertEqual(response.status_code, 200)
+        response = await healthz_async(self.factory.post("/healthz"))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_healthz_async_db_failure(self):
+        for error in (OperationalError("gone away"), RuntimeError("boom")):
+            with mock.patch('healthz.views.HealthCheck.objects.acreate', side_effect=error):
+                response = await healthz_async(self.factory.get("/healthz"))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Cache-Control"], "no-cache, no-store, must-revalidate")
+
+
+class SyncAsyncMetricsTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('image_upload.views.s3_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(metrics.statsd_client.client, '_send')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_metrics(self, factory, upload, handle):
+        self.send.reset_mock()
+        response = upload(factory.post("/v1/file", {
+            "profilePic": SimpleUploadedFile("cat.png", b"png-bytes", content_type="image/png"),
+        }))
+        self.assertEqual(response.status_code, 201)
+        image_id = json.loads(response.content)["id"]
+        self.assertEqual(handle(factory.get(f"/v1/file/{image_id}"), image_id).status_code, 200)
+        self.assertEqual(handle(factory.delete(f"/v1/file/{image_id}"), image_id).status_code, 204)
+        return sorted(call.args[0].split(':')[0] for call in self.send.call_args_list)
+
+    def test_async_views_report_the_same_metrics(self):
+        sync_metrics = self.sent_metrics(RequestFactory(), upload_image, handle_image)
+        async_metrics = self.sent_metrics(AsyncRequestFactory(), async_to_sync(upload_image_async),
+                                          async_to_sync(handle_image_async))
+        self.assertIn('s3.upload_time', sync_metrics)
+        self.assertEqual(async_metrics, sync_metrics)
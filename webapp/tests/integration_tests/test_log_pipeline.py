@@ -0,0 +1,156 @@
+import json
+import logging
+import threading
+import time
+from unittest import mock
+import watchtower
+from django.test import SimpleTestCase
+from webapp import settings as app_settings
+from webapp.aws import LazyClient, clients
+from webapp.log_pipeline import (BatchingQueueHandler, DeferredHandler, JsonFormatter, SamplingFilter,
+                                 configure_logging, parse_sample_rates)
+
+
+def make_record(msg, level=logging.INFO):
+    return logging.LogRecord('webapp', level, __file__, 1, msg, None, None)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self, gate=None):
+        super().__init__()
+        self.lines = []
+        self.gate = gate
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.lines.append(self.format(record))
+
+
+class BuiltOnDemandHandler(CollectingHandler):
+    """Stands in for watchtower's handler, which calls CloudWatch in __init__."""
+    built = []
+    on_build = None
+
+    def __init__(self, fail=False, **kwargs):
+        BuiltOnDemandHandler.built.append(kwargs)
+        if BuiltOnDemandHandler.on_build is not None:
+            BuiltOnDemandHandler.on_build()
+        if fail:
+            raise OSError("Unable to locate credentials")
+        super().__init__()
+
+
+class LogPipelineTest(SimpleTestCase):
+    def test_formatter_serialises_dicts(self):
+        line = JsonFormatter().format(make_record({"message": "hi", "operation": "fetch_image"}))
+        payload = json.loads(line)
+        self.assertEqual(payload["operation"], "fetch_image")
+        self.assertIn("timestamp", payload)
+
+    def test_sampling_only_drops_info(self):
+        sampler = SamplingFilter({"fetch_image": 0.0})
+        self.assertFalse(sampler.filter(make_record({"operation": "fetch_image"})))
+        self.assertTrue(sampler.filter(make_record({"operation": "fetch_image"}, logging.ERROR)))
+        self.assertTrue(sampler.filter(make_record({"operation": "delete_image"})))
+
+    def test_parse_sample_rates(self):
+        self.assertEqual(parse_sample_rates("fetch_image=0.1, delete_image=2"),
+                         {"fetch_image": 0.1, "delete_image": 1.0})
+
+    def test_records_are_delivered_in_background(self):
+        target = CollectingHandler()
+        handler = BatchingQueueHandler([target])
+        for i in range(10):
+            handler.handle(make_record({"message": i}))
+        handler.stop()
+        self.assertEqual([json.loads(line)["message"] for line in target.lines], list(range(10)))
+
+    def test_slow_target_never_blocks_the_caller(self):
+        """Test that a stuck handler makes records drop instead of stalling emit()."""
+        release = threading.Event()
+        handler = BatchingQueueHandler([CollectingHandler(release)], maxsize=2)
+        self.addCleanup(handler.stop)
+        self.addCleanup(release.set)
+        start = time.monotonic()
+        for i in range(10):
+            handler.handle(make_record({"message": i}))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertGreater(handler.dropped, 0)
+
+    def test_deferred_handler_is_built_on_the_first_record(self):
+        BuiltOnDemandHandler.built = []
+        handler = DeferredHandler(f'{__name__}.BuiltOnDemandHandler', log_group_name='group')
+        handler.setFormatter(JsonFormatter())
+        self.assertEqual(BuiltOnDemandHandler.built, [])
+
+        handler.handle(make_record({"message": "first"}))
+        handler.handle(make_record({"message": "second"}))
+        self.assertEqual(BuiltOnDemandHandler.built, [{"log_group_name": "group"}])
+        self.assertEqual([json.loads(line)["message"] for line in handler.handler.lines], ["first", "second"])
+
+    def test_deferred_handler_retries_after_a_failed_build(self):
+        BuiltOnDemandHandler.built = []
+        handler = DeferredHandler(f'{__name__}.BuiltOnDemandHandler', retry_interval=60, fail=True)
+        with mock.patch.object(handler, 'handleError') as handle_error:
+            handler.handle(make_record({"message": "dropped"}))
+            handler.handle(make_record({"message": "dropped too"}))
+        self.assertEqual(len(BuiltOnDemandHandler.built), 1)
+        handle_error.assert_called_once()
+
+        handler.kwargs = {}
+        handler._failed_at -= 60
+        handler.handle(make_record({"message": "delivered"}))
+        self.assertEqual([json.loads(line)["message"] for line in handler.handler.lines], ["delivered"])
+
+    def test_records_logged_by_the_build_are_dropped(self):
+        BuiltOnDemandHandler.built = []
+        handler = DeferredHandler(f'{__name__}.BuiltOnDemandHandler')
+        BuiltOnDemandHandler.on_build = lambda: handler.handle(make_record({"message": "from botocore"}))
+        self.addCleanup(setattr, BuiltOnDemandHandler, 'on_build', None)
+
+        thread = threading.Thread(target=handler.handle, args=(make_record({"message": "first"}),), daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive(), "the build deadlocked on its own record")
+        self.assertEqual(len(BuiltOnDemandHandler.built), 1)
+        self.assertEqual([json.loads(line)["message"] for line in handler.handler.lines], ["first"])
+
+
+class ShippedLoggingConfigTest(SimpleTestCase):
+    """settings.LOGGING as deployed, with CloudWatch itself stubbed out."""
+
+    def setUp(self):
+        saved = [(logger, logger.handlers[:], logger.level, logger.propagate)
+                 for logger in (logging.getLogger(), logging.getLogger('webapp'), logging.getLogger('django'))]
+
+        def restore():
+            for logger, handlers, level, propagate in saved:
+                logger.handlers, logger.level, logger.propagate = handlers, level, propagate
+
+        self.addCleanup(restore)
+        clients.reset()
+        self.addCleanup(clients.reset)
+        # Only the client lookup of the log group check, and no PutLogEvents
+        for name, stub in (('_ensure_log_group', lambda handler: handler.cwl_client.meta),
+                           ('emit', lambda handler, record: None)):
+            patcher = mock.patch.object(watchtower.CloudWatchLogHandler, name, stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_first_aws_client_with_the_cloudwatch_handler(self):
+        configure_logging(app_settings.LOGGING)
+        queues = [handler for name in ('root', 'webapp') for handler in logging.getLogger(name).handlers]
+        self.assertTrue(queues and all(isinstance(handler, BatchingQueueHandler) for handler in queues))
+
+        thread = threading.Thread(target=lambda: LazyClient('s3').meta, daemon=True)
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive(), "first LazyClient access deadlocked")
+
+        logging.getLogger('webapp').info({"message": "hello"})
+        for handler in queues:
+            handler.stop()
+        deferred = next(target for target in queues[0].targets if isinstance(target, DeferredHandler))
+        self.assertIsInstance(deferred.handler, watchtower.CloudWatchLogHandler)
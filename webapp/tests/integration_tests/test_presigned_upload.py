@@ -0,0 +1,58 @@
+from unittest import mock
+from botocore.exceptions import ClientError
+from django.test import TestCase, Client
+from image_upload.models import Image
+
+
+class PresignedUploadTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        patcher = mock.patch('image_upload.views.s3_client')
+        self.s3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.s3_client.generate_presigned_post.return_value = {
+            "url": "https://bucket.s3.amazonaws.com/", "fields": {"key": "k"}}
+        self.s3_client.head_object.return_value = {
+            "ContentLength": 10, "Metadata": {"file_type": "image/png"}}
+
+    def presign(self, body='{"file_name": "cat.png", "content_type": "image/png"}'):
+        return self.client.post("/v1/file/presign", body, content_type="application/json")
+
+    def test_presign_and_confirm(self):
+        """Test that a confirmed presigned upload creates the Image row."""
+        presigned = self.presign()
+        self.assertEqual(presigned.status_code, 201)
+        image_id = presigned.json()["id"]
+        key = self.s3_client.generate_presigned_post.call_args.args[1]
+        self.assertEqual(key, f"{image_id}/cat.png")
+
+        confirmed = self.client.post("/v1/file/confirm", {"upload_token": presigned.json()["upload_token"]},
+                                     content_type="application/json")
+        self.assertEqual(confirmed.status_code, 201)
+        self.assertEqual(confirmed.json()["image_type"], "image/png")
+        self.assertTrue(Image.objects.filter(id=image_id).exists())
+
+        # Retrying confirm does not create a second row
+        retried = self.client.post("/v1/file/confirm", {"upload_token": presigned.json()["upload_token"]},
+                                   content_type="application/json")
+        self.assertEqual(retried.status_code, 200)
+        self.s3_client.head_object.assert_called_once()
+
+    def test_presign_requires_file_name(self):
+        self.assertEqual(self.presign('{}').status_code, 400)
+        self.assertEqual(self.presign('not json').status_code, 400)
+
+    def test_confirm_rejects_tampered_token(self):
+        response = self.client.post("/v1/file/confirm", {"upload_token": "forged"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_confirm_before_upload(self):
+        self.s3_client.head_object.side_effect = ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        token = self.presign().json()["upload_token"]
+        response = self.client.post("/v1/file/confirm", {"upload_token": token}, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Image.objects.exists())
+
+    def test_presign_wrong_method(self):
+        self.assertEqual(self.client.get("/v1/file/presign").status_code, 405)
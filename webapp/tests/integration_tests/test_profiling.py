@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.http import HttpResponse
+from django.test import SimpleTestCase, Client, RequestFactory, override_settings
+from webapp.profiling import (Profile, ProfileBuffer, RequestProfilingMiddleware, StackSampler, collapsed_stacks,
+                              profile_buffer)
+
+
+def slow_function():
+    time.sleep(0.05)
+
+
+def spin(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def sampled(profile, function):
+    return any(stack.endswith(f"{__name__}.{function}") for stack in profile.stacks)
+
+
+class StackSamplerTest(SimpleTestCase):
+    def test_samples_profiled_thread(self):
+        sampler = StackSampler(interval=0.001)
+        profile = Profile(threading.get_ident())
+        sampler.start(profile)
+        slow_function()
+        sampler.stop(profile)
+
+        self.assertTrue(profile.stacks)
+        self.assertTrue(sampled(profile, "slow_function"))
+
+    def test_profiles_sharing_a_thread(self):
+        sampler = StackSampler(interval=0.001)
+        first, second = Profile(threading.get_ident()), Profile(threading.get_ident())
+        sampler.start(first)
+        sampler.start(second)
+        slow_function()
+        sampler.stop(first)
+        samples = sum(first.stacks.values())
+        slow_function()
+        sampler.stop(second)
+
+        self.assertTrue(sampled(first, "slow_function"))
+        self.assertEqual(sum(first.stacks.values()), samples)
+        self.assertGreater(sum(second.stacks.values()), samples)
+
+    def test_ring_buffer_drops_oldest(self):
+        buffer = ProfileBuffer(size=2)
+        for route in ("a", "b", "c"):
+            profile = Profile(0)
+            profile.route = route
+            buffer.add(profile)
+        self.assertEqual([profile.route for profile in buffer.snapshot()], ["b", "c"])
+        self.assertEqual([profile.route for profile in buffer.snapshot("c")], ["c"])
+
+    def test_collapsed_stacks_aggregate_by_route(self):
+        first, second = Profile(0), Profile(0)
+        first.route = second.route = "get_image"
+        first.stacks, second.stacks = Counter({"views.a;views.b": 2}), Counter({"views.a;views.b": 3, "views.a": 1})
+        self.assertEqual(collapsed_stacks([first, second]), ["get_image;views.a;views.b 5", "get_image;views.a 1"])
+
+
+class ProfilingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        profile_buffer.clear()
+        self.addCleanup(profile_buffer.clear)
+
+    def test_disabled_by_default(self):
+        self.assertEqual(Client().get("/healthz/live", HTTP_X_PROFILE_TOKEN="secret").status_code, 200)
+        self.assertEqual(profile_buffer.snapshot(), [])
+
+    @override_settings(PROFILING_TOKEN="secret")
+    def test_token_header_profiles_request(self):
+        client = Client()
+        client.get("/healthz/live")
+        self.assertEqual(profile_buffer.snapshot(), [])
+
+        client.get("/healthz/live", HTTP_X_PROFILE_TOKEN="secret")
+        profile, = profile_buffer.snapshot()
+        self.assertEqual((profile.route, profile.method, profile.status), ("healthz_live", "GET", 200))
+        self.assertGreater(profile.duration_ms, 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sample_rate(self):
+        Client().get("/healthz/live")
+        self.assertEqual(len(profile_buffer.snapshot()), 1)
+
+    @override_settings(PROFILING_TOKEN="secret")
+    def test_report_requires_token(self):
+        profile = Profile(0)
+        profile.route, profile.duration_ms, profile.stacks = "upload_image", 12.5, Counter({"views.upload": 4})
+        profile_buffer.add(profile)
+        client = Client()
+
+        self.assertEqual(client.get("/debug/profiles").status_code, 404)
+        self.assertEqual(client.get("/debug/profiles", HTTP_X_PROFILE_TOKEN="wrong").status_code, 404)
+
+        response = client.get("/debug/profiles", {"route": "upload_image"}, HTTP_X_PROFILE_TOKEN="secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("upload_image;views.upload 4", response.content.decode())
+
+        summary = client.get("/debug/profiles", {"format": "json"}, HTTP_X_PROFILE_TOKEN="secret").json()
+        self.assertEqual(summary["routes"]["upload_image"]["samples"], 4)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_async_requests_are_profiled_separately(self):
+        async def get_response(request):
+            if request.method == 'GET':
+                # A sync view, on this request's thread
+                await sync_to_async(slow_function)()
+            else:
+                # Async code holding the event loop
+                spin(0.05)
+            return HttpResponse()
+
+        middleware = RequestProfilingMiddleware(get_response)
+
+        async def serve(request):
+            # What the ASGI handler does for every request
+            async with ThreadSensitiveContext():
+                return await middleware(request)
+
+        async def serve_both():
+            factory = RequestFactory()
+            await asyncio.gather(serve(factory.get("/")), serve(factory.post("/")))
+
+        asyncio.run(serve_both())
+        profiles = {profile.method: profile for profile in profile_buffer.snapshot()}
+        self.assertTrue(sampled(profiles['GET'], "slow_function"))
+        self.assertFalse(sampled(profiles['GET'], "spin"))
+        self.assertTrue(sampled(profiles['POST'], "spin"))
+        self.assertFalse(sampled(profiles['POST'], "slow_function"))
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from unittest import mock
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase, RequestFactory
+from healthz.models import HealthCheck
+from image_upload.models import Image
+from image_upload.views import read_image
+from webapp.breakers import database_breaker_for
+from webapp.db import router as replica_routing
+from webapp.db.router import PIN_COOKIE, ReplicaMonitor, ReplicaRouter, ReplicaRoutingMiddleware
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    # Not TestCase: its per-test transaction would keep every read on the primary
+    def setUp(self):
+        self.lag = 0.0
+        self.router = ReplicaRouter()
+        self.router.monitor = self.monitor(background=False)
+        # The replica connection is a stand-in; the lag comes from self.lag
+        real_connections = replica_routing.connections
+        self.replica_connection = mock.MagicMock()
+        fake_connections = mock.MagicMock()
+        fake_connections.__getitem__.side_effect = lambda alias: (
+            self.replica_connection if alias == 'replica_1' else real_connections[alias])
+        patcher = mock.patch('webapp.db.router.connections', fake_connections)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(database_breaker_for('replica_1').reset)
+
+    def monitor(self, background):
+        return ReplicaMonitor(['replica_1'], max_lag=5, interval=60, lag=lambda cursor: self.lag,
+                              background=background)
+
+    def read_only(self):
+        token = replica_routing._replica_reads.set(True)
+        self.addCleanup(replica_routing._replica_reads.reset, token)
+
+    def test_only_read_only_requests_use_replicas(self):
+        self.assertEqual(self.router.db_for_read(Image), 'default')
+        self.read_only()
+        self.assertEqual(self.router.db_for_read(Image), 'replica_1')
+        # Only the configured metadata models
+        self.assertEqual(self.router.db_for_read(HealthCheck), 'default')
+        self.assertEqual(self.router.db_for_write(Image), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'image_upload'))
+        self.assertTrue(self.router.allow_migrate('default', 'image_upload'))
+
+    def test_transactions_stay_on_the_primary(self):
+        self.read_only()
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Image), 'default')
+
+    def test_lagging_or_failing_replicas_are_skipped(self):
+        self.read_only()
+        self.lag = 30.0
+        self.assertEqual(self.router.db_for_read(Image), 'default')
+
+        # Rechecked once the interval has passed
+        self.lag = 1.0
+        self.assertEqual(self.router.db_for_read(Image), 'default')
+        self.router.monitor.checked_at['replica_1'] -= 61
+        self.assertEqual(self.router.db_for_read(Image), 'replica_1')
+
+        breaker = database_breaker_for('replica_1')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertEqual(self.router.db_for_read(Image), 'default')
+
+        breaker.reset()
+        self.lag = None
+        self.router.monitor.checked_at['replica_1'] -= 61
+        self.assertEqual(self.router.db_for_read(Image), 'default')
+
+    def test_event_loop_reads_use_the_background_checks(self):
+        self.router.monitor = monitor = self.monitor(background=True)
+        # Stops the monitor thread after its current sleep
+        self.addCleanup(setattr, monitor, '_pid', None)
+        self.read_only()
+
+        async def route():
+            return self.router.db_for_read(Image)
+
+        asyncio.run(route())
+        # The first call only starts the thread
+        deadline = time.monotonic() + 5
+        while monitor.checked_at['replica_1'] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(asyncio.run(route()), 'replica_1')
+        self.assertEqual(monitor.healthy, {'replica_1': True})
+
+    def test_check_on_the_event_loop_is_not_a_failure(self):
+        monitor = self.monitor(background=False)
+        monitor.check('replica_1')
+        self.assertEqual(monitor.healthy, {'replica_1': True})
+
+        # What Django raises for a database call made on the event loop
+        self.replica_connection.cursor.side_effect = SynchronousOnlyOperation
+        monitor.checked_at['replica_1'] -= 61
+
+        async def usable():
+            return monitor.usable()
+
+        self.assertEqual(asyncio.run(usable()), ['replica_1'])
+        self.assertEqual(monitor.healthy, {'replica_1': True})
+
+
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = mock.patch('webapp.db.router.replica_aliases', return_value=['replica_1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, request, writes=False):
+        seen = {}
+
+        def view(request):
+            seen['replica_reads'] = replica_routing._replica_reads.get()
+            if writes:
+                ReplicaRouter.db_for_write(None, Image)
+            return HttpResponse(status=201 if writes else 200)
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return response, seen['replica_reads']
+
+    def test_reads_and_pinning(self):
+        response, replica_reads = self.call(self.factory.get("/v1/file/x"))
+        self.assertTrue(replica_reads)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response, replica_reads = self.call(self.factory.post("/v1/file"), writes=True)
+        self.assertFalse(replica_reads)
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 10)
+
+        # The writer reads from the primary while pinned
+        request = self.factory.get("/v1/file/x")
+        request.COOKIES[PIN_COOKIE] = "1"
+        _, replica_reads = self.call(request)
+        self.assertFalse(replica_reads)
+        self.assertFalse(replica_routing._replica_reads.get())
+
+    def test_removed_without_replicas(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        with mock.patch('webapp.db.router.replica_aliases', return_value=[]):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+
+class ReadImageTest(SimpleTestCase):
+    def test_replica_miss_is_confirmed_on_the_primary(self):
+        queryset = mock.Mock()
+        replica, primary = mock.Mock(), mock.Mock()
+        replica.get.side_effect = Image.DoesNotExist
+        queryset.using.side_effect = lambda alias: primary if alias == 'default' else replica
+        with mock.patch('image_upload.views.router.db_for_read', return_value='replica_1'):
+            self.assertIs(read_image('id', queryset), primary.get.return_value)
+        primary.get.assert_called_once_with(id='id')
+
+        with mock.patch('image_upload.views.router.db_for_read', return_value='default'):
+            with self.assertRaises(Image.DoesNotExist):
+                read_image('id', mock.Mock(**{'using.return_value.get.side_effect': Image.DoesNotExist}))
@@ -0,0 +1,100 @@
+import json
+import uuid
+from io import StringIO
+from unittest import mock
+import boto3
+from django.core.management import call_command
+from django.test import TestCase
+from moto import mock_aws
+from image_upload.models import Blob, Image, PendingDeletion
+from image_upload.reconcile import merge
+
+
+class MergeTest(TestCase):
+    def test_merge_pairs_matching_keys(self):
+        objects = iter([(1, "o1"), (2, "o2"), (4, "o4")])
+        rows = iter([(2, "r2"), (3, "r3"), (4, "r4"), (5, "r5")])
+        self.assertEqual(list(merge(objects, rows)),
+                         [("o1", None), ("o2", "r2"), (None, "r3"), ("o4", "r4"), (None, "r5")])
+
+
+@mock_aws
+class ReconcileStorageCommandTest(TestCase):
+    bucket = "reconcile-bucket"
+
+    def setUp(self):
+        self.s3_client = boto3.client("s3", region_name="us-east-1")
+        self.s3_client.create_bucket(Bucket=self.bucket)
+        for target, value in (('image_upload.views.s3_client', self.s3_client),
+                              ('image_upload.views.BUCKET_NAME', self.bucket)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def put(self, key):
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=b"bytes")
+
+    def create_image(self, with_object=True, blob=None):
+        image_id = uuid.uuid4()
+        key = blob.key if blob else f"{image_id}/cat.png"
+        if with_object and not blob:
+            self.put(key)
+        return Image.objects.create(id=image_id, file_name="cat.png", blob=blob,
+                                    url=f"https://{self.bucket}.s3.amazonaws.com/{key}")
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('reconcile_storage', '--min-age', '0', '--page-size', '2', *args, stdout=out)
+        return json.loads(out.getvalue().strip().splitlines()[-1])
+
+    def keys(self):
+        return sorted(obj["Key"] for obj in self.s3_client.list_objects_v2(Bucket=self.bucket).get("Contents", []))
+
+    def test_report_finds_orphans_on_both_sides(self):
+        """Test that a pass over several pages reports each mismatch once."""
+        matched = [self.create_image() for _ in range(3)]
+        missing = self.create_image(with_object=False)
+        orphan = f"{uuid.uuid4()}/lost.png"
+        self.put(orphan)
+        self.put("not-an-image.txt")
+        blob = Blob.objects.create(digest="c" * 64, key="blobs/" + "c" * 64, size=5, ref_count=1)
+        self.put(blob.key)
+        self.create_image(blob=blob)
+        self.put("blobs/" + "d" * 64)
+
+        summary = self.run_command()
+
+        self.assertEqual(summary["matched"], len(matched) + 1)
+        self.assertEqual(summary["orphan_object"], 1)
+        self.assertEqual(summary["missing_object"], 1)
+        self.assertEqual(summary["orphan_blob"], 1)
+        self.assertEqual(summary["foreign"], 1)
+        # Report only: nothing changed
+        self.assertIn(orphan, self.keys())
+        self.assertTrue(Image.objects.filter(id=missing.id).exists())
+
+    def test_repair_deletes_orphans(self):
+        kept = self.create_image()
+        missing = self.create_image(with_object=False)
+        orphans = [f"{uuid.uuid4()}/lost.png" for _ in range(3)]
+        for key in orphans:
+            self.put(key)
+        queued = f"{uuid.uuid4()}/queued.png"
+        self.put(queued)
+        PendingDeletion.objects.create(key=queued)
+
+        summary = self.run_command('--repair', '--batch-size', '2')
+
+        self.assertEqual(summary["objects_deleted"], 3)
+        self.assertEqual(summary["rows_deleted"], 1)
+        self.assertEqual(self.keys(), sorted([f"{kept.id}/cat.png", queued]))
+        self.assertFalse(Image.objects.filter(id=missing.id).exists())
+        self.assertTrue(Image.objects.filter(id=kept.id).exists())
+
+    def test_recent_objects_are_skipped(self):
+        self.put(f"{uuid.uuid4()}/uploading.png")
+        out = StringIO()
+        call_command('reconcile_storage', '--repair', stdout=out)
+        summary = json.loads(out.getvalue().strip().splitlines()[-1])
+        self.assertEqual(summary["recent"], 1)
+        self.assertEqual(len(self.keys()), 1)
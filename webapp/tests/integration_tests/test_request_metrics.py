@@ -0,0 +1,48 @@
+import uuid
+from unittest import mock
+from django.test import TestCase, Client
+from image_upload.models import Image
+from image_upload.views import image_cache
+from webapp import metrics
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        image_cache.clear()
+        patcher = mock.patch.object(metrics.statsd_client.client, '_send')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_stats(self):
+        return [stat.split(':')[0] for call in self.send.call_args_list for stat in call.args[0].split('\n')]
+
+    def test_one_packet_per_request(self):
+        """Test that the view's own stats and the request stats go out in one flush."""
+        image_id = uuid.uuid4()
+        Image.objects.create(id=image_id, file_name="cat.png", url="https://bucket.s3.amazonaws.com/x")
+        response = self.client.get(f"/v1/file/{image_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.send.call_count, 1)
+        stats = self.sent_stats()
+        self.assertIn('database.query_time', stats)
+        self.assertIn('cache.image_metadata.miss', stats)
+        for stat in ('api.get_image.calls', 'api.get_image.duration', 'api.get_image.status.200'):
+            self.assertIn(stat, stats)
+
+    def test_route_and_status_names(self):
+        self.client.get("/healthz", {"bad": "payload"})
+        self.client.get("/no/such/route")
+        stats = self.sent_stats()
+        self.assertIn('api.healthz.status.400', stats)
+        self.assertIn('api.unmatched.status.404', stats)
+
+    def test_outside_a_request_sends_directly(self):
+        metrics.statsd_client.incr('background.event')
+        self.assertEqual(self.sent_stats(), ['background.event'])
+
+    async def test_async_request(self):
+        response = await self.async_client.get("/healthz/live")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.send.call_count, 1)
+        self.assertIn('api.healthz_live.status.200', self.sent_stats())
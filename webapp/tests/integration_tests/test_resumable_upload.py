@@ -0,0 +1,144 @@
+import io
+import json
+import uuid
+from datetime import timedelta
+from unittest import mock
+import boto3
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.utils import timezone
+from moto import mock_aws
+from image_upload.models import Image, UploadPart, UploadSession
+from image_upload.resumable import MIN_PART_SIZE
+
+
+@mock_aws
+class ResumableUploadTest(TestCase):
+    bucket = "resumable-bucket"
+
+    def setUp(self):
+        self.client = Client()
+        self.s3_client = boto3.client("s3", region_name="us-east-1")
+        self.s3_client.create_bucket(Bucket=self.bucket)
+        for target, value in (('image_upload.views.s3_client', self.s3_client),
+                              ('image_upload.views.BUCKET_NAME', self.bucket),
+                              ('image_upload.management.commands.expire_upload_sessions.s3_client', self.s3_client),
+                              ('image_upload.management.commands.expire_upload_sessions.BUCKET_NAME', self.bucket)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def open_session(self, file_name="big.png"):
+        response = self.client.post("/v1/file/uploads", json.dumps({"file_name": file_name,
+                                                                    "content_type": "image/png"}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_part(self, session_id, number, data, **headers):
+        return self.client.put(f"/v1/file/uploads/{session_id}/parts/{number}", data,
+                               content_type="application/octet-stream", **headers)
+
+    def test_upload_resume_and_complete(self):
+        session = self.open_session()
+        self.assertEqual(session["offset"], 0)
+        self.assertEqual(session["next_part"], 1)
+        first, second, last = b"a" * MIN_PART_SIZE, b"b" * MIN_PART_SIZE, b"tail"
+
+        self.assertEqual(self.put_part(session["id"], 1, first).status_code, 200)
+        # Part 3 arrives before part 2 (e.g. parallel uploads); the offset stops at the gap
+        self.assertEqual(self.put_part(session["id"], 3, last).status_code, 200)
+        status = self.client.get(f"/v1/file/uploads/{session['id']}").json()
+        self.assertEqual(status["offset"], MIN_PART_SIZE)
+        self.assertEqual(status["next_part"], 2)
+        self.assertEqual([part["number"] for part in status["parts"]], [1, 3])
+
+        response = self.client.post(f"/v1/file/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 409)
+
+        # Re-sending a part replaces it
+        self.assertEqual(self.put_part(session["id"], 2, b"x" * MIN_PART_SIZE).status_code, 200)
+        self.assertEqual(self.put_part(session["id"], 2, second).status_code, 200)
+        self.assertEqual(UploadPart.objects.filter(session_id=session["id"]).count(), 3)
+
+        response = self.client.post(f"/v1/file/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["id"], session["id"])
+        self.assertFalse(UploadSession.objects.exists())
+        body = self.s3_client.get_object(Bucket=self.bucket, Key=f"{session['id']}/big.png")["Body"].read()
+        self.assertEqual(body, first + second + last)
+        self.assertEqual(self.client.get(f"/v1/file/{session['id']}").status_code, 200)
+
+        # A retried complete returns the image instead of failing
+        response = self.client.post(f"/v1/file/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], session["id"])
+
+    def test_small_parts_are_rejected_on_complete(self):
+        session = self.open_session()
+        self.put_part(session["id"], 1, b"small")
+        self.put_part(session["id"], 2, b"tail")
+        response = self.client.post(f"/v1/file/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Image.objects.exists())
+
+    def test_part_limits(self):
+        session = self.open_session()
+        with self.settings(RESUMABLE_MAX_PART_SIZE=8):
+            self.assertEqual(self.put_part(session["id"], 1, b"123456789").status_code, 413)
+        with self.settings(RESUMABLE_UPLOAD_MAX_BYTES=10):
+            self.assertEqual(self.put_part(session["id"], 1, b"123456").status_code, 200)
+            self.assertEqual(self.put_part(session["id"], 2, b"123456").status_code, 413)
+            # Replacing part 1 does not count its old size twice
+            self.assertEqual(self.put_part(session["id"], 1, b"1234").status_code, 200)
+        self.assertEqual(self.put_part(session["id"], 0, b"x").status_code, 400)
+        self.assertEqual(self.put_part(session["id"], 10001, b"x").status_code, 400)
+        self.assertEqual(self.put_part(session["id"], 1, b"").status_code, 411)
+
+    def test_truncated_part_is_not_stored(self):
+        session = self.open_session()
+        request_body = io.BytesIO(b"short")
+        response = self.client.generic("PUT", f"/v1/file/uploads/{session['id']}/parts/1", b"",
+                                       content_type="application/octet-stream",
+                                       **{"CONTENT_LENGTH": "100", "wsgi.input": request_body})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadPart.objects.exists())
+
+    def test_content_md5_mismatch(self):
+        session = self.open_session()
+        response = self.put_part(session["id"], 1, b"data", HTTP_CONTENT_MD5="1B2M2Y8AsgTpgAmY7PhCfg==")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadPart.objects.exists())
+
+    def test_abort(self):
+        session = self.open_session()
+        self.put_part(session["id"], 1, b"data")
+        response = self.client.delete(f"/v1/file/uploads/{session['id']}")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.s3_client.list_multipart_uploads(Bucket=self.bucket).get("Uploads", []), [])
+        self.assertEqual(self.client.get(f"/v1/file/uploads/{session['id']}").status_code, 404)
+        self.assertEqual(self.put_part(session["id"], 1, b"data").status_code, 404)
+
+    def test_unknown_and_invalid_sessions(self):
+        self.assertEqual(self.client.get(f"/v1/file/uploads/{uuid.uuid4()}").status_code, 404)
+        self.assertEqual(self.client.get("/v1/file/uploads/not-a-uuid").status_code, 400)
+        self.assertEqual(self.client.post(f"/v1/file/uploads/{uuid.uuid4()}/complete").status_code, 404)
+        self.assertEqual(self.client.get("/v1/file/uploads").status_code, 405)
+        response = self.client.post("/v1/file/uploads", json.dumps({}), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_sessions_are_aborted(self):
+        expired = self.open_session("old.png")
+        active = self.open_session("new.png")
+        self.put_part(expired["id"], 1, b"data")
+        UploadSession.objects.filter(id=expired["id"]).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.put_part(expired["id"], 2, b"data").status_code, 404)
+        self.assertEqual(self.client.post(f"/v1/file/uploads/{expired['id']}/complete").status_code, 404)
+
+        call_command("expire_upload_sessions", stdout=io.StringIO())
+        self.assertEqual(list(UploadSession.objects.values_list("id", flat=True)), [uuid.UUID(active["id"])])
+        self.assertFalse(UploadPart.objects.exists())
+        uploads = self.s3_client.list_multipart_uploads(Bucket=self.bucket).get("Uploads", [])
+        self.assertEqual([upload["Key"] for upload in uploads], [f"{active['id']}/new.png"])
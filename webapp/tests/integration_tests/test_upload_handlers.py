@@ -0,0 +1,73 @@
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import TestCase, Client
+from image_upload.models import Image
+from image_upload.upload_handlers import S3StreamingUploadHandler, S3_MIN_PART_SIZE
+
+
+class S3StreamingUploadHandlerTest(TestCase):
+    def setUp(self):
+        self.s3_client = mock.Mock()
+        self.s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        self.s3_client.upload_part.side_effect = lambda **kw: {'ETag': f"etag-{kw['PartNumber']}"}
+        self.handler = S3StreamingUploadHandler(self.s3_client, 'bucket')
+
+    def feed(self, payload, chunk_size=64 * 1024):
+        with self.assertRaises(StopFutureHandlers):
+            self.handler.new_file('profilePic', 'cat.png', 'image/png', len(payload))
+        for start in range(0, len(payload), chunk_size):
+            self.assertIsNone(self.handler.receive_data_chunk(payload[start:start + chunk_size], start))
+
+    def test_small_file_uses_single_put(self):
+        self.feed(b"x" * 1024)
+        uploaded = self.handler.file_complete(1024)
+        self.s3_client.put_object.assert_called_once()
+        self.s3_client.create_multipart_upload.assert_not_called()
+        self.assertEqual(uploaded.key, f"{uploaded.image_id}/cat.png")
+        self.assertEqual(uploaded.size, 1024)
+
+    def test_large_file_streams_parts(self):
+        size = 2 * S3_MIN_PART_SIZE + 1024
+        self.feed(b"x" * size)
+        # Only the unsent tail is held in memory
+        self.assertLess(len(self.handler.buffer), S3_MIN_PART_SIZE)
+        self.handler.file_complete(size)
+        self.assertEqual(self.s3_client.upload_part.call_count, 3)
+        parts = self.s3_client.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        self.assertEqual([part['PartNumber'] for part in parts], [1, 2, 3])
+
+    def test_interrupted_upload_is_aborted(self):
+        self.feed(b"x" * (S3_MIN_PART_SIZE + 1))
+        self.handler.upload_interrupted()
+        self.s3_client.abort_multipart_upload.assert_called_once_with(
+            Bucket='bucket', Key=self.handler.key, UploadId='upload-1')
+
+    def test_other_fields_pass_through(self):
+        self.handler.new_file('avatar', 'cat.png', 'image/png', 3)
+        self.assertEqual(self.handler.receive_data_chunk(b"abc", 0), b"abc")
+        self.assertIsNone(self.handler.file_complete(3))
+
+
+class StreamingUploadViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_upload_streams_to_s3(self):
+        """Test that POST /v1/file sends the bytes to S3 without upload_fileobj."""
+        with mock.patch('image_upload.views.s3_client') as s3_client:
+            response = self.client.post("/v1/file", {
+                "profilePic": SimpleUploadedFile("cat.png", b"png-bytes", content_type="image/png"),
+            })
+        self.assertEqual(response.status_code, 201)
+        s3_client.put_object.assert_called_once()
+        s3_client.upload_fileobj.assert_not_called()
+        self.assertTrue(Image.objects.filter(id=response.json()["id"]).exists())
+
+    def test_upload_fallback_without_streaming(self):
+        with self.settings(S3_STREAMING_UPLOADS=False), mock.patch('image_upload.views.s3_client') as s3_client:
+            response = self.client.post("/v1/file", {
+                "profilePic": SimpleUploadedFile("cat.png", b"png-bytes", content_type="image/png"),
+            })
+        self.assertEqual(response.status_code, 201)
+        s3_client.upload_fileobj.assert_called_once()
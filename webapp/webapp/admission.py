@@ -0,0 +1,246 @@
+"""
+Admission control for expensive routes.
+
+``AdmissionControlMiddleware`` applies two kinds of limits, both configured in
+settings.py and keyed by route metric names (see ``webapp.metrics``):
+
+- ``ADMISSION_POOLS``: concurrency pools. At most ``concurrency`` requests to
+  the pool's routes run at once. Up to ``queue`` more wait, for at most
+  ``timeout`` seconds, and anything beyond that gets a 503 with
+  ``Retry-After``. A burst of large uploads therefore cannot occupy every
+  worker thread, and cheap GETs and health probes keep being served.
+- ``RATE_LIMITS``: per-client token buckets. Each client may make ``rate``
+  requests per second to the listed routes, with bursts of up to ``burst``.
+  Requests beyond that get a 429 with ``Retry-After``.
+
+Limits apply per worker process. Requests to other routes pass through
+untouched, and with no limit configured the middleware removes itself. Queue
+waits are reported as ``admission.<pool>.wait_time``, together with
+``admission.<pool>.active``, ``queued``, ``rejected`` and ``timeout``, and
+``ratelimit.<name>.limited``.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import resolve, Resolver404
+from webapp.fastjson import FastJsonResponse
+from webapp.metrics import ROUTE_METRIC_NAMES, statsd_client
+
+
+class Rejected(Exception):
+    """A request was not admitted; ``status`` and ``retry_after`` shape the response."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """At most ``concurrency`` holders, with a bounded queue of timed waiters."""
+
+    def __init__(self, name, concurrency, queue=0, timeout=5.0, statsd_client=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.statsd_client = statsd_client
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if need be. Raises ``Rejected`` (503)."""
+        start = time.monotonic()
+        with self._cond:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self._incr('rejected')
+                    raise Rejected(503, "queue_full", max(1, math.ceil(self.timeout)))
+                self.waiting += 1
+                self._gauge('queued', self.waiting)
+                deadline = start + self.timeout
+                try:
+                    while self.active >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._incr('timeout')
+                            raise Rejected(503, "queue_timeout", max(1, math.ceil(self.timeout)))
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    self._gauge('queued', self.waiting)
+            self.active += 1
+            self._gauge('active', self.active)
+        if self.statsd_client is not None:
+            self.statsd_client.timing(f'admission.{self.name}.wait_time', (time.monotonic() - start) * 1000)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._gauge('active', self.active)
+            self._cond.notify()
+
+    def _incr(self, stat):
+        if self.statsd_client is not None:
+            self.statsd_client.incr(f'admission.{self.name}.{stat}')
+
+    def _gauge(self, stat, value):
+        if self.statsd_client is not None:
+            self.statsd_client.gauge(f'admission.{self.name}.{stat}', value)
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets: ``rate`` tokens per second up to ``burst``. The
+    least recently seen clients are forgotten beyond ``max_clients``; a
+    forgotten client starts again with a full bucket.
+    """
+
+    def __init__(self, name, rate, burst, max_clients=10000, statsd_client=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.statsd_client = statsd_client
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Spend one token of ``client``'s bucket. Raises ``Rejected`` (429) when empty."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                if self.statsd_client is not None:
+                    self.statsd_client.incr(f'ratelimit.{self.name}.limited')
+                raise Rejected(429, "rate_limited", max(1, math.ceil((1 - tokens) / self.rate)))
+            self._buckets[client] = (tokens - 1, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+
+def build_limiters(pools, rate_limits):
+    """``(route -> ConcurrencyLimiter, route -> TokenBucketLimiter)`` from the settings."""
+    by_route, buckets_by_route = {}, {}
+    for name, pool in pools.items():
+        if pool.get('concurrency', 0) > 0:
+            limiter = ConcurrencyLimiter(name, pool['concurrency'], queue=pool.get('queue', 0),
+                                         timeout=pool.get('timeout', 5.0), statsd_client=statsd_client)
+            by_route.update((route, limiter) for route in pool['routes'])
+    for name, limit in rate_limits.items():
+        if limit.get('rate', 0) > 0:
+            limiter = TokenBucketLimiter(name, limit['rate'], limit.get('burst', 1),
+                                         max_clients=limit.get('max_clients', 10000), statsd_client=statsd_client)
+            buckets_by_route.update((route, limiter) for route in limit['routes'])
+    return by_route, buckets_by_route
+
+
+def client_key(request):
+    """
+    The client address. With RATE_LIMIT_CLIENT_HEADER set (e.g.
+    ``HTTP_X_FORWARDED_FOR`` behind the load balancer) its last entry is used:
+    that is the address the balancer itself saw, which clients cannot forge.
+    """
+    header = settings.RATE_LIMIT_CLIENT_HEADER
+    if header and request.META.get(header):
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rejected_response(rejected):
+    response = FastJsonResponse({
+        "error": "Too Many Requests" if rejected.status == 429 else "Server busy, please retry.",
+        "reason": rejected.reason
+    }, status=rejected.status)
+    response['Retry-After'] = str(rejected.retry_after)
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Admits requests to limited routes; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiters, self.buckets = build_limiters(settings.ADMISSION_POOLS, settings.RATE_LIMITS)
+        if not self.limiters and not self.buckets:
+            raise MiddlewareNotUsed
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        route = self.route(request)
+        limiter = self.limiters.get(route)
+        try:
+            self.take_token(route, request)
+            if limiter is not None:
+                limiter.acquire()
+        except Rejected as e:
+            return rejected_response(e)
+        if limiter is None:
+            return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release()
+
+    async def __acall__(self, request):
+        route = self.route(request)
+        limiter = self.limiters.get(route)
+        try:
+            self.take_token(route, request)
+            if limiter is not None:
+                await self.aacquire(limiter)
+        except Rejected as e:
+            return rejected_response(e)
+        if limiter is None:
+            return await self.get_response(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            limiter.release()
+
+    async def aacquire(self, limiter):
+        """
+        ``limiter.acquire()`` from the event loop. The wait blocks a thread, not the
+        loop; the queue bounds how many. That thread cannot be interrupted, so
+        when the request is cancelled (client gone, server timeout) while it
+        waits, a slot it still gets is handed back instead of leaking.
+        """
+        acquiring = asyncio.ensure_future(sync_to_async(limiter.acquire, thread_sensitive=False)())
+
+        def release_if_acquired(task):
+            if not task.cancelled() and task.exception() is None:
+                limiter.release()
+
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(release_if_acquired)
+            raise
+
+    def route(self, request):
+        """The route metric name, or None when nothing limits this request."""
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return ROUTE_METRIC_NAMES.get((match.url_name, request.method), match.url_name)
+
+    def take_token(self, route, request):
+        bucket = self.buckets.get(route)
+        if bucket is not None:
+            bucket.take(client_key(request))
@@ -0,0 +1,111 @@
+"""
+Shared, lazily built AWS clients.
+
+Every module asks this registry for its clients instead of calling
+``boto3.client`` at import time. A client is built on first use, once per
+process, from its own boto3 session and one botocore ``Config`` (connection pool
+size, keep-alive, timeouts, retries) taken from settings. S3 clients report to
+the S3 circuit breaker (webapp/breakers.py). The registry keys its cache on the
+process id: a worker forked from a parent that already built clients gets fresh
+ones instead of sharing the parent's pooled sockets.
+"""
+import os
+import threading
+
+
+def client_config():
+    """botocore Config for all app clients, built from the AWS_* settings."""
+    from botocore.config import Config
+    from django.conf import settings
+
+    return Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_READ_TIMEOUT,
+        tcp_keepalive=settings.AWS_TCP_KEEPALIVE,
+        retries={"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": "standard"},
+    )
+
+
+def instrument_client(service_name, client):
+    """Attach the service's circuit breaker (webapp/breakers.py), if it has one."""
+    from webapp.breakers import attach_breaker, breakers
+
+    breaker = breakers.get(service_name)
+    if breaker is not None:
+        attach_breaker(client, breaker)
+    return client
+
+
+class ClientRegistry:
+    """Per-process cache of boto3 clients, keyed by service name and region."""
+
+    def __init__(self, config_factory=client_config, instrument=instrument_client):
+        self.config_factory = config_factory
+        self.instrument = instrument
+        self._lock = threading.Lock()
+        self._pid = None
+        self._clients = {}
+
+    def get(self, service_name, region_name=None):
+        # region_name=None keeps boto3's own resolution (AWS_DEFAULT_REGION, ~/.aws/config)
+        key = (service_name, region_name)
+        pid = os.getpid()
+        if self._pid == pid and key in self._clients:
+            return self._clients[key]
+        with self._lock:
+            if self._pid != pid:
+                # Built in another process: drop everything
+                self._pid = pid
+                self._clients = {}
+            if key in self._clients:
+                return self._clients[key]
+        # Built without holding the lock: botocore logs while it builds sessions and
+        # clients, and a log handler may need a client itself (CloudWatch Logs).
+        # Sessions are not thread safe, so each build gets its own.
+        client = self._new_session().client(service_name, region_name=region_name,
+                                            config=self.config_factory())
+        if self.instrument:
+            client = self.instrument(service_name, client)
+        with self._lock:
+            if self._pid != pid:
+                return client
+            # Threads that raced here all use the client stored first
+            return self._clients.setdefault(key, client)
+
+    def reset(self):
+        with self._lock:
+            self._pid = None
+            self._clients = {}
+
+    def _new_session(self):
+        # boto3's default session is not thread safe; the registry owns its own
+        import boto3.session
+        return boto3.session.Session()
+
+
+class LazyClient:
+    """
+    Stand-in for a boto3 client that resolves the real one from the registry on
+    every attribute access, so it can be created at import time for free and
+    stays valid across a fork.
+    """
+
+    def __init__(self, service_name, region_name=None, registry=None):
+        self.service_name = service_name
+        self.region_name = region_name
+        self.registry = registry or clients
+
+    def __getattr__(self, name):
+        return getattr(self.registry.get(self.service_name, self.region_name), name)
+
+    def __repr__(self):
+        return f"<LazyClient {self.service_name} ({self.region_name or 'default region'})>"
+
+
+clients = ClientRegistry()
+
+
+def get_client(service_name, region_name=None):
+    """Return the shared client for ``service_name`` in this process."""
+    return clients.get(service_name, region_name)
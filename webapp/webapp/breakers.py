@@ -0,0 +1,278 @@
+"""
+Circuit breakers for MySQL and S3.
+
+Each dependency has one ``CircuitBreaker`` per worker process. Every call to
+the dependency reports its outcome: the shared S3 clients through botocore
+events (``attach_breaker``, wired up in ``webapp.aws``) and the database
+through its backend. Only the ``webapp.db.mysql`` backend does that: its
+``DatabaseWrapper`` mixes in ``CircuitBreakerDatabaseWrapperMixin``
+(``webapp.db.breaker``); with any other ENGINE the database breaker never
+opens. After CIRCUIT_BREAKER_FAILURES consecutive failures the breaker opens.
+While it is open, calls fail at once: S3 calls with ``ClientCircuitOpenError``
+(a ``CircuitOpenError`` that is also a ``BotoCoreError``) and, through the
+mixin's ``_before_call``, database calls with an ``OperationalError``, so the
+views' error handling covers both. Requests get a 503 with ``Retry-After`` in
+whole seconds. They no longer wait out connect and read timeouts on every
+worker.
+
+After CIRCUIT_BREAKER_RESET_TIMEOUT seconds the breaker lets a single trial
+call through (half-open). Success closes it and failure opens it again. The
+readiness monitor's checks go through the same clients, so they serve as
+trials even when there is no traffic. ``/healthz/ready`` reports unready
+while a breaker is open.
+
+``CircuitBreakerMiddleware`` turns away uploads (POST/PUT to the image API)
+before their body is read while a breaker is open. It also adds
+``Retry-After`` to any 503 sent in that time.
+"""
+import logging
+import math
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from botocore.exceptions import BotoCoreError
+from django.conf import settings
+from django.urls import resolve, Resolver404
+from webapp.fastjson import FastJsonResponse
+from webapp.metrics import statsd_client
+
+logger = logging.getLogger('webapp')
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+# Gauge values of breaker.<name>.state
+STATE_GAUGES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """A call was refused because the dependency's breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class ClientCircuitOpenError(BotoCoreError, CircuitOpenError):
+    """``CircuitOpenError`` raised by a boto3 client; handlers of S3 errors catch it too."""
+    fmt = '{name} is unavailable (circuit open), retry in {retry_after}s'
+
+    def __init__(self, name, retry_after):
+        super().__init__(name=name, retry_after=retry_after)
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker, safe to share between threads."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, enabled=True, statsd_client=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.enabled = enabled
+        self.statsd_client = statsd_client
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless the call may go ahead."""
+        if not self.enabled or self.state == CLOSED:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self._incr('rejected')
+                raise CircuitOpenError(self.name, self.retry_after())
+            # Let one trial through; the rest keep failing fast until its outcome is
+            # known, or until another reset_timeout if it never reports back
+            self.opened_at = time.monotonic()
+            self._transition(HALF_OPEN)
+
+    def record_success(self):
+        if not self.enabled or (self.state == CLOSED and not self.failures):
+            return
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self.opened_at = None
+                self._transition(CLOSED)
+
+    def record_failure(self, error=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._incr('opened')
+                self._transition(OPEN, error)
+
+    def is_open(self):
+        """True while calls are refused (open and the reset timeout has not passed)."""
+        return (self.enabled and self.state != CLOSED
+                and time.monotonic() - (self.opened_at or 0) < self.reset_timeout)
+
+    def retry_after(self):
+        """Whole seconds until the breaker lets a trial call through (at least 1)."""
+        if self.opened_at is None:
+            return 1
+        return max(1, math.ceil(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.state = CLOSED
+
+    def _transition(self, state, error=None):
+        self.state = state
+        if self.statsd_client is not None:
+            self.statsd_client.gauge(f'breaker.{self.name}.state', STATE_GAUGES[state])
+        log = logger.error if state == OPEN else logger.info
+        log({
+            "level": "ERROR" if state == OPEN else "INFO",
+            "message": f"Circuit breaker {self.name} is {state}",
+            "error": str(error) if error is not None else None,
+            "failures": self.failures,
+            "operation": "circuit_breaker"
+        })
+
+    def _incr(self, stat):
+        if self.statsd_client is not None:
+            self.statsd_client.incr(f'breaker.{self.name}.{stat}')
+
+
+def _breaker(name):
+    return CircuitBreaker(name, failure_threshold=settings.CIRCUIT_BREAKER_FAILURES,
+                          reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+                          enabled=settings.CIRCUIT_BREAKERS, statsd_client=statsd_client)
+
+
+database_breaker = _breaker('database')
+s3_breaker = _breaker('s3')
+# Keyed like the healthz dependency checks and the boto3 service names
+breakers = {'database': database_breaker, 's3': s3_breaker}
+# Read replicas get their own breakers: a failing replica only loses its reads
+_replica_breakers = {}
+_replica_breakers_lock = threading.Lock()
+
+
+def database_breaker_for(alias):
+    """The breaker of a database alias: ``database`` for the primary, one per replica."""
+    if alias == 'default':
+        return database_breaker
+    with _replica_breakers_lock:
+        if alias not in _replica_breakers:
+            _replica_breakers[alias] = _breaker(f'database_{alias}')
+        return _replica_breakers[alias]
+
+
+def open_breakers():
+    """The breakers currently refusing calls."""
+    return [breaker for breaker in breakers.values() if breaker.is_open()]
+
+
+def attach_breaker(client, breaker):
+    """
+    Report every API call of a boto3 client to ``breaker`` and refuse calls while
+    it is open. Retries happen inside the call, so each outcome is final.
+    """
+    def before_call(**kwargs):
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise ClientCircuitOpenError(e.name, e.retry_after) from None
+
+    def after_call(http_response, **kwargs):
+        # 4xx (NoSuchKey, 412, ...) means S3 answered; only 5xx counts against it
+        if http_response.status_code >= 500:
+            breaker.record_failure(f"HTTP {http_response.status_code}")
+        else:
+            breaker.record_success()
+
+    def after_call_error(exception, **kwargs):
+        # Connect/read timeouts and connection errors, after retries
+        breaker.record_failure(exception)
+
+    events = client.meta.events
+    events.register('before-call', before_call)
+    events.register('after-call', after_call)
+    events.register('after-call-error', after_call_error)
+    return client
+
+
+def unavailable_response(open_now):
+    """503 for the given open breakers, with ``Retry-After`` for the soonest trial."""
+    return _unavailable(sorted(breaker.name for breaker in open_now),
+                        min(breaker.retry_after() for breaker in open_now))
+
+
+def circuit_open_response(error):
+    """503 for a call refused with ``CircuitOpenError``."""
+    return _unavailable([error.name], error.retry_after)
+
+
+def _unavailable(names, retry_after):
+    response = FastJsonResponse({
+        "error": "Service temporarily unavailable.",
+        "unavailable": names
+    }, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class CircuitBreakerMiddleware:
+    """
+    Sheds uploads up front while MySQL or S3 is known to be down, and adds
+    ``Retry-After`` to 503s sent while any breaker is open.
+    """
+    sync_capable = True
+    async_capable = True
+    # Requests that send an image body need both S3 and the database
+    SHED_METHODS = ('POST', 'PUT')
+    SHED_APPS = ('image_upload',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        shed = self.shed(request)
+        if shed is not None:
+            return shed
+        return self.add_retry_after(self.get_response(request))
+
+    async def __acall__(self, request):
+        shed = self.shed(request)
+        if shed is not None:
+            return shed
+        return self.add_retry_after(await self.get_response(request))
+
+    def shed(self, request):
+        if request.method not in self.SHED_METHODS:
+            return None
+        open_now = open_breakers()
+        if not open_now:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.func.__module__.split('.')[0] not in self.SHED_APPS:
+            return None
+        statsd_client.incr('breaker.shed')
+        return unavailable_response(open_now)
+
+    def add_retry_after(self, response):
+        if response.status_code == 503 and not response.has_header('Retry-After'):
+            open_now = open_breakers()
+            if open_now:
+                response['Retry-After'] = str(min(breaker.retry_after() for breaker in open_now))
+        return response
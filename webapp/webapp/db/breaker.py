@@ -0,0 +1,56 @@
+"""
+Database backend side of the ``database`` circuit breaker (see webapp/breakers.py).
+
+Mixing ``CircuitBreakerDatabaseWrapperMixin`` into a backend's
+``DatabaseWrapper`` reports every connect and query to the breaker and, while
+it is open, fails them at once with the backend's ``OperationalError``. The
+views already answer that error with a 503. The primary reports to the
+``database`` breaker and each read replica to its own.
+"""
+from django.db import utils
+from webapp.breakers import CircuitOpenError, database_breaker_for
+
+
+class CircuitBreakerDatabaseWrapperMixin:
+    """Mix in before a backend's ``DatabaseWrapper`` (and before the pool mixin)."""
+
+    # Errors that say nothing about the server's health
+    healthy_errors = (utils.IntegrityError, utils.ProgrammingError, utils.DataError, utils.NotSupportedError)
+
+    @property
+    def breaker(self):
+        return database_breaker_for(self.alias)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Stays first in the list: execute_wrapper() appends and pops after it
+        self.execute_wrappers.append(self._breaker_wrapper)
+
+    def ensure_connection(self):
+        if self.connection is not None:
+            return super().ensure_connection()
+        self._before_call()
+        try:
+            super().ensure_connection()
+        except utils.DatabaseError as e:
+            self.breaker.record_failure(e)
+            raise
+
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            raise utils.OperationalError(str(e)) from e
+
+    def _breaker_wrapper(self, execute, sql, params, many, context):
+        self._before_call()
+        try:
+            result = execute(sql, params, many, context)
+        except self.healthy_errors:
+            self.breaker.record_success()
+            raise
+        except utils.DatabaseError as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        return result
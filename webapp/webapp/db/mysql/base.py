@@ -0,0 +1,19 @@
+"""
+MySQL backend with a per-process connection pool (see webapp/db/pool.py) and
+the ``database`` circuit breaker (see webapp/db/breaker.py).
+
+Use ``'ENGINE': 'webapp.db.mysql'`` together with a ``POOL`` entry.
+"""
+from django.db.backends.mysql import base
+from webapp.db.breaker import CircuitBreakerDatabaseWrapperMixin
+from webapp.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(CircuitBreakerDatabaseWrapperMixin, PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def raw_is_usable(self, raw):
+        # COM_PING: one round trip, no statement parsing
+        try:
+            raw.ping()
+        except self.Database.Error:
+            return False
+        return True
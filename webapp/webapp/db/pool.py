@@ -0,0 +1,220 @@
+"""
+Process-wide database connection pool for Django backends.
+
+Django keeps one connection per thread and, with ``CONN_MAX_AGE=0``, closes it
+at the end of every request. Mixing ``PooledDatabaseWrapperMixin`` into a
+backend's ``DatabaseWrapper`` turns that close into a check-in: the raw
+connection goes back to a bounded per-process pool and the next request on any
+thread checks it out again, paying a health check instead of TCP + auth.
+
+Configured per database with a ``POOL`` entry in ``settings.DATABASES``::
+
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_LIFETIME': 3600}
+
+``MAX_SIZE`` bounds the open connections of one worker process (0 disables
+pooling), ``TIMEOUT`` is how long a request waits for a free connection before
+failing with ``OperationalError`` and ``MAX_LIFETIME`` retires connections
+after that many seconds.
+"""
+import os
+import threading
+import time
+from collections import deque
+from webapp import metrics
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Connections inherited over fork; referenced so that garbage collection does not
+# close sessions the parent process is still using.
+_inherited = []
+
+
+class ConnectionPool:
+    def __init__(self, name, max_size=10, timeout=5.0, max_lifetime=3600.0, statsd_client=None):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.statsd_client = statsd_client
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+
+    def acquire(self, connect, is_usable):
+        """
+        Return ``(raw_connection, created_at)``: an idle connection that passes
+        ``is_usable``, or a new one from ``connect()`` if the pool has room.
+        Raises ``TimeoutError`` if none frees up within ``timeout``.
+        """
+        self._check_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            with self._cond:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                elif self._open < self.max_size:
+                    self._open += 1
+                    raw = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._incr('exhausted')
+                        raise TimeoutError(f"No free connection in pool {self.name!r} "
+                                           f"after {self.timeout}s (max_size={self.max_size})")
+                    self._cond.wait(remaining)
+                    continue
+
+            waited_ms = (time.monotonic() - start) * 1000
+            if raw is None:
+                raw = self._connect(connect)
+                self._timing('wait_time', waited_ms)
+                self._gauges()
+                return raw, time.monotonic()
+            if not self._expired(created_at) and is_usable(raw):
+                self._incr('reused')
+                self._timing('wait_time', waited_ms)
+                self._gauges()
+                return raw, created_at
+            self.discard(raw)
+
+    def release(self, raw, created_at):
+        """Put a connection back for reuse, or close it if it is too old."""
+        if self._pid != os.getpid() or self._expired(created_at):
+            self.discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, created_at))
+            self._cond.notify()
+        self._gauges()
+
+    def discard(self, raw):
+        """Close a connection checked out of this pool and free its slot."""
+        if self._pid != os.getpid():
+            return
+        try:
+            raw.close()
+        except Exception:
+            pass
+        finally:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            self._incr('discarded')
+            self._gauges()
+
+    def stats(self):
+        with self._cond:
+            return {"open": self._open, "idle": len(self._idle), "max_size": self.max_size}
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self.discard(raw)
+
+    def _connect(self, connect):
+        start = time.monotonic()
+        try:
+            raw = connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        self._timing('connect_time', (time.monotonic() - start) * 1000)
+        self._incr('created')
+        return raw
+
+    def _expired(self, created_at):
+        return self.max_lifetime is not None and time.monotonic() - created_at >= self.max_lifetime
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        # A forked worker must not talk over (or close) the parent's sockets: leave
+        # the inherited connections untouched and start an empty pool.
+        _inherited.extend(raw for raw, _ in self._idle)
+        self._reset()
+
+    def _incr(self, stat):
+        if self.statsd_client is not None:
+            self.statsd_client.incr(f'database.pool.{stat}')
+
+    def _timing(self, stat, value):
+        if self.statsd_client is not None:
+            self.statsd_client.timing(f'database.pool.{stat}', value)
+
+    def _gauges(self):
+        if self.statsd_client is not None:
+            stats = self.stats()
+            self.statsd_client.gauge('database.pool.open', stats["open"])
+            self.statsd_client.gauge('database.pool.idle', stats["idle"])
+
+
+def get_pool(settings_dict, alias):
+    """Return the pool for these connection settings, or None if pooling is off."""
+    options = settings_dict.get('POOL') or {}
+    if not options.get('MAX_SIZE'):
+        return None
+    # Keyed on the target too: the test runner renames NAME on the same alias
+    key = (alias, settings_dict.get('HOST'), settings_dict.get('PORT'),
+           settings_dict.get('NAME'), settings_dict.get('USER'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                max_size=options['MAX_SIZE'],
+                timeout=options.get('TIMEOUT', 5.0),
+                max_lifetime=options.get('MAX_LIFETIME', 3600.0),
+                statsd_client=metrics.statsd_client,
+            )
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Mix in before a backend's ``DatabaseWrapper`` to route connections through the pool."""
+
+    pool = None
+    pool_created_at = None
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.settings_dict, self.alias)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            raw, self.pool_created_at = pool.acquire(
+                lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                self.raw_is_usable)
+        except TimeoutError as e:
+            raise self.Database.OperationalError(str(e)) from e
+        self.pool = pool
+        return raw
+
+    def raw_is_usable(self, raw):
+        """Health check run on a pooled connection before it is handed out again."""
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool, self.pool = self.pool, None
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Only a connection back at its idle state (autocommit, no transaction, no
+        # unhandled errors) is safe to hand to another request
+        if self.in_atomic_block or self.errors_occurred or self.autocommit != self.settings_dict['AUTOCOMMIT']:
+            pool.discard(self.connection)
+        else:
+            pool.release(self.connection, self.pool_created_at)
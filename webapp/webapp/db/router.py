@@ -0,0 +1,235 @@
+"""
+Read-replica routing for image metadata.
+
+With DB_REPLICA_HOSTS set, settings.py adds one ``replica_<n>`` alias per host
+beside ``default`` and installs ``ReplicaRouter``. The router sends reads of
+the REPLICA_READ_MODELS (image metadata) to a healthy replica, but only while
+``ReplicaRoutingMiddleware`` marks the request as read-only (GET/HEAD) and the
+client is not pinned. Everything else uses the primary: writes, reads in
+write requests (so a DELETE never acts on a stale row), reads inside
+transactions, management commands and background threads.
+
+Read-your-writes: a request that writes sets a short-lived pin cookie
+(REPLICA_PIN_SECONDS), and that client's reads stay on the primary while the
+cookie lasts. Other clients can still hit a replica that lags behind, so the
+views confirm a replica miss on the primary (``read_image``) rather than
+answer, and cache, a 404 for an image that was just uploaded.
+
+``ReplicaMonitor`` measures each replica's lag (``SHOW REPLICA STATUS``) on a
+background thread every REPLICA_CHECK_INTERVAL seconds; routing a read only
+looks at the last result, so it never makes a database call itself and is safe
+on the event loop (``aread_image``). A replica that lags more than
+REPLICA_MAX_LAG seconds, cannot be reached or has an open circuit breaker gets
+no reads. With no usable replica the reads go to the primary.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from webapp.breakers import database_breaker_for
+from webapp.metrics import statsd_client
+
+logger = logging.getLogger('webapp')
+
+PIN_COOKIE = 'db_primary_pin'
+
+# True while serving a read-only request of a client that is not pinned
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set once the current request writes to the primary
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def replica_lag(cursor):
+    """Seconds the replica is behind its source, 0 if it is not a replica, None if replication is broken."""
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except Exception:
+        # MySQL before 8.0.22
+        cursor.execute("SHOW SLAVE STATUS")
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    columns = [column[0] for column in cursor.description]
+    status = dict(zip(columns, row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class ReplicaMonitor:
+    """
+    Per-process replica health. A daemon thread (started lazily, and again
+    after a worker fork) checks every replica once per ``interval``; callers
+    only read the result. Without the background thread a stale entry is
+    refreshed by the first caller that sees it while the others keep using the
+    last result. A replica that has not been checked yet counts as unusable.
+    """
+
+    def __init__(self, aliases, max_lag=5.0, interval=5.0, lag=replica_lag, background=True):
+        self.aliases = aliases
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = lag
+        self.background = background
+        self.healthy = {alias: False for alias in aliases}
+        self.checked_at = {alias: None for alias in aliases}
+        self._locks = {alias: threading.Lock() for alias in aliases}
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def usable(self):
+        """Replicas that may serve reads right now."""
+        if self.background:
+            self._ensure_thread()
+        else:
+            now = time.monotonic()
+            for alias in self.aliases:
+                checked_at = self.checked_at[alias]
+                if checked_at is None or now - checked_at > self.interval:
+                    self.refresh(alias, blocking=False)
+        return [alias for alias in self.aliases
+                if self.healthy[alias] and not database_breaker_for(alias).is_open()]
+
+    def refresh(self, alias, blocking=True):
+        if self._locks[alias].acquire(blocking=blocking):
+            try:
+                self.check(alias)
+            finally:
+                self._locks[alias].release()
+
+    def check(self, alias):
+        lag, error = None, None
+        try:
+            with connections[alias].cursor() as cursor:
+                lag = self.lag(cursor)
+        except SynchronousOnlyOperation:
+            # Called on the event loop: the replica is fine, it just cannot be checked from here
+            return
+        except Exception as e:
+            error = e
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != self.healthy[alias]:
+            log = logger.info if healthy else logger.warning
+            log({
+                "level": "INFO" if healthy else "WARNING",
+                "message": f"Replica {alias} {'serves reads' if healthy else 'skipped, reads go to the primary'}",
+                "replica_lag_s": lag,
+                "error": str(error) if error is not None else None,
+                "operation": "replica_check"
+            })
+        self.healthy[alias] = healthy
+        self.checked_at[alias] = time.monotonic()
+        if lag is not None:
+            statsd_client.gauge(f'database.replica.{alias}.lag', lag)
+        statsd_client.gauge(f'database.replica.{alias}.healthy', int(healthy))
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            # A forked worker inherits the flag but not the thread, so start a new one
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            try:
+                for alias in self.aliases:
+                    self.refresh(alias)
+            finally:
+                # This thread holds its own replica connections; drop broken or old ones
+                close_old_connections()
+            time.sleep(self.interval)
+
+
+class ReplicaRouter:
+    """Database router; see the module docstring."""
+
+    def __init__(self):
+        self.read_models = {label.lower() for label in settings.REPLICA_READ_MODELS}
+        self.monitor = ReplicaMonitor(replica_aliases(), max_lag=settings.REPLICA_MAX_LAG,
+                                      interval=settings.REPLICA_CHECK_INTERVAL)
+
+    def db_for_read(self, model, **hints):
+        if (not self.monitor.aliases or not _replica_reads.get()
+                or model._meta.label_lower not in self.read_models):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads that belong to a transaction must see its writes
+            return DEFAULT_DB_ALIAS
+        usable = self.monitor.usable()
+        if not usable:
+            statsd_client.incr('database.replica.fallback')
+            return DEFAULT_DB_ALIAS
+        return random.choice(usable)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return not db.startswith('replica_')
+
+
+class ReplicaRoutingMiddleware:
+    """Allows replica reads for GET/HEAD requests of unpinned clients, and pins clients that write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tokens = self.begin(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            self.end(tokens)
+
+    async def __acall__(self, request):
+        tokens = self.begin(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            self.end(tokens)
+
+    def begin(self, request):
+        read_only = request.method in ('GET', 'HEAD') and PIN_COOKIE not in request.COOKIES
+        return _replica_reads.set(read_only), _wrote.set(False)
+
+    def finish(self, response):
+        if _wrote.get() and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def end(self, tokens):
+        replica_reads_token, wrote_token = tokens
+        _replica_reads.reset(replica_reads_token)
+        _wrote.reset(wrote_token)
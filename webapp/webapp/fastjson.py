@@ -0,0 +1,85 @@
+"""
+JSON serialisation for API responses and log records.
+
+``settings.JSON_BACKEND`` picks the encoder: ``orjson`` (several times faster
+than the stdlib on the small documents this API returns), ``stdlib``, or
+``auto`` (default) for orjson when it is installed and the stdlib otherwise.
+Both backends emit compact separators and the same bytes for the same
+document: UUIDs as strings, and dates, times and datetimes in
+``DjangoJSONEncoder``'s format (milliseconds, ``Z`` for UTC), which orjson
+would otherwise write with microseconds and ``+00:00``. Anything else falls
+back to ``str()``.
+
+    dumps(obj)            -> bytes, the response body
+    dumps_str(obj)        -> str, a log line
+    loads(data)           -> object, from bytes or str
+    FastJsonResponse      -> drop-in JsonResponse using dumps()
+"""
+import json
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+
+class _StdlibEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder (UUID, date, datetime, Decimal, ...) that stringifies the rest."""
+
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+def _resolve_backend(name):
+    if name == 'auto':
+        return 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson' and orjson is None:
+        raise ImproperlyConfigured("JSON_BACKEND is 'orjson' but orjson is not installed.")
+    if name not in ('orjson', 'stdlib'):
+        raise ImproperlyConfigured(f"Unknown JSON_BACKEND {name!r}; use auto, orjson or stdlib.")
+    return name
+
+
+backend = _resolve_backend(settings.JSON_BACKEND)
+
+if backend == 'orjson':
+    # Dates and times go through the stdlib encoder's default() so both backends format them alike
+    _default = _StdlibEncoder().default
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj, sort_keys=False):
+        option = _OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def dumps_str(obj):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+    loads = orjson.loads
+else:
+    _encoder = _StdlibEncoder(separators=(',', ':'))
+    _sorted_encoder = _StdlibEncoder(separators=(',', ':'), sort_keys=True)
+
+    def dumps(obj, sort_keys=False):
+        return (_sorted_encoder if sort_keys else _encoder).encode(obj).encode()
+
+    def dumps_str(obj):
+        return _encoder.encode(obj)
+
+    loads = json.loads
+
+
+class FastJsonResponse(HttpResponse):
+    """``JsonResponse`` with the configured backend; same ``safe`` rule for non-dict data."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,226 @@
+"""
+Non-blocking structured logging for the ``webapp`` logger.
+
+Views log plain dicts. On the request path a record is only sampled and put on a
+bounded queue; a background thread drains the queue in batches, serialises each
+record to JSON and hands it to the real handlers (watchtower, console). A slow
+CloudWatch therefore never stalls a request: when the queue is full the record
+is dropped and counted instead.
+
+Wired in through ``settings.LOGGING_CONFIG``.
+"""
+import atexit
+import logging
+import logging.config
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from django.utils.module_loading import import_string
+from webapp import fastjson
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """Serialise dict messages to one JSON line (JSON_BACKEND), adding the timestamp of the record."""
+
+    def format(self, record):
+        if not isinstance(record.msg, dict):
+            return super().format(record)
+        payload = dict(record.msg)
+        payload.setdefault("timestamp", datetime.fromtimestamp(record.created, timezone.utc)
+                           .replace(tzinfo=None).isoformat())
+        message = fastjson.dumps_str(payload)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        return message
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO/DEBUG records per ``operation``. Warnings and
+    errors always pass. ``rates`` maps operation name to a keep ratio in [0, 1].
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not isinstance(record.msg, dict):
+            return True
+        rate = self.rates.get(record.msg.get("operation"))
+        if rate is None:
+            return True
+        if random.random() >= rate:
+            return False
+        record.msg["sample_rate"] = rate
+        return True
+
+
+class BatchingQueueHandler(logging.Handler):
+    """
+    Put records on a bounded queue that a background thread drains in batches
+    into ``targets``. The thread is started lazily and again after a worker fork.
+    """
+
+    def __init__(self, targets, maxsize=10000, batch_size=100):
+        super().__init__()
+        self.targets = list(targets)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def emit(self, record):
+        self._ensure_thread()
+        if record.exc_info:
+            # Render the traceback now so the queued record does not keep the frames alive
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stop()
+        super().close()
+
+    def stop(self, timeout=5.0):
+        """Flush what is queued and stop the background thread."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='log-pipeline', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is _STOP:
+                    return
+                for target in self.targets:
+                    if record.levelno >= target.level:
+                        target.handle(record)
+
+
+class DeferredHandler(logging.Handler):
+    """
+    Builds ``handler_class(**kwargs)`` when it handles its first record instead
+    of at logging-config time. watchtower's handler creates its log group (a
+    CloudWatch call that needs credentials) in ``__init__``, so booting a worker
+    no longer makes that call and a CloudWatch outage no longer stops the app
+    from starting. The build runs on whichever thread handles that record: the
+    log pipeline's thread for the loggers behind a ``BatchingQueueHandler``
+    (LOG_QUEUE_LOGGERS), the logging thread otherwise. Records the build logs
+    itself (botocore, on the same thread) are dropped. If building fails,
+    records are dropped and the next attempt waits ``retry_interval`` seconds.
+    """
+
+    def __init__(self, handler_class, retry_interval=60.0, **kwargs):
+        super().__init__()
+        self.handler_class = handler_class
+        self.retry_interval = retry_interval
+        self.kwargs = kwargs
+        self.handler = None
+        self._failed_at = None
+        self._building = False
+        self._build_lock = threading.RLock()
+
+    def emit(self, record):
+        handler = self.handler or self._build(record)
+        if handler is not None:
+            handler.handle(record)
+
+    def flush(self):
+        if self.handler is not None:
+            self.handler.flush()
+
+    def close(self):
+        if self.handler is not None:
+            self.handler.close()
+        super().close()
+
+    def _build(self, record):
+        with self._build_lock:
+            if self.handler is not None:
+                return self.handler
+            if self._building:
+                # Logged by the build itself; the handler does not exist yet
+                return None
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return None
+            self._building = True
+            try:
+                handler_class = import_string(self.handler_class)
+                handler = handler_class(**self.kwargs)
+            except Exception:
+                self._failed_at = time.monotonic()
+                self.handleError(record)
+                return None
+            finally:
+                self._building = False
+            # Level and filters stay on this handler; the formatter moves to the real one
+            if self.formatter is not None:
+                handler.setFormatter(self.formatter)
+            self.handler = handler
+            return handler
+
+
+def install_queue(logger, maxsize, batch_size, sample_rates):
+    """Move the handlers of ``logger`` behind a BatchingQueueHandler."""
+    if not logger.handlers:
+        return None
+    queue_handler = BatchingQueueHandler(logger.handlers, maxsize=maxsize, batch_size=batch_size)
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+    logger.handlers = [queue_handler]
+    atexit.register(queue_handler.stop)
+    return queue_handler
+
+
+def parse_sample_rates(value):
+    """Parse ``"fetch_image=0.1,delete_image=0.5"`` into ``{"fetch_image": 0.1, ...}``."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        operation, _, rate = item.partition('=')
+        rates[operation.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def configure_logging(logging_settings):
+    """LOGGING_CONFIG entry point: apply LOGGING, then queue the app loggers."""
+    from django.conf import settings
+
+    logging.config.dictConfig(logging_settings)
+    if not settings.LOG_ASYNC:
+        return
+    for name in settings.LOG_QUEUE_LOGGERS:
+        install_queue(logging.getLogger(name), settings.LOG_QUEUE_SIZE, settings.LOG_BATCH_SIZE,
+                      parse_sample_rates(settings.LOG_SAMPLE_RATES))
@@ -0,0 +1,103 @@
+"""
+Request-scoped StatsD metrics.
+
+``RequestMetricsMiddleware`` opens a StatsD pipeline per request and times the
+request once. Everything the views send through ``statsd_client`` while the
+request runs is buffered in that pipeline, and the whole batch goes out in one
+flush (one UDP packet for a typical request) when the response is ready.
+Outside a request (background threads, management commands) the shared
+client sends directly.
+"""
+import time
+from contextvars import ContextVar
+import statsd
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_current_pipeline = ContextVar('statsd_pipeline', default=None)
+
+# Metric names for routes that serve more than one operation; other routes use their url name
+ROUTE_METRIC_NAMES = {
+    ('upload_image', 'GET'): 'list_images',
+    ('handle_image', 'GET'): 'get_image',
+    ('handle_image', 'DELETE'): 'delete_image',
+    ('handle_batch', 'POST'): 'upload_batch',
+    ('handle_batch', 'DELETE'): 'delete_batch',
+    ('upload_session', 'GET'): 'get_upload_session',
+    ('upload_session', 'DELETE'): 'abort_upload_session',
+    ('cicd', 'GET'): 'healthz',
+}
+
+
+class RequestStatsClient:
+    """StatsD client that buffers into the current request's pipeline, if there is one."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def pipeline(self):
+        return self.client.pipeline()
+
+    def __getattr__(self, name):
+        # incr, decr, timing, timer, gauge, set, ...
+        return getattr(_current_pipeline.get() or self.client, name)
+
+
+# Shared StatsD client for the whole app
+statsd_client = RequestStatsClient(statsd.StatsClient(settings.STATSD_HOST, settings.STATSD_PORT,
+                                                      prefix=settings.STATSD_PREFIX or None,
+                                                      maxudpsize=settings.STATSD_MAXUDPSIZE))
+
+
+def route_metric_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return 'unmatched'
+    return ROUTE_METRIC_NAMES.get((match.url_name, request.method), match.url_name)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record ``api.<route>.calls``, ``api.<route>.duration`` and
+    ``api.<route>.status.<code>`` for every request, and flush all stats the
+    request produced in a single pipeline send.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        pipeline = statsd_client.pipeline()
+        token = _current_pipeline.set(pipeline)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.finish(request, response, pipeline, start)
+            return response
+        finally:
+            _current_pipeline.reset(token)
+
+    async def __acall__(self, request):
+        pipeline = statsd_client.pipeline()
+        token = _current_pipeline.set(pipeline)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.finish(request, response, pipeline, start)
+            return response
+        finally:
+            _current_pipeline.reset(token)
+
+    def finish(self, request, response, pipeline, start):
+        name = route_metric_name(request)
+        pipeline.incr(f'api.{name}.calls')
+        pipeline.timing(f'api.{name}.duration', (time.perf_counter() - start) * 1000)
+        pipeline.incr(f'api.{name}.status.{response.status_code}')
+        pipeline.send()
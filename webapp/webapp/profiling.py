@@ -0,0 +1,270 @@
+"""
+Opt-in sampled request profiling.
+
+``RequestProfilingMiddleware`` profiles a random PROFILING_SAMPLE_RATE share of
+requests, plus any request whose ``X-Profile-Token`` header matches
+PROFILING_TOKEN. A profiled request registers with one shared sampler thread,
+which records the request's Python stacks every PROFILING_INTERVAL_MS. Views
+run unmodified and pay nothing per function call, so S3, the ORM, logging and
+everything else show up in proportion to the time spent in them.
+
+Under WSGI the request's thread is sampled. Under ASGI a request runs in two
+places: its thread-sensitive thread, where sync views and ``sync_to_async``
+code run, and its task on the event loop. The thread is sampled while it is
+busy. The loop thread is only sampled while the request's task is the one
+running, so concurrent requests on the loop do not share samples and an idle
+loop records nothing. Blocking calls sent to other threads
+(``thread_sensitive=False``) are not attributed.
+
+Finished profiles go into a per-process ring buffer of PROFILING_BUFFER_SIZE
+entries. ``GET /debug/profiles`` (same token) aggregates them by route into
+collapsed stacks (``route;frame;frame count``), ready for flamegraph.pl or
+speedscope, or into a JSON summary with ``?format=json``.
+
+With both settings unset the middleware removes itself at startup
+(MiddlewareNotUsed), so it costs nothing when off.
+"""
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import thread as futures_thread
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.views.decorators.http import require_http_methods
+from webapp.fastjson import FastJsonResponse
+from webapp.metrics import route_metric_name
+
+PROFILE_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+# Top frame of an executor thread that waits for work
+_IDLE_WORKER_CODE = futures_thread._worker.__code__
+
+
+def collapse_stack(frame):
+    """``module.function`` names of a frame and its callers, outermost first, ``;``-joined."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profile:
+    """
+    Stack samples of one request: those of ``thread_id`` and, for an async
+    request, those of the loop's thread while ``task`` runs on ``loop``.
+    """
+
+    def __init__(self, thread_id, loop=None, task=None, loop_thread_id=None):
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.loop_thread_id = loop_thread_id
+        self.stacks = Counter()
+        self.route = None
+        self.method = None
+        self.status = None
+        self.duration_ms = None
+        self.finished_at = None
+
+
+class StackSampler:
+    """One daemon thread sampling the stacks of all threads being profiled."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, profile):
+        with self._lock:
+            # Keyed by profile: requests sharing a thread (the event loop) get one each
+            self._profiles[id(profile)] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, profile):
+        """Stop sampling ``profile``; its stacks no longer change afterwards."""
+        with self._lock:
+            self._profiles.pop(id(profile), None)
+
+    def sample(self):
+        with self._lock:
+            profiles = list(self._profiles.values())
+        if not profiles:
+            return False
+        frames = sys._current_frames()
+        samples = []
+        for profile in profiles:
+            stacks = []
+            frame = frames.get(profile.thread_id)
+            if frame is not None and frame.f_code is not _IDLE_WORKER_CODE:
+                stacks.append(collapse_stack(frame))
+            if profile.task is not None and asyncio.current_task(profile.loop) is profile.task:
+                frame = frames.get(profile.loop_thread_id)
+                if frame is not None:
+                    stacks.append(collapse_stack(frame))
+            samples.append((profile, stacks))
+        with self._lock:
+            for profile, stacks in samples:
+                # Skipped if the request finished meanwhile and is being buffered or reported
+                if id(profile) in self._profiles:
+                    profile.stacks.update(stacks)
+        return True
+
+    def _run(self):
+        while True:
+            if not self.sample():
+                # Idle until the next profiled request
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+
+
+class ProfileBuffer:
+    """Bounded ring buffer of finished profiles; the oldest are dropped first."""
+
+    def __init__(self, size=200):
+        self._profiles = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def snapshot(self, route=None):
+        with self._lock:
+            profiles = list(self._profiles)
+        return [profile for profile in profiles if route is None or profile.route == route]
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+sampler = StackSampler(interval=settings.PROFILING_INTERVAL_MS / 1000)
+profile_buffer = ProfileBuffer(size=settings.PROFILING_BUFFER_SIZE)
+
+
+def has_profile_token(request):
+    token = request.META.get(PROFILE_HEADER)
+    return bool(settings.PROFILING_TOKEN and token
+                and hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode()))
+
+
+class RequestProfilingMiddleware:
+    """Samples the stacks of selected requests into ``profile_buffer``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_TOKEN:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.selected(request):
+            return self.get_response(request)
+        profile, start = self.begin()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.end(profile, start, request, response)
+
+    async def __acall__(self, request):
+        if not self.selected(request):
+            return await self.get_response(request)
+        profile, start = await self.abegin()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.end(profile, start, request, response)
+
+    def selected(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        return (rate > 0 and random.random() < rate) or has_profile_token(request)
+
+    def begin(self):
+        profile = Profile(threading.get_ident())
+        sampler.start(profile)
+        return profile, time.perf_counter()
+
+    async def abegin(self):
+        start = time.perf_counter()
+        # The thread this request's sync code runs on (one per request under ASGI)
+        thread_id = await sync_to_async(threading.get_ident)()
+        profile = Profile(thread_id, loop=asyncio.get_running_loop(), task=asyncio.current_task(),
+                          loop_thread_id=threading.get_ident())
+        sampler.start(profile)
+        return profile, start
+
+    def end(self, profile, start, request, response):
+        sampler.stop(profile)
+        profile.duration_ms = (time.perf_counter() - start) * 1000
+        profile.route = route_metric_name(request)
+        profile.method = request.method
+        profile.status = response.status_code if response is not None else 500
+        profile.finished_at = time.time()
+        profile_buffer.add(profile)
+
+
+def collapsed_stacks(profiles):
+    """Collapsed-stack lines with the route as the root frame, heaviest first."""
+    totals = Counter()
+    for profile in profiles:
+        for stack, count in profile.stacks.items():
+            totals[f"{profile.route};{stack}"] += count
+    return [f"{stack} {count}" for stack, count in totals.most_common()]
+
+
+def route_summary(profiles, top=10):
+    routes = {}
+    for profile in profiles:
+        summary = routes.setdefault(profile.route, {"profiles": 0, "durations": [], "stacks": Counter()})
+        summary["profiles"] += 1
+        summary["durations"].append(profile.duration_ms)
+        summary["stacks"].update(profile.stacks)
+    return {
+        route: {
+            "profiles": summary["profiles"],
+            "mean_ms": round(sum(summary["durations"]) / len(summary["durations"]), 2),
+            "max_ms": round(max(summary["durations"]), 2),
+            "samples": sum(summary["stacks"].values()),
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in summary["stacks"].most_common(top)],
+        } for route, summary in routes.items()
+    }
+
+
+@require_http_methods(["GET"])
+def profiles_report(request):
+    """This worker's buffered profiles, as collapsed stacks (default) or ``?format=json``."""
+    if not has_profile_token(request):
+        # Indistinguishable from an unknown URL without the token
+        return FastJsonResponse({"error": "Not Found"}, status=404)
+    profiles = profile_buffer.snapshot(request.GET.get('route') or None)
+    if request.GET.get('format') == 'json':
+        return FastJsonResponse({"pid": os.getpid(), "routes": route_summary(profiles)})
+    response = HttpResponse("\n".join(collapsed_stacks(profiles)) + "\n", content_type="text/plain")
+    response['X-Profile-Pid'] = str(os.getpid())
+    return response
@@ -11,10 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
-import boto3
 from django.conf import settings
+from webapp.aws import LazyClient
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,29 +47,182 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Samples the stacks of selected requests; removes itself when profiling is off
+    "webapp.profiling.RequestProfilingMiddleware",
+    # Times each request and flushes its StatsD metrics in one pipeline send
+    "webapp.metrics.RequestMetricsMiddleware",
+    # Fails uploads fast with 503 + Retry-After while MySQL or S3 is down
+    "webapp.breakers.CircuitBreakerMiddleware",
+    # Concurrency caps and per-client rate limits for expensive routes (ADMISSION_POOLS, RATE_LIMITS)
+    "webapp.admission.AdmissionControlMiddleware",
+    # Lets GET/HEAD reads use the read replicas and pins writers to the primary (DB_REPLICA_HOSTS)
+    "webapp.db.router.ReplicaRoutingMiddleware",
     "django.middleware.common.CommonMiddleware",
 ]
 
+# StatsD agent (the CloudWatch agent listens on localhost:8125)
+STATSD_HOST = config('STATSD_HOST', default='localhost')
+STATSD_PORT = config('STATSD_PORT', default=8125, cast=int)
+STATSD_PREFIX = config('STATSD_PREFIX', default='')
+# Upper bound of one pipelined packet; stays below a 1500 byte MTU
+STATSD_MAXUDPSIZE = config('STATSD_MAXUDPSIZE', default=1432, cast=int)
+
+# Sampled request profiling (webapp/profiling.py). Profiles a PROFILING_SAMPLE_RATE share
+# of requests and any request whose X-Profile-Token header equals PROFILING_TOKEN; the
+# token also unlocks GET /debug/profiles. Off (and free) while both are unset.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_TOKEN = config('PROFILING_TOKEN', default='')
+PROFILING_INTERVAL_MS = config('PROFILING_INTERVAL_MS', default=5, cast=float)
+PROFILING_BUFFER_SIZE = config('PROFILING_BUFFER_SIZE', default=200, cast=int)
+
 ROOT_URLCONF = "webapp.urls"
 
 WSGI_APPLICATION = "webapp.wsgi.application"
 
+ASGI_APPLICATION = "webapp.asgi.application"
+
+# Route requests to the native async views (only useful when served via ASGI,
+# e.g. `uvicorn webapp.asgi:application`). webapp/asgi.py turns this on by default.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Stream POST /v1/file uploads straight into S3 (multipart for large files) while
+# the request body is parsed. Memory per upload is bounded by one part (min 5 MiB).
+S3_STREAMING_UPLOADS = config('S3_STREAMING_UPLOADS', default=True, cast=bool)
+S3_UPLOAD_PART_SIZE = config('S3_UPLOAD_PART_SIZE', default=8 * 1024 * 1024, cast=int)
+
+# Content-addressed storage for POST /v1/file: the upload is hashed while it is
+# received and identical bytes are stored once under blobs/<sha256>, shared by
+# reference-counted Blob rows. Takes precedence over S3_STREAMING_UPLOADS.
+IMAGE_DEDUP = config('IMAGE_DEDUP', default=False, cast=bool)
+
+# DELETE /v1/file/<id> and batch deletes remove the rows and queue the S3 objects in
+# an outbox (same transaction), so they never wait on S3. Run
+# `manage.py drain_deletions` to remove the queued objects.
+ASYNC_DELETES = config('ASYNC_DELETES', default=False, cast=bool)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=500, cast=int)
+OUTBOX_RETRY_BASE = config('OUTBOX_RETRY_BASE', default=5, cast=float)
+OUTBOX_RETRY_MAX = config('OUTBOX_RETRY_MAX', default=600, cast=float)
+
+# Renditions built in the background after each upload, as name:max_side:format
+# (webp, jpeg or png), e.g. "thumb:256:webp,medium:1024:webp". Empty disables them.
+# Resizing runs in DERIVATIVE_WORKERS spawned processes per web worker.
+IMAGE_DERIVATIVES = config('IMAGE_DERIVATIVES', default='')
+DERIVATIVE_WORKERS = config('DERIVATIVE_WORKERS', default=2, cast=int)
+DERIVATIVE_QUALITY = config('DERIVATIVE_QUALITY', default=80, cast=int)
+DERIVATIVE_MAX_SOURCE_BYTES = config('DERIVATIVE_MAX_SOURCE_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# GET /v1/file/<id>/content relays the S3 body in chunks of this size, which bounds
+# the memory held per download
+CONTENT_CHUNK_SIZE = config('CONTENT_CHUNK_SIZE', default=64 * 1024, cast=int)
+
+# Read-through cache for GET /v1/file/<id>. The in-process LRU is always used;
+# set IMAGE_CACHE_BACKEND to a CACHES alias to share entries across workers. A DELETE
+# only clears the LRU of the worker that served it, so every LRU entry expires after
+# IMAGE_CACHE_LOCAL_TTL seconds; other workers serve a deleted image at most that long.
+IMAGE_CACHE_MAX_ENTRIES = config('IMAGE_CACHE_MAX_ENTRIES', default=10000, cast=int)
+IMAGE_CACHE_TTL = config('IMAGE_CACHE_TTL', default=300, cast=int)
+IMAGE_CACHE_NEGATIVE_TTL = config('IMAGE_CACHE_NEGATIVE_TTL', default=30, cast=int)
+IMAGE_CACHE_LOCAL_TTL = config('IMAGE_CACHE_LOCAL_TTL', default=5, cast=int)
+IMAGE_CACHE_BACKEND = config('IMAGE_CACHE_BACKEND', default='')
+
+# Cache-Control max-age (seconds) of GET /v1/file/<id> responses. Browsers and CDNs may
+# keep showing a deleted image for this long, then revalidate with the ETag (304 if
+# unchanged, 404 once deleted); 404s are never cached.
+IMAGE_METADATA_MAX_AGE = config('IMAGE_METADATA_MAX_AGE', default=60, cast=int)
+
+# Presigned direct-to-S3 uploads (POST /v1/file/presign + /v1/file/confirm)
+PRESIGNED_UPLOAD_EXPIRES = config('PRESIGNED_UPLOAD_EXPIRES', default=900, cast=int)
+PRESIGNED_UPLOAD_MAX_BYTES = config('PRESIGNED_UPLOAD_MAX_BYTES', default=20 * 1024 * 1024, cast=int)
+PRESIGNED_CONFIRM_GRACE = config('PRESIGNED_CONFIRM_GRACE', default=3600, cast=int)
+
+# Resumable chunked uploads (/v1/file/uploads): sessions left unfinished this long are
+# aborted by `manage.py expire_upload_sessions`. A chunk is held in memory while it is
+# sent to S3, so RESUMABLE_MAX_PART_SIZE bounds memory per request.
+RESUMABLE_UPLOAD_EXPIRES = config('RESUMABLE_UPLOAD_EXPIRES', default=86400, cast=int)
+RESUMABLE_UPLOAD_MAX_BYTES = config('RESUMABLE_UPLOAD_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)
+RESUMABLE_MAX_PART_SIZE = config('RESUMABLE_MAX_PART_SIZE', default=32 * 1024 * 1024, cast=int)
+
+# Batch endpoints (/v1/file/batch): max files per upload, S3 transfer threads per process
+# and max ids per bulk delete
+BATCH_UPLOAD_MAX_FILES = config('BATCH_UPLOAD_MAX_FILES', default=50, cast=int)
+BATCH_UPLOAD_WORKERS = config('BATCH_UPLOAD_WORKERS', default=8, cast=int)
+BATCH_DELETE_MAX_IDS = config('BATCH_DELETE_MAX_IDS', default=5000, cast=int)
+
+# Page size for GET /v1/file
+IMAGE_LIST_DEFAULT_LIMIT = config('IMAGE_LIST_DEFAULT_LIMIT', default=100, cast=int)
+IMAGE_LIST_MAX_LIMIT = config('IMAGE_LIST_MAX_LIMIT', default=1000, cast=int)
+
+# Health checks. HEALTHZ_MODE: "record" (INSERT per probe), "live" or "ready".
+# Readiness status (SELECT 1 + S3 head_bucket) is refreshed every HEALTHZ_READINESS_TTL seconds.
+HEALTHZ_MODE = config('HEALTHZ_MODE', default='record')
+HEALTHZ_READINESS_TTL = config('HEALTHZ_READINESS_TTL', default=10, cast=int)
+HEALTHZ_BACKGROUND_CHECKS = config('HEALTHZ_BACKGROUND_CHECKS', default=True, cast=bool)
+HEALTHCHECK_RETENTION_DAYS = config('HEALTHCHECK_RETENTION_DAYS', default=7, cast=int)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connection reuse. With DB_POOL_SIZE > 0 every worker process keeps up to that many
+# MySQL connections in a pool (webapp/db/pool.py) shared by its threads, health-checked
+# with a ping on checkout. With DB_POOL_SIZE=0 Django's per-thread persistent
+# connections (DB_CONN_MAX_AGE seconds) are used instead.
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=5, cast=float)
+DB_POOL_MAX_LIFETIME = config('DB_POOL_MAX_LIFETIME', default=3600, cast=float)
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+# Socket timeouts (seconds) so a hung RDS instance fails a query instead of pinning the worker
+DB_CONNECT_TIMEOUT = config('DB_CONNECT_TIMEOUT', default=3, cast=int)
+DB_READ_TIMEOUT = config('DB_READ_TIMEOUT', default=10, cast=int)
+DB_WRITE_TIMEOUT = config('DB_WRITE_TIMEOUT', default=10, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'webapp.db.mysql',
         'NAME': os.getenv('DB_NAME', config('DB_NAME', default='csye6225')),
         'USER': os.getenv('DB_USER', config('DB_USER', default='admin')),
         'PASSWORD': os.getenv('DB_PASS', config('DB_PASS', default='default_password')),
         'HOST': os.getenv('DB_HOST', config('DB_HOST', default='localhost')),  # Use RDS endpoint, NOT localhost
         'PORT': os.getenv('DB_PORT', config('DB_PORT', default='3306')),
+        # Pooled connections go back to the pool at the end of every request
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': DB_CONNECT_TIMEOUT,
+            'read_timeout': DB_READ_TIMEOUT,
+            'write_timeout': DB_WRITE_TIMEOUT,
+        },
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': DB_POOL_TIMEOUT,
+            'MAX_LIFETIME': DB_POOL_MAX_LIFETIME,
+        },
     }
 }
 
 
+# Read replicas (webapp/db/router.py): comma-separated hosts, each added as DATABASES
+# alias replica_<n> with the primary's credentials. Reads of REPLICA_READ_MODELS in GET/HEAD
+# requests go to a replica that lags at most REPLICA_MAX_LAG seconds (checked every
+# REPLICA_CHECK_INTERVAL seconds), else to the primary. A client that writes is pinned
+# to the primary for REPLICA_PIN_SECONDS (cookie) so it reads its own writes.
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+REPLICA_READ_MODELS = ['image_upload.Image', 'image_upload.Derivative']
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5.0, cast=float)
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5.0, cast=float)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+for number, host in enumerate(DB_REPLICA_HOSTS, start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # Tests read the test database through the primary connection
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['webapp.db.router.ReplicaRouter'] if DB_REPLICA_HOSTS else []
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -92,7 +245,61 @@ STATIC_URL = "static/"
 
 AWS_REGION_NAME = "us-east-1"
 
-boto3_logs_client = boto3.client("logs", region_name=AWS_REGION_NAME)
+# Shared AWS clients (webapp/aws.py) are built lazily, once per process, with these settings
+AWS_MAX_POOL_CONNECTIONS = config('AWS_MAX_POOL_CONNECTIONS', default=50, cast=int)
+# Timeout budget per S3 call: at most AWS_MAX_ATTEMPTS * (connect + read timeout), ~24s
+AWS_CONNECT_TIMEOUT = config('AWS_CONNECT_TIMEOUT', default=2, cast=float)
+AWS_READ_TIMEOUT = config('AWS_READ_TIMEOUT', default=10, cast=float)
+AWS_TCP_KEEPALIVE = config('AWS_TCP_KEEPALIVE', default=True, cast=bool)
+AWS_MAX_ATTEMPTS = config('AWS_MAX_ATTEMPTS', default=2, cast=int)
+
+# Admission control (webapp/admission.py), per worker process and keyed by route metric
+# names (webapp/metrics.py). A pool runs at most `concurrency` of its routes' requests at
+# once; up to `queue` more wait for at most `timeout` seconds, the rest get a 503.
+# Set concurrency to 0 to disable a pool.
+ADMISSION_POOLS = {
+    'uploads': {
+        'routes': ['upload_image', 'upload_batch', 'upload_session_part'],
+        'concurrency': config('UPLOAD_CONCURRENCY', default=4, cast=int),
+        'queue': config('UPLOAD_QUEUE_SIZE', default=8, cast=int),
+        'timeout': config('UPLOAD_QUEUE_TIMEOUT', default=5.0, cast=float),
+    },
+}
+# Per-client token buckets: `rate` requests per second with bursts of `burst`, else 429.
+# A rate of 0 disables the limit.
+RATE_LIMITS = {
+    'uploads': {
+        'routes': ['upload_image', 'upload_batch', 'presign_upload', 'create_upload_session'],
+        'rate': config('UPLOAD_RATE_LIMIT', default=0.0, cast=float),
+        'burst': config('UPLOAD_RATE_BURST', default=20, cast=int),
+    },
+}
+# request.META key holding the client address, e.g. HTTP_X_FORWARDED_FOR behind the ALB
+# (its last entry is used). Empty: REMOTE_ADDR.
+RATE_LIMIT_CLIENT_HEADER = config('RATE_LIMIT_CLIENT_HEADER', default='')
+
+# Circuit breakers (webapp/breakers.py): after CIRCUIT_BREAKER_FAILURES consecutive failed
+# MySQL or S3 calls, calls to that dependency fail fast with a 503 + Retry-After for
+# CIRCUIT_BREAKER_RESET_TIMEOUT seconds, then a single trial call decides whether to close.
+CIRCUIT_BREAKERS = config('CIRCUIT_BREAKERS', default=True, cast=bool)
+CIRCUIT_BREAKER_FAILURES = config('CIRCUIT_BREAKER_FAILURES', default=5, cast=int)
+CIRCUIT_BREAKER_RESET_TIMEOUT = config('CIRCUIT_BREAKER_RESET_TIMEOUT', default=30, cast=float)
+
+# JSON encoder for API responses and log records (webapp/fastjson.py): "orjson",
+# "stdlib", or "auto" for orjson when installed, else the stdlib
+JSON_BACKEND = config('JSON_BACKEND', default='auto')
+
+# The "webapp" logger is drained by a background thread (webapp/log_pipeline.py):
+# views only enqueue dict records, serialisation and shipping happen off the request path.
+LOGGING_CONFIG = 'webapp.log_pipeline.configure_logging'
+LOG_ASYNC = config('LOG_ASYNC', default=True, cast=bool)
+# The root logger too: watchtower only ever runs on the pipeline thread, never on a request thread
+LOG_QUEUE_LOGGERS = ['webapp', 'root']
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_BATCH_SIZE = config('LOG_BATCH_SIZE', default=100, cast=int)
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+# Keep ratio for hot INFO events, e.g. "fetch_image=0.1". Warnings and errors are never sampled.
+LOG_SAMPLE_RATES = config('LOG_SAMPLE_RATES', default='fetch_image=0.1')
 
 LOGGING = {
     'version': 1,
@@ -105,14 +312,24 @@ LOGGING = {
         # and configure individual loggers below.
         'handlers': ['watchtower', 'console'],
     },
+    'formatters': {
+        'json': {
+            '()': 'webapp.log_pipeline.JsonFormatter',
+        }
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'json',
         },
         'watchtower': {
-            'class': 'watchtower.CloudWatchLogHandler',
-            'boto3_client': boto3_logs_client,
+            # Built on the first record (on the log pipeline thread), so booting a
+            # worker makes no CloudWatch calls
+            '()': 'webapp.log_pipeline.DeferredHandler',
+            'handler_class': 'watchtower.CloudWatchLogHandler',
+            'boto3_client': LazyClient('logs', region_name=AWS_REGION_NAME),
             'log_group_name': 'DjangoWebAppLogs',
+            'formatter': 'json',
             # Decrease the verbosity level here to send only those logs to watchtower,
             # but still see more verbose logs in the console. See the watchtower
             # documentation for other parameters that can be set here.
@@ -132,7 +349,7 @@ LOGGING = {
         },
         # Add any other logger-specific configuration here.
         'webapp': {  # Custom logger for your app
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'handlers': ['watchtower'],
             'propagate': False
         }
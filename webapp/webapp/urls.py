@@ -15,8 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.urls import path,include
+from webapp.profiling import profiles_report
 
 urlpatterns = [
+    path('debug/profiles', profiles_report, name='profiles_report'),
     path('', include('healthz.urls')),
     path('', include('image_upload.urls')),
 ]